@@ -0,0 +1,84 @@
+"""
+Compares the generic emit/load paths against the compiled struct codec, for
+records given as value lists and as dicts, on a synthetic schema mixing every
+data type.
+
+Usage: python benchmarks/bench_codec.py [num_blocks] [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from binbuilder.block import Block, BlockSequence, Schema, DataType, DATATYPES
+
+
+def build_schema(num_blocks, blocks_per_sequence=100):
+    sequences = []
+    blocks = []
+
+    for i in range(num_blocks):
+        datatype = i % len(DATATYPES)
+        if DataType.BYTES == datatype:
+            block = Block(datatype, f"field {i}", b"\x01\x02\x03\x04", 4)
+        elif datatype in [DataType.FLOAT, DataType.DOUBLE]:
+            block = Block(datatype, f"field {i}", 1.5)
+        else:
+            block = Block(datatype, f"field {i}", 1)
+
+        blocks.append(block)
+        if len(blocks) == blocks_per_sequence:
+            sequences.append(BlockSequence(f"sequence {len(sequences)}", blocks))
+            blocks = []
+
+    if blocks:
+        sequences.append(BlockSequence(f"sequence {len(sequences)}", blocks))
+
+    return Schema("benchmark", sequences)
+
+
+def per_block_emit(schema):
+    # Equivalent of the original emit path: one struct.pack per block
+    ret = b""
+    for s in schema.sequencelist:
+        for b in s.blocklist:
+            ret += b.emit_data(schema.big_endian)
+
+    return ret
+
+
+def report(name, seconds, iterations):
+    print(f"{name:<44} {seconds / iterations * 1e6:>12.2f} us/record")
+
+
+def main():
+    num_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    schema = build_schema(num_blocks)
+    codec = schema.compile()
+    values = schema.values()
+    record = dict(zip(codec.field_names, values))
+    data = schema.emit_data()
+
+    assert per_block_emit(schema) == data
+    assert codec.pack_dict(record) == data
+    assert codec.unpack_dict(data) == record
+
+    print(f"{num_blocks} blocks, {len(data)} bytes per record, {iterations} iterations\n")
+
+    report("per-block struct.pack", timeit.timeit(lambda: per_block_emit(schema), number=iterations), iterations)
+    report("Schema.emit_data", timeit.timeit(schema.emit_data, number=iterations), iterations)
+    report("Codec.pack", timeit.timeit(lambda: codec.pack(values), number=iterations), iterations)
+    report("Codec.pack (dict record, per-field lookup)",
+           timeit.timeit(lambda: codec.pack([record[n] for n in codec.field_names]), number=iterations), iterations)
+    report("Codec.pack_dict", timeit.timeit(lambda: codec.pack_dict(record), number=iterations), iterations)
+    print()
+    report("Schema.load_data", timeit.timeit(lambda: schema.load_data(data), number=iterations), iterations)
+    report("Codec.unpack", timeit.timeit(lambda: codec.unpack(data), number=iterations), iterations)
+    report("Codec.unpack_dict", timeit.timeit(lambda: codec.unpack_dict(data), number=iterations), iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Measures the memory used per Block, for freshly built schemas, for schemas
+loaded with from_dict (which is how saved schemas are loaded), and for copies.
+
+Usage: python benchmarks/bench_memory.py [num_blocks]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from binbuilder.block import Schema
+
+from bench_codec import build_schema
+
+
+def measure(func):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = func()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+
+def report(name, num_bytes, num_blocks):
+    print(f"{name:<30} {num_bytes / num_blocks:>10.1f} bytes/block")
+
+
+def load_from_dict(attrs):
+    schema = Schema("", [])
+    schema.from_dict(attrs)
+    return schema
+
+
+def main():
+    num_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    schema, num_bytes = measure(lambda: build_schema(num_blocks))
+    report("build", num_bytes, num_blocks)
+
+    attrs = schema.to_dict()
+    _, num_bytes = measure(lambda: load_from_dict(attrs))
+    report("from_dict", num_bytes, num_blocks)
+
+    _, num_bytes = measure(schema.copy)
+    report("copy", num_bytes, num_blocks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measures the time from starting the GUI to its first window being shown, and
+checks it against a budget. Each run starts a fresh interpreter with
+-X importtime, and the slowest imports of the last run are listed. One
+untimed run is made first, so that the dark theme palette is cached.
+
+Times are measured from just before the first binbuilder import to the first
+window being shown and processed by the event loop, so they include
+importing PyQt5 but not starting the interpreter itself.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--budget SECONDS] [--top N]
+
+Exits with status 1 if the median time exceeds the budget. Set
+QT_QPA_PLATFORM=offscreen to run without a display (the default here).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Default budget for time to first window, in seconds
+DEFAULT_BUDGET = 0.5
+
+CHILD_SCRIPT = """
+import time
+start = time.perf_counter()
+
+import sys
+from PyQt5 import QtWidgets
+from binbuilder.__main__ import createMainWindow
+
+app = QtWidgets.QApplication(sys.argv)
+win = createMainWindow(app)
+app.processEvents()
+
+print(time.perf_counter() - start)
+"""
+
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT], env=env,
+                          capture_output=True, text=True, check=True)
+
+    return float(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def slowest_imports(importtime_output, count):
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        fields = [f.strip() for f in line[len("import time:"):].split("|")]
+        if fields[0].isdigit():
+            imports.append((int(fields[1]), fields[2].strip()))
+
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to first window")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help=f"Maximum median time to first window, in seconds (default {DEFAULT_BUDGET})")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    args = parser.parse_args()
+
+    run_once()
+
+    times = []
+    importtime_output = ""
+    for _ in range(args.runs):
+        elapsed, importtime_output = run_once()
+        times.append(elapsed)
+
+    print(f"{'Slowest imports (cumulative)':<50} {'ms':>8}")
+    for micros, name in slowest_imports(importtime_output, args.top):
+        print(f"{name:<50} {micros / 1000:>8.1f}")
+
+    median = statistics.median(times)
+    print()
+    print(f"time to first window: median {median * 1000:.1f} ms, min {min(times) * 1000:.1f} ms, "
+          f"budget {args.budget * 1000:.0f} ms")
+
+    if median > args.budget:
+        print("over budget")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
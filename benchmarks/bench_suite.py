@@ -0,0 +1,243 @@
+"""
+Benchmark suite for the binbuilder.block core. Runs on synthetic schemas
+mixing every data type (see bench_codec.build_schema), covering emit, load,
+byte order conversion, copy, to_dict/from_dict, C and struct format
+generation and name lookups.
+
+Results are printed, and can be written as JSON with --output. Passing a
+previous JSON result file with --compare reports the change in each result,
+and exits with status 1 if any became slower by more than --threshold.
+
+Usage: python benchmarks/bench_suite.py [--sizes 10,1000,100000] [--repeat N]
+           [--filter TEXT] [--output FILE] [--compare FILE] [--threshold FRACTION]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import timeit
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+
+from binbuilder.block import Schema, CodeWriter, string_to_varname
+
+from bench_codec import build_schema
+
+DEFAULT_SIZES = [10, 1000, 100000]
+
+# Maximum number of names looked up per call of the lookup benchmarks
+MAX_LOOKUPS = 1000
+
+
+def benchmarks(num_blocks):
+    """
+    Build the benchmarks for a schema of the given size
+
+    :param int num_blocks: number of blocks in the schema
+
+    :return: list of (name, function, operations per call) tuples
+    :rtype: list
+    """
+    schema = build_schema(num_blocks)
+    data = schema.emit_data()
+    swap_buffer = bytearray(data)
+    attrs = schema.to_dict()
+    writer = CodeWriter(schema.big_endian)
+
+    rng = random.Random(num_blocks)
+    block_names = [(s, b.name) for s in schema.sequencelist for b in s.blocklist]
+    block_lookups = rng.sample(block_names, min(MAX_LOOKUPS, len(block_names)))
+    sequence_names = [s.name for s in schema.sequencelist]
+    sequence_lookups = [rng.choice(sequence_names) for _ in range(min(MAX_LOOKUPS, len(block_names)))]
+
+    # The uncached benchmark calls the function wrapped by the lru_cache in
+    # front of string_to_varname, so the conversion itself is measured
+    convert = string_to_varname.__wrapped__
+    raw_names = [name for _, name in block_lookups]
+
+    def emit_blocks():
+        for s in schema.sequencelist:
+            for b in s.blocklist:
+                b.emit_data(schema.big_endian)
+
+    def load_sequences():
+        offset = 0
+        for s in schema.sequencelist:
+            offset += s.load_data(data, schema.big_endian, offset)
+
+    def from_dict():
+        Schema("", []).from_dict(attrs)
+
+    def generate_c():
+        for s in schema.sequencelist:
+            writer.generate_c_string(s)
+
+    def block_lookup():
+        for s, name in block_lookups:
+            s.get_block_by_name(name)
+
+    def block_contains():
+        for s, name in block_lookups:
+            name in s
+
+    def sequence_lookup():
+        for name in sequence_lookups:
+            schema.get_sequence_by_name(name)
+
+    def varname_uncached():
+        for name in raw_names:
+            convert(name)
+
+    def varname_cached():
+        for name in raw_names:
+            string_to_varname(name)
+
+    return [
+        ("Schema.emit_data", schema.emit_data, 1),
+        ("Block.emit_data (all blocks)", emit_blocks, 1),
+        ("Schema.load_data", lambda: schema.load_data(data), 1),
+        ("BlockSequence.load_data (all sequences)", load_sequences, 1),
+        ("Schema.swap_endianness", lambda: schema.swap_endianness(swap_buffer), 1),
+        ("Schema.copy", schema.copy, 1),
+        ("Schema.to_dict", schema.to_dict, 1),
+        ("Schema.from_dict", from_dict, 1),
+        ("Schema.generate_c_string", schema.generate_c_string, 1),
+        ("CodeWriter.generate_c_string (all sequences)", generate_c, 1),
+        ("CodeWriter.generate_pystruct_fmtstring", lambda: writer.generate_pystruct_fmtstring(schema), 1),
+        ("BlockSequence.get_block_by_name", block_lookup, len(block_lookups)),
+        ("BlockSequence.__contains__", block_contains, len(block_lookups)),
+        ("Schema.get_sequence_by_name", sequence_lookup, len(sequence_lookups)),
+        ("string_to_varname (uncached)", varname_uncached, len(raw_names)),
+        ("string_to_varname (cached)", varname_cached, len(raw_names)),
+    ]
+
+
+def measure(func, repeat):
+    """
+    Time a function, calling it enough times per repetition to take at least
+    0.2 seconds
+
+    :param func: function to time
+    :param int repeat: number of repetitions
+
+    :return: list of seconds per call, one per repetition
+    :rtype: list
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+
+def git_commit():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return proc.stdout.strip()
+
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f} us"
+    elif seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+
+    return f"{seconds:.3f} s"
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the change in each result relative to a baseline
+
+    :param dict results: results of this run
+    :param dict baseline: results loaded from a previous run
+    :param float threshold: fractional slowdown counted as a regression
+
+    :return: names of results that regressed
+    :rtype: list
+    """
+    regressions = []
+
+    print(f"\n{'Benchmark':<60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+
+        before = baseline[key]["best"]
+        after = result["best"]
+        change = (after - before) / before
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+
+        print(f"{key:<60} {format_time(before):>12} {format_time(after):>12} {change:>+8.1%}{flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the binbuilder.block core")
+    parser.add_argument("--sizes", default=",".join([str(s) for s in DEFAULT_SIZES]),
+                        help="Comma-separated numbers of blocks in the synthetic schemas")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed repetitions")
+    parser.add_argument("--filter", default="", help="Only run benchmarks with names containing this text")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare results with this JSON file from a previous run")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Fractional slowdown reported as a regression (default 0.1)")
+    args = parser.parse_args()
+
+    results = {}
+
+    for num_blocks in [int(s) for s in args.sizes.split(",")]:
+        print(f"\n{num_blocks} blocks")
+
+        for name, func, ops in benchmarks(num_blocks):
+            if args.filter not in name:
+                continue
+
+            # Results are per operation, e.g. per lookup, so that they can be
+            # compared across schema sizes
+            times = [t / ops for t in measure(func, args.repeat)]
+            key = f"{name} [{num_blocks}]"
+            results[key] = {"benchmark": name, "num_blocks": num_blocks, "best": min(times),
+                            "median": statistics.median(times), "ops_per_call": ops}
+
+            print(f"  {name:<50} {format_time(min(times)):>12} {format_time(statistics.median(times)):>12}")
+
+    if args.output:
+        output = {
+            "meta": {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+
+        with open(args.output, "w") as fh:
+            json.dump(output, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as fh:
+            baseline = json.load(fh)["results"]
+
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
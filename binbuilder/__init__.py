@@ -1 +1,3 @@
 __version__ = "0.0.1"
+
+from binbuilder.instrumentation import stats
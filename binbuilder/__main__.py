@@ -1,11 +1,9 @@
 import sys
 import os
-import qdarktheme
 
 from PyQt5 import QtWidgets, QtGui, QtCore
 
 from binbuilder.main_widget import MainWidget
-from binbuilder.dragdrop_table_widget import DragDropTableWidget
 from binbuilder.utils import ICON_PATH
 from binbuilder import __version__ as package_version
 
@@ -23,6 +21,7 @@ class MainWindow(QtWidgets.QMainWindow):
         super(MainWindow, self).__init__()
 
         self.default_palette = QtWidgets.QApplication.instance().palette()
+        self.dark_palette = None
         self.primary_screen = primary_screen
         self.initUi()
 
@@ -48,6 +47,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.loadSchemaAction.setStatusTip("Load saved schema from a file")
         self.loadSchemaAction.triggered.connect(self.widget.loadSchema)
 
+        self.undoAction = QtWidgets.QAction("Undo", self)
+        self.undoAction.setShortcut("Ctrl+z")
+        self.undoAction.setStatusTip("Undo the last change to the schema")
+        self.undoAction.triggered.connect(self.widget.undo)
+
+        self.redoAction = QtWidgets.QAction("Redo", self)
+        self.redoAction.setShortcut("Ctrl+y")
+        self.redoAction.setStatusTip("Redo the last undone change to the schema")
+        self.redoAction.triggered.connect(self.widget.redo)
+
         self.savedSequencesAction = QtWidgets.QAction("Saved sequences", self)
         self.savedSequencesAction.setShortcut("Ctrl+d")
         self.savedSequencesAction.setStatusTip("View/edit saved sequences")
@@ -68,6 +77,8 @@ class MainWindow(QtWidgets.QMainWindow):
         fileMenu.addAction(self.quitAction)
 
         editMenu = menu.addMenu("Edit")
+        editMenu.addAction(self.undoAction)
+        editMenu.addAction(self.redoAction)
         editMenu.addAction(self.savedSequencesAction)
 
         viewMenu = menu.addMenu("View")
@@ -77,13 +88,30 @@ class MainWindow(QtWidgets.QMainWindow):
         app = QtWidgets.QApplication.instance()
 
         if enabled:
-            app.setPalette(qdarktheme.load_palette())
+            app.setPalette(self.darkPalette())
         else:
             app.setPalette(self.default_palette)
 
         app.setStyle('Fusion')
         app.setStyleSheet("")
 
+    def darkPalette(self):
+        # qdarktheme is slow to import, so its palette is cached in the
+        # settings, and it is only imported if the cache is empty
+        if self.dark_palette is None:
+            settings = QtCore.QSettings("binbuilder", "binbuilder")
+            key = f"dark_palette/{package_version}"
+            palette = settings.value(key)
+
+            if not isinstance(palette, QtGui.QPalette):
+                import qdarktheme
+                palette = qdarktheme.load_palette()
+                settings.setValue(key, palette)
+
+            self.dark_palette = palette
+
+        return self.dark_palette
+
     def toggleDarkTheme(self):
         self.enableDarkTheme(self.darkThemeAction.isChecked())
 
@@ -93,9 +121,8 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             event.ignore()
 
-if __name__ == '__main__':
-    app = QtWidgets.QApplication(sys.argv)
 
+def createMainWindow(app):
     app.setStyle('Fusion')
     font = QtWidgets.qApp.font()
     font.setPointSize(12)
@@ -106,5 +133,14 @@ if __name__ == '__main__':
     win.setWindowTitle("binbuilder %s" % package_version)
     win.enableDarkTheme(True)
     win.show()
+    return win
+
 
+def main():
+    app = QtWidgets.QApplication(sys.argv)
+    win = createMainWindow(app)
     sys.exit(app.exec_())
+
+
+if __name__ == '__main__':
+    main()
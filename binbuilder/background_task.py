@@ -0,0 +1,106 @@
+import threading
+
+from PyQt5 import QtCore, QtWidgets
+
+from binbuilder.save_file import Cancelled
+from binbuilder.utils import errorDialog
+
+# Range of values reported to progress dialogs
+PROGRESS_STEPS = 1000
+
+
+class TaskSignals(QtCore.QObject):
+    """
+    Signals emitted by a BackgroundTask. They are emitted from the worker
+    thread and delivered to receivers on the GUI thread.
+    """
+    progress = QtCore.pyqtSignal(int)
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+
+class BackgroundTask(QtCore.QRunnable):
+    """
+    Runs a function on a QThreadPool thread, as
+    func(*args, progress=<function>, cancel_event=<threading.Event>)
+
+    The function reports progress by calling progress(done, total), and should
+    raise Cancelled once it sees cancel_event set.
+    """
+    def __init__(self, func, *args):
+        super(BackgroundTask, self).__init__()
+
+        # Deleted along with its Python wrapper, not by the thread pool
+        self.setAutoDelete(False)
+
+        self.func = func
+        self.args = args
+        self.signals = TaskSignals()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def reportProgress(self, done, total):
+        if total > 0:
+            self.signals.progress.emit((done * PROGRESS_STEPS) // total)
+
+    def run(self):
+        try:
+            result = self.func(*self.args, progress=self.reportProgress, cancel_event=self.cancel_event)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+def runInBackground(parent, label, func, *args, finished=None):
+    """
+    Run a function on the global QThreadPool, showing a modal progress dialog
+    that allows the function to be cancelled
+
+    :param parent: parent widget for the progress and error dialogs
+    :param str label: text to show in the progress dialog
+    :param func: function to run, see BackgroundTask
+    :param finished: optional function called on the GUI thread with the\
+        return value of func, if it completes successfully
+
+    :return: the running task
+    :rtype: BackgroundTask
+    """
+    task = BackgroundTask(func, *args)
+
+    dialog = QtWidgets.QProgressDialog(label, "Cancel", 0, PROGRESS_STEPS, parent)
+    dialog.setWindowModality(QtCore.Qt.WindowModal)
+    dialog.setAutoClose(False)
+    dialog.setAutoReset(False)
+    dialog.setMinimumDuration(0)
+
+    # Keep the task alive for as long as the dialog
+    dialog.task = task
+
+    def close():
+        dialog.close()
+        dialog.deleteLater()
+
+    def onFinished(result):
+        close()
+        if finished is not None:
+            finished(result)
+
+    def onFailed(message):
+        close()
+        errorDialog(parent, message=message)
+
+    dialog.canceled.connect(task.cancel)
+    task.signals.progress.connect(dialog.setValue)
+    task.signals.finished.connect(onFinished)
+    task.signals.failed.connect(onFailed)
+    task.signals.cancelled.connect(close)
+
+    dialog.show()
+    QtCore.QThreadPool.globalInstance().start(task)
+    return task
@@ -0,0 +1,293 @@
+"""
+Batch conversion of tables of field values (CSV or JSONL) into binary data,
+spread across worker processes.
+
+Each row of the input table provides values for one record of a schema.
+Columns are keyed by field name ('<sequence varname>.<block varname>'), or
+by block varname alone where that is unique within the schema; any other
+column is an error. Fields with no column, or with an empty CSV cell, take
+the current value of the block in the schema.
+
+Fields of blocks with a count take a JSON list, or a string of values
+separated by commas or spaces. A single value sets every element.
+"""
+import array
+import collections
+import csv
+import json
+import os
+import struct
+
+from concurrent.futures import ProcessPoolExecutor
+
+from binbuilder.block import Block, Codec, ARRAY_TYPECODES, array_to_bytes
+from binbuilder.save_file import replacing_file
+
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Codec and converters for the current worker process, set by _init_worker
+_worker_state = None
+
+
+def _field_kind(block, fmtstring):
+    if isinstance(block, Block) and (block.count is not None):
+        return ("array", ARRAY_TYPECODES[block.typeinfo.datatype], block.count)
+    elif fmtstring.endswith("s"):
+        return "bytes"
+    elif fmtstring in ["f", "d"]:
+        return "float"
+
+    return "int"
+
+
+def _convert(kind, value, big_endian=False):
+    if isinstance(kind, tuple):
+        return _convert_array(kind, value, big_endian)
+    elif not isinstance(value, str):
+        return value
+
+    if kind == "bytes":
+        return bytes.fromhex(value)
+    elif kind == "float":
+        return float(value)
+
+    return _parse_int(value)
+
+
+def _parse_int(value):
+    # Base prefixes are accepted, but other values are always decimal, so
+    # that leading zeros are not rejected as an invalid octal literal
+    prefix = value.strip().lstrip("+-")[:2].lower()
+    return int(value, 0 if prefix in ["0x", "0o", "0b"] else 10)
+
+
+def _convert_array(kind, value, big_endian):
+    _, typecode, count = kind
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    elif not isinstance(value, list):
+        value = [value]
+
+    convert = float if typecode in ["f", "d"] else _parse_int
+    values = [convert(v) if isinstance(v, str) else v for v in value]
+    if len(values) == 1:
+        values = values * count
+    elif len(values) != count:
+        raise ValueError(f"Expected 1 or {count} values, got {len(values)}")
+
+    try:
+        return array_to_bytes(array.array(typecode, values), big_endian)
+    except OverflowError as e:
+        raise ValueError(str(e))
+
+
+class _TableSpec(object):
+    """
+    Picklable description of a schema layout, sent to worker processes
+    """
+    def __init__(self, schema):
+        layout = schema.layout()
+
+        self.fmtstring = layout.fmtstring
+        self.field_names = list(layout.field_names)
+        self.big_endian = schema.big_endian
+        blocks = [b for s in schema.sequencelist for b in s.blocklist]
+        self.kinds = [_field_kind(b, layout.fmtstrings[n]) for b, n in zip(blocks, self.field_names)]
+        self.defaults = schema.values()
+
+        # Columns may be keyed by block varname alone, if it is unique
+        counts = collections.Counter([n.split(".", 1)[-1] for n in self.field_names])
+        self.columns = []
+        for name in self.field_names:
+            short_name = name.split(".", 1)[-1]
+            self.columns.append((name, short_name if counts[short_name] == 1 else None))
+
+        self.column_names = {n for column in self.columns for n in column if n is not None}
+
+
+def _init_worker(spec):
+    global _worker_state
+    _worker_state = (spec, Codec(spec.fmtstring, spec.field_names, spec.big_endian))
+
+
+def _row_values(spec, row):
+    if not spec.column_names.issuperset(row):
+        unmatched = ", ".join([f"'{k}'" for k in row if k not in spec.column_names])
+        raise ValueError(f"Columns match no field: {unmatched}")
+
+    values = []
+    for i, (name, short_name) in enumerate(spec.columns):
+        value = row.get(name)
+        if (value is None) and (short_name is not None):
+            value = row.get(short_name)
+
+        if (value is None) or (value == ""):
+            values.append(spec.defaults[i])
+        else:
+            values.append(_convert(spec.kinds[i], value, spec.big_endian))
+
+    return values
+
+
+def _decode_row(header, row):
+    # CSV rows arrive as lists of cells, JSONL rows as unparsed lines
+    if header is None:
+        return json.loads(row)
+
+    return dict(zip(header, row))
+
+
+def _pack_chunk(first_index, header, rows, per_row):
+    spec, codec = _worker_state
+    records = []
+
+    for i, row in enumerate(rows):
+        try:
+            records.append(_row_values(spec, _decode_row(header, row)))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Row {first_index + i}: {e}")
+
+    try:
+        if per_row:
+            return [codec.pack(r) for r in records]
+
+        return codec.pack_many(records)
+    except struct.error:
+        # Slow path, only taken on failure: find the first row that is invalid
+        for i, record in enumerate(records):
+            try:
+                codec.pack(record)
+            except struct.error as e:
+                raise ValueError(f"Row {first_index + i}: {e}")
+
+        raise
+
+
+def _read_raw_rows(filename, input_format):
+    # Yields the CSV header (or None for JSONL) first, then the undecoded
+    # rows, so that decoding happens in the worker processes
+    if input_format is None:
+        ext = os.path.splitext(filename)[1].lower()
+        input_format = "csv" if ext == ".csv" else "jsonl"
+
+    if input_format == "csv":
+        with open(filename, "r", newline="") as fh:
+            reader = csv.reader(fh)
+            yield next(reader, [])
+            yield from reader
+
+    elif input_format == "jsonl":
+        with open(filename, "r") as fh:
+            yield None
+            for line in fh:
+                if line.strip():
+                    yield line
+    else:
+        raise ValueError(f"Unsupported input format '{input_format}'")
+
+
+def read_rows(filename, input_format=None):
+    """
+    Read rows from a CSV or JSONL file, one dict per row
+
+    :param str filename: input file
+    :param str input_format: 'csv' or 'jsonl'. Defaults to detecting the
+        format from the file extension.
+
+    :return: generator yielding one dict per row
+    """
+    rows = _read_raw_rows(filename, input_format)
+    header = next(rows)
+    for row in rows:
+        yield _decode_row(header, row)
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def convert_table(schema, input_filename, output, per_row=False, input_format=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None):
+    """
+    Convert a table of field values into binary records of a schema. Rows are
+    validated and packed in chunks across a pool of worker processes, and
+    written out in input order.
+
+    :param Schema schema: schema describing one record
+    :param str input_filename: CSV or JSONL file with one record per row
+    :param str output: output file, or output directory if per_row is True.
+        The output file is only replaced once all rows were converted.
+    :param bool per_row: if True, write one '<row index>.bin' file per row
+        instead of a single file with all records back-to-back
+    :param str input_format: 'csv' or 'jsonl'. Defaults to detecting the
+        format from the file extension.
+    :param int chunk_size: number of rows sent to a worker at a time
+    :param int max_workers: number of worker processes. Defaults to the
+        number of CPUs. If 1, rows are converted in this process.
+
+    :return: number of rows converted
+    :rtype: int
+    """
+    spec = _TableSpec(schema)
+    rows = _read_raw_rows(input_filename, input_format)
+    header = next(rows)
+
+    if per_row:
+        os.makedirs(output, exist_ok=True)
+        return _convert_rows(spec, header, rows, output, None, chunk_size, max_workers)
+
+    # Records are written to a temporary file, which only replaces the output
+    # file once all rows were converted
+    with replacing_file(output) as outfh:
+        return _convert_rows(spec, header, rows, output, outfh, chunk_size, max_workers)
+
+
+def _convert_rows(spec, header, rows, output, outfh, chunk_size, max_workers):
+    per_row = outfh is None
+    num_rows = 0
+
+    def write_result(first_index, result):
+        if outfh is not None:
+            outfh.write(result)
+            return
+
+        for i, data in enumerate(result):
+            with open(os.path.join(output, f"{first_index + i}.bin"), "wb") as fh:
+                fh.write(data)
+
+    if max_workers == 1:
+        _init_worker(spec)
+        for chunk in _chunks(rows, chunk_size):
+            write_result(num_rows, _pack_chunk(num_rows, header, chunk, per_row))
+            num_rows += len(chunk)
+
+        return num_rows
+
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(spec,)) as executor:
+        # Bound the number of chunks in flight, so memory use does not
+        # depend on the size of the input table
+        max_pending = (max_workers or os.cpu_count() or 1) * 2
+        pending = collections.deque()
+
+        for chunk in _chunks(rows, chunk_size):
+            pending.append((num_rows, executor.submit(_pack_chunk, num_rows, header, chunk, per_row)))
+            num_rows += len(chunk)
+
+            if len(pending) >= max_pending:
+                first_index, future = pending.popleft()
+                write_result(first_index, future.result())
+
+        while pending:
+            first_index, future = pending.popleft()
+            write_result(first_index, future.result())
+
+    return num_rows
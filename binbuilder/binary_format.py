@@ -0,0 +1,476 @@
+"""
+Compact binary container format for saved schemas and sequence lists, an
+alternative to the JSON files written by versionedobj.
+
+A file starts with a fixed header, followed by length-prefixed sections:
+
+    header     magic "BBIN", format revision (uint16), kind of content (uint8)
+    version    UTF-8 version string, matching the "version" field of the
+               equivalent JSON file
+    strings    number of strings, their lengths in bytes, then their UTF-8
+               data, so each distinct name is stored once
+    colors     RGB colours, so each distinct colour is stored once
+    schema     schema name and byte order (empty for sequence lists)
+    sequences  one fixed-size record per sequence
+    blocks     one fixed-size record per block, in sequence order
+    blobs      raw values of BYTES blocks, concatenated
+    defs       number of sequence records that define referenced sequences,
+               then the sequence record index of each top-level sequence
+
+All integers are little-endian. Names and colours are stored as indexes into
+the string and colour tables. Block values are stored in a signed 64-bit
+field; unsigned 64-bit values are stored as their bit pattern, floating point
+values as the bit pattern of a double, and BYTES values as the offset and
+length of their data in the blob section.
+
+Blocks with a count (revision 2) have ARRAY_FLAG set in their data type, and
+their values are stored packed little-endian in the blob section, like BYTES
+values. The count is the length of the packed values divided by the size of
+the data type.
+
+Sequences embedded by reference (revision 3) are stored once each, as the
+first sequence records, in the order given by referenced_sequences; the defs
+section gives their number. A reference is stored as a block record with data
+type REFERENCE, its value holding the index of the referenced sequence record
+and the repeat count (0 if none) in the upper 32 bits. If the reference holds
+loaded values, they are stored packed little-endian in the blob section, and
+the varname prefix field holds their offset plus one, and is otherwise 0.
+
+Top-level sequences (revision 4) are listed in the defs section by the index
+of their sequence record, so that a top-level sequence that is also
+referenced is stored once, as a definition, and decodes to a single object.
+In earlier revisions the top-level sequences are the records after the
+definitions.
+
+Files of revisions 1 to 3 can still be decoded.
+"""
+import collections
+import itertools
+import struct
+
+from binbuilder.block import (Block, BlockSequence, SequenceRef, Schema, DataType, DATATYPES, intern_color,
+                              string_to_varname, array_from_bytes)
+
+MAGIC = b"BBIN"
+FORMAT_REVISION = 4
+
+# Revisions that can be decoded
+SUPPORTED_REVISIONS = (1, 2, 3, 4)
+
+# Set in the data type of blocks with a count
+ARRAY_FLAG = 0x80
+
+# Data type of block records for references to other sequences
+REFERENCE = 0x40
+
+# Limits of the offsets and lengths of data in the blob section, which share
+# the signed 64-bit value field of a block record, or are stored in its
+# 32-bit varname prefix field
+MAX_BLOB_OFFSET = 0xffffffff
+MAX_BLOB_LENGTH = 0x7fffffff
+
+# Limit of the repeat count of a reference, stored in the upper 32 bits of
+# the signed 64-bit value field
+MAX_REFERENCE_COUNT = 0x7fffffff
+
+# Kinds of content
+KIND_SCHEMA = 0
+KIND_SEQUENCES = 1
+
+_HEADER = struct.Struct("<4sHB")
+_SECTION_LENGTH = struct.Struct("<Q")
+_COUNT = struct.Struct("<I")
+_COLOR = struct.Struct("<iii")
+_SCHEMA = struct.Struct("<IB")
+_SEQUENCE = struct.Struct("<III")
+_BLOCK = struct.Struct("<BIIIq")
+_DOUBLE = struct.Struct("<d")
+_INT64 = struct.Struct("<q")
+
+_FLOAT_TYPES = (DataType.FLOAT, DataType.DOUBLE)
+
+# Block types whose stored value needs converting when decoded
+_CONVERTED_TYPES = (DataType.BYTES, DataType.UINT_8B, DataType.FLOAT, DataType.DOUBLE)
+
+# File extension selecting the binary format, instead of JSON
+BINARY_EXTENSION = ".bschemab"
+
+
+def is_binary_file(filename):
+    """
+    Check if a file should be saved and loaded in the binary format, based
+    on its extension
+
+    :param str filename: file name
+
+    :return: True if the file uses the binary format
+    :rtype: bool
+    """
+    return filename.endswith(BINARY_EXTENSION)
+
+
+class _Tables(object):
+    """
+    String and colour tables built while encoding
+    """
+    def __init__(self):
+        self.strings = {}
+        self.colors = {}
+
+    def string(self, s):
+        return self.strings.setdefault(s, len(self.strings))
+
+    def color(self, color):
+        return self.colors.setdefault(color, len(self.colors))
+
+
+def _section(data):
+    return _SECTION_LENGTH.pack(len(data)) + data
+
+
+def _blob_field(name, offset, length):
+    # Value field holding the offset and length of data in the blob section
+    if offset > MAX_BLOB_OFFSET:
+        raise ValueError(f"Cannot encode '{name}', since the blob section holding the values of "
+                         f"BYTES blocks, blocks with a count and references exceeds 4 GiB before it")
+
+    if length > MAX_BLOB_LENGTH:
+        raise ValueError(f"Cannot encode '{name}', since its value exceeds {MAX_BLOB_LENGTH} bytes")
+
+    return offset | (length << 32)
+
+
+def _encode_value(block, blobs, blob_size):
+    datatype = block.typeinfo.datatype
+    if block.count is not None:
+        value = block.pack_value()
+    else:
+        value = block.value
+
+    if (datatype == DataType.BYTES) or (block.count is not None):
+        blobs.append(value)
+        return _blob_field(block.name, blob_size, len(value)), blob_size + len(value)
+    elif datatype in _FLOAT_TYPES:
+        return _INT64.unpack(_DOUBLE.pack(value))[0], blob_size
+    elif (datatype == DataType.UINT_8B) and ((1 << 63) <= value < (1 << 64)):
+        return value - (1 << 64), blob_size
+
+    return value, blob_size
+
+
+def _encode_reference(ref, definitions, tables, blobs, blob_size):
+    if (ref.count or 0) > MAX_REFERENCE_COUNT:
+        raise ValueError(f"Cannot encode '{ref.name}', since its count exceeds {MAX_REFERENCE_COUNT}")
+
+    data_field = 0
+    if ref.value is not None:
+        data = ref.pack_value()
+        if (blob_size + 1) > MAX_BLOB_OFFSET:
+            raise ValueError(f"Cannot encode '{ref.name}', since the blob section holding the values of "
+                             f"BYTES blocks, blocks with a count and references exceeds 4 GiB before it")
+
+        blobs.append(data)
+        data_field = blob_size + 1
+        blob_size += len(data)
+
+    value = definitions[id(ref.sequence)] | ((ref.count or 0) << 32)
+    record = _BLOCK.pack(REFERENCE, tables.string(ref.name), data_field, tables.color(ref.color), value)
+    return record, blob_size
+
+
+def _encode(kind, version, schema_header, sequences, tables):
+    sequence_records = []
+    block_records = []
+    blobs = []
+    blob_size = 0
+
+    referenced = collections.OrderedDict()
+    for seq in sequences:
+        for s in seq.referenced_sequences():
+            referenced.setdefault(id(s), s)
+
+    definitions = {key: i for i, key in enumerate(referenced)}
+
+    # Top-level sequences that are also referenced are only stored as definitions
+    records = list(referenced.values()) + [s for s in sequences if id(s) not in definitions]
+    record_indexes = {id(s): i for i, s in enumerate(records)}
+    top_level = [record_indexes[id(s)] for s in sequences]
+
+    for seq in records:
+        blocklist = seq.blocklist
+        sequence_records.append(_SEQUENCE.pack(tables.string(seq.name), tables.color(seq.color),
+                                               len(blocklist)))
+
+        for block in blocklist:
+            if isinstance(block, SequenceRef):
+                record, blob_size = _encode_reference(block, definitions, tables, blobs, blob_size)
+                block_records.append(record)
+                continue
+
+            value, blob_size = _encode_value(block, blobs, blob_size)
+            datatype = block.typeinfo.datatype
+            if block.count is not None:
+                datatype |= ARRAY_FLAG
+
+            try:
+                block_records.append(_BLOCK.pack(datatype, tables.string(block.name),
+                                                 tables.string(block.varname_prefix),
+                                                 tables.color(block.color), value))
+            except struct.error:
+                raise ValueError(f"value of '{block.name}' is out of range for its type")
+
+    encoded_strings = [s.encode("utf-8") for s in tables.strings]
+    strings = b"".join([_COUNT.pack(len(encoded_strings)),
+                        struct.pack(f"<{len(encoded_strings)}I", *[len(s) for s in encoded_strings])]
+                       + encoded_strings)
+
+    colors = b"".join([_COUNT.pack(len(tables.colors))] + [_COLOR.pack(*c) for c in tables.colors])
+
+    return b"".join([
+        _HEADER.pack(MAGIC, FORMAT_REVISION, kind),
+        _section(version.encode("utf-8")),
+        _section(strings),
+        _section(colors),
+        _section(schema_header),
+        _section(b"".join(sequence_records)),
+        _section(b"".join(block_records)),
+        _section(b"".join(blobs)),
+        _section(struct.pack(f"<II{len(top_level)}I", len(definitions), len(top_level), *top_level)),
+    ])
+
+
+def encode_schema(schema, version):
+    """
+    Encode a schema in the binary format
+
+    :param Schema schema: schema to encode
+    :param str version: version string to store, as for SavedSchema.version
+
+    :return: encoded schema
+    :rtype: bytes
+    """
+    tables = _Tables()
+    header = _SCHEMA.pack(tables.string(schema.name), 1 if schema.big_endian else 0)
+    return _encode(KIND_SCHEMA, version, header, schema.sequencelist, tables)
+
+
+def encode_sequences(sequences, version):
+    """
+    Encode a list of sequences in the binary format
+
+    :param list sequences: list of BlockSequence objects to encode
+    :param str version: version string to store, as for SavedSequenceList.version
+
+    :return: encoded sequences
+    :rtype: bytes
+    """
+    return _encode(KIND_SEQUENCES, version, b"", sequences, _Tables())
+
+
+class _Reader(object):
+    """
+    Reads length-prefixed sections from an encoded buffer, without copying it
+    """
+    def __init__(self, data, offset=0):
+        self.data = memoryview(data)
+        self.offset = offset
+
+    def section(self):
+        if (self.offset + _SECTION_LENGTH.size) > len(self.data):
+            raise ValueError("Truncated binary file")
+
+        length = _SECTION_LENGTH.unpack_from(self.data, self.offset)[0]
+        start = self.offset + _SECTION_LENGTH.size
+        self.offset = start + length
+        if self.offset > len(self.data):
+            raise ValueError("Truncated binary file")
+
+        return self.data[start:self.offset]
+
+
+def _decode_strings(data):
+    count = _COUNT.unpack_from(data)[0]
+    lengths = struct.unpack_from(f"<{count}I", data, _COUNT.size)
+    raw = bytes(data[_COUNT.size + (4 * count):])
+
+    strings = []
+    pos = 0
+    for length in lengths:
+        strings.append(raw[pos:pos + length].decode("utf-8"))
+        pos += length
+
+    return strings
+
+
+def _decode_colors(data):
+    return [intern_color(c) for c in _COLOR.iter_unpack(data[_COUNT.size:])]
+
+
+def _decode_value(datatype, value, blobs):
+    if datatype == DataType.BYTES:
+        offset = value & 0xffffffff
+        return bytes(blobs[offset:offset + ((value >> 32) & 0xffffffff)])
+    elif datatype in _FLOAT_TYPES:
+        return _DOUBLE.unpack(_INT64.pack(value))[0]
+    elif (datatype == DataType.UINT_8B) and (value < 0):
+        return value + (1 << 64)
+
+    return value
+
+
+def _decode(data, expected_kind, expected_version):
+    try:
+        return _decode_sections(data, expected_kind, expected_version)
+    except (struct.error, UnicodeDecodeError, IndexError, KeyError):
+        raise ValueError("Corrupt binary file")
+
+
+def _decode_sections(data, expected_kind, expected_version):
+    if len(data) < _HEADER.size:
+        raise ValueError("Not a binbuilder binary file")
+
+    magic, revision, kind = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a binbuilder binary file")
+
+    if revision not in SUPPORTED_REVISIONS:
+        raise ValueError(f"Unsupported binary format revision {revision}")
+
+    if kind != expected_kind:
+        raise ValueError("Binary file has the wrong kind of content")
+
+    reader = _Reader(data, _HEADER.size)
+
+    version = bytes(reader.section()).decode("utf-8")
+    if version != expected_version:
+        raise ValueError(f"Unsupported version '{version}', expected '{expected_version}'")
+
+    strings = _decode_strings(reader.section())
+    colors = _decode_colors(reader.section())
+    schema_header = reader.section()
+    sequence_records = list(_SEQUENCE.iter_unpack(reader.section()))
+    block_section = reader.section()
+    blobs = reader.section()
+    num_definitions = 0
+    top_level = None
+    if revision >= 3:
+        defs = reader.section()
+        num_definitions = _COUNT.unpack_from(defs)[0]
+        if revision >= 4:
+            num_top_level = _COUNT.unpack_from(defs, _COUNT.size)[0]
+            top_level = struct.unpack(f"<II{num_top_level}I", defs)[2:]
+        elif len(defs) != _COUNT.size:
+            raise ValueError("Corrupt binary file")
+
+    if sum([r[2] for r in sequence_records]) * _BLOCK.size != len(block_section):
+        raise ValueError("Binary file has the wrong number of blocks")
+
+    block_records = _BLOCK.iter_unpack(block_section)
+
+    # Block varnames by (prefix, name) string indexes, since the same names
+    # are often used in many sequences
+    varnames = {}
+
+    # Referenced sequences, decoded before any sequences referencing them
+    definitions = []
+
+    def decode_reference(name, data_field, color, value):
+        index = value & 0xffffffff
+        if index >= len(definitions):
+            raise ValueError("Corrupt binary file")
+
+        ref = SequenceRef(definitions[index], strings[name], (value >> 32) or None, colors[color])
+        if data_field:
+            data = blobs[data_field - 1:data_field - 1 + ref.size_bytes()]
+            if len(data) != ref.size_bytes():
+                raise ValueError("Corrupt binary file")
+
+            ref.value = ref.unpack_value(data)
+
+        return ref
+
+    def decode_block(datatype, name, prefix, color, value):
+        if datatype == REFERENCE:
+            return decode_reference(name, prefix, color, value)
+
+        parameter = None
+        count = None
+        if datatype & ARRAY_FLAG:
+            datatype &= ~ARRAY_FLAG
+            if datatype == DataType.BYTES:
+                # BYTES blocks are already arrays, and cannot have a count
+                raise ValueError("Corrupt binary file")
+
+            value = _decode_value(DataType.BYTES, value, blobs)
+            count = len(value) // DATATYPES[datatype].size_bytes
+            if (count == 0) or ((count * DATATYPES[datatype].size_bytes) != len(value)):
+                raise ValueError("Corrupt binary file")
+
+            value = array_from_bytes(datatype, value)
+        elif datatype in _CONVERTED_TYPES:
+            value = _decode_value(datatype, value, blobs)
+            if datatype == DataType.BYTES:
+                parameter = len(value)
+
+        varname = varnames.get((prefix, name))
+        if varname is None:
+            varname = strings[prefix] + string_to_varname(strings[name])
+            varnames[(prefix, name)] = varname
+
+        return Block._from_fields(datatype, strings[name], varname, strings[prefix], value,
+                                  parameter, colors[color], count)
+
+    if num_definitions > len(sequence_records):
+        raise ValueError("Corrupt binary file")
+
+    records = []
+    for name, color, num_blocks in sequence_records:
+        blocks = [decode_block(*r) for r in itertools.islice(block_records, num_blocks)]
+        sequence = BlockSequence(strings[name], blocks, colors[color])
+        records.append(sequence)
+        if len(definitions) < num_definitions:
+            definitions.append(sequence)
+
+    if top_level is None:
+        sequences = records[num_definitions:]
+    else:
+        sequences = [records[i] for i in top_level]
+
+    return strings, schema_header, sequences
+
+
+def decode_schema(data, version):
+    """
+    Decode a schema from the binary format
+
+    :param data: bytes-like object containing an encoded schema
+    :param str version: expected version string, as for SavedSchema.version
+
+    :raises ValueError: if data is not an encoded schema of the expected version
+
+    :return: decoded schema
+    :rtype: Schema
+    """
+    strings, header, sequences = _decode(data, KIND_SCHEMA, version)
+    try:
+        name, big_endian = _SCHEMA.unpack(header)
+        name = strings[name]
+    except (struct.error, IndexError):
+        raise ValueError("Corrupt binary file")
+
+    return Schema(name, sequences, bool(big_endian))
+
+
+def decode_sequences(data, version):
+    """
+    Decode a list of sequences from the binary format
+
+    :param data: bytes-like object containing encoded sequences
+    :param str version: expected version string, as for SavedSequenceList.version
+
+    :raises ValueError: if data is not an encoded sequence list of the expected version
+
+    :return: list of BlockSequence objects
+    :rtype: list
+    """
+    return _decode(data, KIND_SEQUENCES, version)[2]
@@ -1,10 +1,28 @@
+import array
 import base64
+import collections
+import collections.abc
+import functools
+import itertools
+import mmap
+import operator
+import os
 import struct
+import sys
 
 from versionedobj import CustomValue
 
+from binbuilder.instrumentation import timed, result_len, result_value
+
 DEFAULT_BLOCK_COLOR = (85, 85, 127)
 
+# Source of BlockSequence generations, used to track which blocks a sequence
+# may modify in place (see BlockSequence.copy)
+_generations = itertools.count()
+
+# Interned colour tuples, so that blocks with the same colour share one tuple
+_colors = {DEFAULT_BLOCK_COLOR: DEFAULT_BLOCK_COLOR}
+
 
 class DataType(object):
     """
@@ -23,10 +41,24 @@ class DataType(object):
     BYTES = 10
 
 
+class Change(object):
+    """
+    Enumerates the kinds of change reported to observers of a BlockSequence
+    or Schema (see Observable.add_observer)
+    """
+    INSERTED = 0   # An item was inserted at the given index
+    REMOVED = 1    # The item at the given index was removed
+    CHANGED = 2    # The item at the given index was changed, or the observed object itself if None
+    REORDERED = 3  # The items were reordered
+    RESET = 4      # The whole list of items was replaced
+
+
 class DataTypeInfo(object):
     """
     Represents all required information about a single atomic datatype
     """
+    __slots__ = ("datatype", "size_bytes", "name", "pystruct_name", "c_name")
+
     def __init__(self, datatype, size_bytes, name, pystruct_name, c_name):
         self.datatype = datatype
         self.size_bytes = size_bytes
@@ -39,7 +71,43 @@ class DataTypeInfo(object):
                 f"{self.name}, {self.pystruct_name}, {self.c_name})")
 
     def __repr__(self):
-        return __str__()
+        return self.__str__()
+
+
+# Mapping of DataType enum values to numpy type codes, without byte order
+NUMPY_TYPECODES = {
+    DataType.INT_1B: "i1",
+    DataType.INT_2B: "i2",
+    DataType.INT_4B: "i4",
+    DataType.INT_8B: "i8",
+    DataType.UINT_1B: "u1",
+    DataType.UINT_2B: "u2",
+    DataType.UINT_4B: "u4",
+    DataType.UINT_8B: "u8",
+    DataType.FLOAT: "f4",
+    DataType.DOUBLE: "f8",
+}
+
+
+# Mapping of DataType enum values to array module type codes, for the values
+# of blocks with a count
+ARRAY_TYPECODES = {
+    DataType.INT_1B: "b",
+    DataType.INT_2B: "h",
+    DataType.INT_4B: "i",
+    DataType.INT_8B: "q",
+    DataType.UINT_1B: "B",
+    DataType.UINT_2B: "H",
+    DataType.UINT_4B: "I",
+    DataType.UINT_8B: "Q",
+    DataType.FLOAT: "f",
+    DataType.DOUBLE: "d",
+}
+
+
+# Typecodes of unsigned integers of each size, for both the struct and array
+# modules, used to move multi-byte values without interpreting them
+_UNSIGNED_TYPECODES = {2: "H", 4: "I", 8: "Q"}
 
 
 # Mapping of DataType enum values to DataTypeInfo objects
@@ -54,10 +122,109 @@ DATATYPES = {
     DataType.UINT_8B: DataTypeInfo(DataType.UINT_8B, 8, "unsigned integer (8 bytes)",  "Q", "uint64_t {name}"),
     DataType.FLOAT: DataTypeInfo(DataType.FLOAT, 4, "float (4 bytes)",  "f", "float {name}"),
     DataType.DOUBLE: DataTypeInfo(DataType.DOUBLE, 8, "double (8 bytes)",  "d", "double {name}"),
-    DataType.BYTES: DataTypeInfo(DataType.BYTES, None, "bytes (arbitrary length)",  "s{parameter}", "uint8_t {name}[{parameter}]")
+    DataType.BYTES: DataTypeInfo(DataType.BYTES, None, "bytes (arbitrary length)",  "{parameter}s", "uint8_t {name}[{parameter}]")
 }
 
 
+def intern_color(color):
+    """
+    Get a shared tuple for an RGB colour, so that many blocks and sequences
+    with the same colour do not each hold their own copy
+
+    :param color: RGB colour as any sequence of 3 integers
+
+    :return: RGB colour
+    :rtype: tuple
+    """
+    color = tuple(color)
+    return _colors.setdefault(color, color)
+
+
+def array_to_bytes(value, big_endian=False):
+    """
+    Pack the value of a block with a count
+
+    :param array.array value: array of values
+    :param bool big_endian: if True, values are packed big-endian
+
+    :return: packed values
+    :rtype: bytes
+    """
+    if (sys.byteorder == "big") != big_endian:
+        value = array.array(value.typecode, value)
+        value.byteswap()
+
+    return value.tobytes()
+
+
+def array_from_bytes(datatype, data, big_endian=False):
+    """
+    Unpack the value of a block with a count
+
+    :param int datatype: data type of the block
+    :param data: bytes-like object containing packed values
+    :param bool big_endian: if True, values are unpacked as big-endian
+
+    :return: array of values
+    :rtype: array.array
+    """
+    ret = array.array(ARRAY_TYPECODES[datatype])
+    ret.frombytes(data)
+    if (sys.byteorder == "big") != big_endian:
+        ret.byteswap()
+
+    return ret
+
+
+def pack_array(name, datatype, count, values, big_endian=False):
+    """
+    Pack a list of values for a field of a block with a count, as expected by
+    a codec (see Block.codec_fmtstring). Bytes are assumed to be packed already.
+
+    :param str name: field name, for error messages
+    :param int datatype: data type of the block
+    :param int count: number of values in the block
+    :param values: list of values, or packed bytes
+    :param bool big_endian: if True, values are packed big-endian
+
+    :raises ValueError: if values does not have one valid value per element
+
+    :return: packed values
+    :rtype: bytes
+    """
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        size = count * DATATYPES[datatype].size_bytes
+        if len(values) != size:
+            raise ValueError(f"Field '{name}' takes {size} bytes, got {len(values)}")
+
+        return values
+    elif not isinstance(values, (list, tuple, array.array)):
+        raise ValueError(f"Field '{name}' takes a list of {count} values")
+    elif len(values) != count:
+        raise ValueError(f"Field '{name}' takes {count} values, got {len(values)}")
+
+    try:
+        return array_to_bytes(array.array(ARRAY_TYPECODES[datatype], values), big_endian)
+    except (TypeError, OverflowError) as e:
+        raise ValueError(f"Invalid values for field '{name}': {e}")
+
+
+def import_numpy():
+    """
+    Import numpy on first use, so that it remains an optional dependency and
+    does not slow down importing this module
+
+    :return: numpy module
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("numpy is required for numpy dtype support")
+
+    return numpy
+
+
+@functools.lru_cache(maxsize=4096)
 def string_to_varname(s):
     """
     Convert an ASCII string to a valid C variable name
@@ -86,12 +253,39 @@ def string_to_varname(s):
     return ret
 
 
+def _check_writable(block):
+    # Blocks shared between copies of a sequence (see BlockSequence.copy)
+    # must be copied before they are modified, by getting them from the
+    # sequence with get_block_by_name or get_block
+    owner = block._owner
+    if (owner is not None) and (block._generation != owner._generation):
+        raise ValueError(f"Block '{block.name}' may be shared with a copy of its sequence, "
+                         f"get it with get_block_by_name or get_block to modify it")
+
+
 class Block(object):
     """
-    Represents a single data field of a particular atomic data type
+    Represents a single data field of a particular atomic data type, or an
+    array of a fixed number of values of the same type.
+
+    Blocks with a count (other than BYTES blocks, which are already arrays)
+    hold an array.array of exactly count values, and map to an array in
+    generated C code (e.g. 'uint16_t table[4096]') and to a repeated format
+    in struct format strings (e.g. '4096H'). Their value is given as a tuple,
+    so that it can only be changed through the setter. Codecs pack them as a
+    single bytes field (see codec_fmtstring); Schema.emit_many,
+    Schema.iter_records and SchemaView take and give their values as lists
+    instead.
     """
+    __slots__ = ("_owner", "_generation", "typeinfo", "name", "varname", "varname_prefix", "_value",
+                 "_parameter", "_color", "_count")
+
     def __init__(self, datatype=DataType.UINT_4B, name="", default_value=0, parameter=None,
-                 varname_prefix='', color=DEFAULT_BLOCK_COLOR):
+                 varname_prefix='', color=DEFAULT_BLOCK_COLOR, count=None):
+        self._owner = None
+        self._generation = None
+        self._count = None
+        self._value = None
         self.typeinfo = None
         self.set_type(datatype)
 
@@ -103,40 +297,209 @@ class Block(object):
         self.varname_prefix = varname_prefix
         self.value = default_value
         self.parameter = parameter
+        self.count = count
 
         self.color = color
 
+    @classmethod
+    def _from_fields(cls, datatype, name, varname, varname_prefix, value, parameter, color, count=None):
+        # Fast constructor for file decoders, which have already computed the
+        # varname and interned the colour. The new block has no owner, so the
+        # setters used by __init__ would have nothing else to do.
+        block = cls.__new__(cls)
+        block._owner = None
+        block._generation = None
+        block.typeinfo = DATATYPES[datatype]
+        block.name = name
+        block.varname = varname
+        block.varname_prefix = varname_prefix
+        block._value = value
+        block._parameter = parameter
+        block._color = color
+        block._count = count
+        return block
+
     def emit_data(self, big_endian=False):
-        if DataType.BYTES == self.typeinfo.datatype:
-            return struct.pack(f"s{self.size_bytes()}", self.value)
+        if self._count is not None:
+            return array_to_bytes(self._value, big_endian)
 
         end = ">" if big_endian else "<"
-        return struct.pack(end + self.typeinfo.pystruct_name, self.value)
+        return struct.pack(end + self.pystruct_fmtstring(), self.value)
 
-    def load_data(self, data, big_endian=False):
+    def load_data(self, data, big_endian=False, offset=0):
+        """
+        Load the value of this block from a buffer, without copying the buffer
+
+        :param data: bytes-like object to read from
+        :param bool big_endian: if True, data is read as big-endian
+        :param int offset: byte offset in data at which this block starts
+
+        :return: number of bytes consumed
+        :rtype: int
+        """
+        _check_writable(self)
         size = self.size_bytes()
-        sub_data = data[:size]
+        if (len(data) - offset) < size:
+            raise ValueError("Not enough data provided for this block")
 
-        if DataType.BYTES == self.typeinfo.datatype:
-            self.value = sub_data
+        if self._count is not None:
+            self._value = array_from_bytes(self.typeinfo.datatype, data[offset:offset + size], big_endian)
         else:
             end = ">" if big_endian else "<"
-            self.value = struct.unpack(end + self.pystruct_name)[0]
+            self.value = struct.unpack_from(end + self.pystruct_fmtstring(), data, offset)[0]
 
-        return data[size:]
+        return size
 
     def copy(self):
-        return Block(self.typeinfo.datatype, self.name, self.value, self.parameter, self.varname_prefix)
+        return Block(self.typeinfo.datatype, self.name, self.value, self.parameter, self.varname_prefix,
+                     self.color, self.count)
+
+    @property
+    def packs_value(self):
+        # True if codecs pack the value of this block as bytes given by pack_value
+        return self._count is not None
+
+    def pack_value(self, big_endian=False):
+        return array_to_bytes(self._value, big_endian)
+
+    def swap_parts(self):
+        # Multi-byte values in this block, as Layout.swap_parts
+        if (self.typeinfo.datatype == DataType.BYTES) or (self.typeinfo.size_bytes == 1):
+            return ()
+
+        return ((0, self.typeinfo.size_bytes, 1 if self._count is None else self._count, None),)
+
+    def unpack_value(self, data, big_endian=False):
+        return array_from_bytes(self.typeinfo.datatype, data, big_endian)
 
     def set_name(self, name):
+        _check_writable(self)
         self.name = name
         self.varname = self.varname_prefix + string_to_varname(name)
 
+        if self._owner is not None:
+            self._owner._invalidate_index()
+
+    def _assign(self, other):
+        # Make this block identical to another, without changing ownership
+        self.set_type(other.typeinfo.datatype)
+        self.varname_prefix = other.varname_prefix
+        self.set_name(other.name)
+        self.count = other.count
+        self.value = other.value
+        self.parameter = other.parameter
+        self.color = other.color
+
     def set_type(self, datatype):
+        """
+        Change the data type of this block. BYTES blocks have no count, so
+        changing to BYTES removes the count. The values of a block with a
+        count are converted to the new type, or reset to zero if they cannot be.
+
+        :param int datatype: new data type
+        """
+        _check_writable(self)
         self.typeinfo = DATATYPES[datatype]
 
+        if self._count is not None:
+            if datatype == DataType.BYTES:
+                self.count = None
+            else:
+                try:
+                    self.value = self._value
+                except ValueError:
+                    self.value = 0
+
+        if self._owner is not None:
+            self._owner._invalidate_layout()
+
+    def _array_value(self, value):
+        # Convert a single value, or a sequence of up to count values, to an
+        # array of exactly count values of the type of this block
+        if not isinstance(value, (array.array, list, tuple)):
+            value = [value] * self._count
+        elif len(value) < self._count:
+            value = list(value) + ([0] * (self._count - len(value)))
+
+        try:
+            return array.array(ARRAY_TYPECODES[self.typeinfo.datatype], value[:self._count])
+        except (TypeError, OverflowError):
+            raise ValueError(f"values are not valid for type '{self.typeinfo.name}'")
+
+    @property
+    def value(self):
+        # The values of a block with a count are given as a tuple, since
+        # changing the array in place would bypass _check_writable
+        if self._count is not None:
+            return tuple(self._value)
+
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        _check_writable(self)
+        if self._count is not None:
+            value = self._array_value(value)
+
+        self._value = value
+
+    @property
+    def count(self):
+        return self._count
+
+    @count.setter
+    def count(self, count):
+        _check_writable(self)
+        if count is not None:
+            if self.typeinfo.datatype == DataType.BYTES:
+                raise ValueError("BYTES blocks cannot have a count")
+
+            if count < 1:
+                raise ValueError("Block count must be at least 1")
+
+            self._count = count
+            self.value = self._value
+        elif self._count is not None:
+            self._count = None
+            if isinstance(self._value, array.array):
+                self.value = self._value[0] if self._value else 0
+
+        if self._owner is not None:
+            self._owner._invalidate_layout()
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        _check_writable(self)
+        self._color = intern_color(color)
+
+    @property
+    def parameter(self):
+        return self._parameter
+
+    @parameter.setter
+    def parameter(self, parameter):
+        _check_writable(self)
+        self._parameter = parameter
+
+        if self._owner is not None:
+            self._owner._invalidate_layout()
+
     def set_value_string(self, value):
-        if self.typeinfo.datatype in [DataType.FLOAT, DataType.DOUBLE]:
+        _check_writable(self)
+        if self._count is not None:
+            convert = float if self.typeinfo.datatype in [DataType.FLOAT, DataType.DOUBLE] else int
+            values = [convert(v) for v in value.replace(",", " ").split()]
+            if len(values) == 1:
+                values = values[0]
+            elif len(values) != self._count:
+                raise ValueError(f"Expected 1 or {self._count} values, got {len(values)}")
+
+            self.value = values
+        elif self.typeinfo.datatype in [DataType.FLOAT, DataType.DOUBLE]:
             self.value = float(value)
         elif self.typeinfo.datatype == DataType.BYTES:
             self.value = bytes.fromhex(value)
@@ -145,7 +508,12 @@ class Block(object):
             self.value = int(value)
 
     def value_string(self):
-        if self.typeinfo.datatype in [DataType.FLOAT, DataType.DOUBLE]:
+        if self._count is not None:
+            if self.typeinfo.datatype in [DataType.FLOAT, DataType.DOUBLE]:
+                return ", ".join([f"{v:.4f}" for v in self.value])
+
+            return ", ".join([str(v) for v in self.value])
+        elif self.typeinfo.datatype in [DataType.FLOAT, DataType.DOUBLE]:
             return f"{self.value:.4f}"
         elif self.typeinfo.datatype == DataType.BYTES:
             return " ".join([f"{b:02X}" for b in self.value])
@@ -155,9 +523,54 @@ class Block(object):
     def size_bytes(self):
         if DataType.BYTES == self.typeinfo.datatype:
             return 0 if self.parameter is None else self.parameter
+        elif self._count is not None:
+            return self.typeinfo.size_bytes * self._count
 
         return self.typeinfo.size_bytes
 
+    def numpy_typestring(self, big_endian=False, raw_bytes=False):
+        """
+        Get the numpy type string for this block
+
+        :param bool big_endian: if True, multi-byte fields are big-endian
+        :param bool raw_bytes: if True, BYTES blocks map to 'V{n}' (raw void)
+            rather than 'S{n}', which strips trailing null bytes on access
+
+        :return: numpy type string, e.g. '>u4'
+        :rtype: str
+        """
+        if DataType.BYTES == self.typeinfo.datatype:
+            return ("V" if raw_bytes else "S") + str(self.size_bytes())
+
+        shape = "" if self._count is None else f"({self._count},)"
+
+        if self.typeinfo.size_bytes == 1:
+            return shape + "|" + NUMPY_TYPECODES[self.typeinfo.datatype]
+
+        return shape + (">" if big_endian else "<") + NUMPY_TYPECODES[self.typeinfo.datatype]
+
+    def pystruct_fmtstring(self):
+        if DataType.BYTES == self.typeinfo.datatype:
+            return self.typeinfo.pystruct_name.format(parameter=self.size_bytes())
+        elif self._count is not None:
+            return f"{self._count}{self.typeinfo.pystruct_name}"
+
+        return self.typeinfo.pystruct_name
+
+    def codec_fmtstring(self):
+        """
+        Get the struct format of this block as a single field of a Codec.
+        Blocks with a count are packed as one bytes field, holding their
+        values packed in the byte order of the codec (see array_to_bytes).
+
+        :return: struct format string, e.g. 'I' or '8192s'
+        :rtype: str
+        """
+        if self._count is not None:
+            return f"{self.size_bytes()}s"
+
+        return self.pystruct_fmtstring()
+
     def __str__(self):
         return f"{self.__class__.__name__}({self.name}, {self.value}, {self.typeinfo.datatype}, {self.parameter})"
 
@@ -167,11 +580,18 @@ class Block(object):
     def to_dict(self):
         if DataType.BYTES == self.typeinfo.datatype:
             value = base64.b64encode(self.value).decode('UTF-8')
+        elif self._count is not None:
+            value = self._value.tolist()
         else:
             value = self.value
 
-        return {"type": self.typeinfo.datatype, "name": self.name,
-                "var_prefix": self.varname_prefix, "value": value, "color": self.color}
+        ret = {"type": self.typeinfo.datatype, "name": self.name,
+               "var_prefix": self.varname_prefix, "value": value, "color": self.color}
+
+        if self._count is not None:
+            ret["count"] = self._count
+
+        return ret
 
     @classmethod
     def from_dict(cls, attrs):
@@ -179,7 +599,7 @@ class Block(object):
         name = attrs["name"]
         var_prefix = attrs["var_prefix"]
         value = attrs["value"]
-        color = tuple(attrs["color"])
+        color = attrs["color"]
 
         if DataType.BYTES == datatype:
             value = base64.b64decode(bytes(value, 'UTF-8'))
@@ -187,14 +607,421 @@ class Block(object):
         else:
             param = None
 
-        return Block(datatype, name, value, parameter=param, varname_prefix=var_prefix, color=color)
+        return Block(datatype, name, value, parameter=param, varname_prefix=var_prefix, color=color,
+                     count=attrs.get("count"))
 
 
-class BlockSequence(object):
+class SequenceRef(object):
     """
-    Represents a sequence of data fields, containing multiple Block objects
+    Embeds another BlockSequence in a sequence by reference, optionally
+    repeated count times, without copying its blocks. Any number of
+    references may share one sequence; codecs pack each reference as a
+    single bytes field using the codec of the referenced sequence, and
+    generated C code declares the referenced sequence once as its own struct.
+
+    By default every instance takes the current values of the referenced
+    sequence. Loading data into a reference keeps the loaded values of all
+    instances in value, as one bytes object packed little-endian, and
+    instances are only decoded when requested (see instance). Loaded values
+    are discarded if the layout of the referenced sequence changes.
     """
+    __slots__ = ("_owner", "_generation", "sequence", "name", "varname", "_count", "_color", "_value",
+                 "_value_layout")
+
+    packs_value = True
+
+    def __init__(self, sequence, name=None, count=None, color=None):
+        self._owner = None
+        self._generation = None
+        self.sequence = sequence
+        self._value = None
+        self._value_layout = None
+
+        self.name = None
+        self.varname = None
+        self.set_name(sequence.name if name is None else name)
+
+        self._count = None
+        self.count = count
+        self.color = sequence.color if color is None else color
+
+    def set_name(self, name):
+        _check_writable(self)
+        self.name = name
+        self.varname = string_to_varname(name)
+
+        if self._owner is not None:
+            self._owner._invalidate_index()
+
+    @property
+    def value(self):
+        return self._loaded_value()
+
+    @value.setter
+    def value(self, value):
+        _check_writable(self)
+        if value is not None:
+            value = bytes(value)
+            if len(value) != self.size_bytes():
+                raise ValueError(f"Loaded values of '{self.name}' must be {self.size_bytes()} bytes, "
+                                 f"not {len(value)}")
+
+        self._value = value
+        self._value_layout = None if value is None else self.sequence.layout()
+
+    @property
+    def count(self):
+        return self._count
+
+    @count.setter
+    def count(self, count):
+        _check_writable(self)
+        if (count is not None) and (count < 1):
+            raise ValueError("Reference count must be at least 1")
+
+        if count != self._count:
+            self.value = None
+
+        self._count = count
+
+        if self._owner is not None:
+            self._owner._invalidate_layout()
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        _check_writable(self)
+        self._color = intern_color(color)
+
+    def copy(self):
+        ret = SequenceRef(self.sequence, self.name, self.count, self.color)
+        ret._value = self._value
+        ret._value_layout = self._value_layout
+        return ret
+
+    def _assign(self, other):
+        # Make this reference identical to another, without changing ownership
+        _check_writable(self)
+        self.sequence = other.sequence
+        self.set_name(other.name)
+        self.count = other.count
+        self._value = other._value
+        self._value_layout = other._value_layout
+        self.color = other.color
+
+    def _loaded_value(self):
+        # Loaded values, or None if there are none or the layout of the
+        # referenced sequence has changed since they were loaded
+        if self._value is not None:
+            layout = self.sequence.layout()
+            loaded = self._value_layout
+            if (loaded is not layout) and ((loaded.fmtstring != layout.fmtstring) or
+                                           (loaded.field_names != layout.field_names)):
+                # Discarding stale values changes nothing visible, so is
+                # allowed even if this reference is shared
+                self._value = None
+                self._value_layout = None
+
+        return self._value
+
+    def instance(self, index):
+        """
+        Get the values of one instance. Loaded values are decoded into a new
+        copy of the referenced sequence; otherwise the referenced sequence
+        itself is returned.
+
+        :param int index: index of the instance
+
+        :return: sequence holding the values of the instance
+        :rtype: BlockSequence
+        """
+        if not (0 <= index < (1 if self._count is None else self._count)):
+            raise ValueError(f"No instance {index} in '{self.name}'")
+
+        value = self._loaded_value()
+        if value is None:
+            return self.sequence
+
+        instance = self.sequence.copy()
+        instance.load_data(value, False, index * self.sequence.size_bytes())
+        return instance
+
+    def instances(self):
+        """
+        Get the values of each instance in turn, as for instance
+
+        :return: iterator of BlockSequence objects, one per instance
+        """
+        for i in range(1 if self._count is None else self._count):
+            yield self.instance(i)
+
+    def size_bytes(self):
+        return self.sequence.size_bytes() * (1 if self._count is None else self._count)
+
+    def pystruct_fmtstring(self):
+        return self.sequence.generate_pystruct_fmtstring() * (1 if self._count is None else self._count)
+
+    def codec_fmtstring(self):
+        return f"{self.size_bytes()}s"
+
+    def numpy_typestring(self, big_endian=False, raw_bytes=False):
+        """
+        Get the numpy type of this reference, a nested structured dtype.
+        Requires numpy.
+
+        :param bool big_endian: if True, multi-byte fields are big-endian
+        :param bool raw_bytes: if True, BYTES blocks map to 'V{n}' rather than 'S{n}'
+
+        :return: numpy dtype
+        :rtype: numpy.dtype
+        """
+        numpy = import_numpy()
+        dtype = numpy.dtype([(b.varname, b.numpy_typestring(big_endian, raw_bytes))
+                             for b in self.sequence.blocklist])
+
+        if self._count is None:
+            return dtype
+
+        return numpy.dtype((dtype, (self._count,)))
+
+    def swap_parts(self):
+        # Every instance, as one part repeating the layout of the referenced
+        # sequence (see Layout.swap_parts)
+        layout = self.sequence.layout()
+        return ((0, layout.size_bytes, 1 if self._count is None else self._count, layout),)
+
+    def pack_value(self, big_endian=False):
+        value = self._loaded_value()
+        if value is None:
+            return self.sequence.emit_data(big_endian) * (1 if self._count is None else self._count)
+        elif not big_endian:
+            return value
+
+        data = bytearray(value)
+        self.sequence.layout().swapper().swap(data)
+        return bytes(data)
+
+    def unpack_value(self, data, big_endian=False):
+        # Loaded values are kept little-endian, whatever order they were loaded in
+        data = bytearray(data)
+        if big_endian:
+            self.sequence.layout().swapper().swap(data)
+
+        return bytes(data)
+
+    def emit_data(self, big_endian=False):
+        return self.pack_value(big_endian)
+
+    def load_data(self, data, big_endian=False, offset=0):
+        """
+        Load the values of all instances from a buffer
+
+        :param data: bytes-like object to read from
+        :param bool big_endian: if True, data is read as big-endian
+        :param int offset: byte offset in data at which the first instance starts
+
+        :return: number of bytes consumed
+        :rtype: int
+        """
+        size = self.size_bytes()
+        if (len(data) - offset) < size:
+            raise ValueError("Not enough data provided for this reference")
+
+        self.value = self.unpack_value(memoryview(data)[offset:offset + size], big_endian)
+        return size
+
+    def value_string(self):
+        if self._count is None:
+            return self.sequence.name
+
+        return f"{self._count:,} x {self.sequence.name}"
+
+    def __str__(self):
+        return f"{self.__class__.__name__}({self.name}, {self.sequence.name}, {self._count})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def to_dict(self, definitions):
+        ret = {"ref": definitions.index(self.sequence), "name": self.name, "color": self.color}
+
+        if self._count is not None:
+            ret["count"] = self._count
+
+        if self.value is not None:
+            ret["data"] = base64.b64encode(self.pack_value()).decode('UTF-8')
+
+        return ret
+
+    @classmethod
+    def from_dict(cls, attrs, definitions):
+        ref = SequenceRef(definitions[attrs["ref"]], attrs["name"], attrs.get("count"), attrs["color"])
+        if "data" in attrs:
+            ref.value = ref.unpack_value(base64.b64decode(bytes(attrs["data"], 'UTF-8')))
+
+        return ref
+
+
+class _Definitions(object):
+    """
+    Sequences referenced by SequenceRef objects, collected while converting
+    sequences or schemas to dicts so that each is stored once. Sequences are
+    listed after any sequences they reference themselves.
+    """
+    def __init__(self):
+        self.indexes = {}
+        self.dicts = []
+
+    def index(self, sequence):
+        i = self.indexes.get(id(sequence))
+        if i is None:
+            attrs = sequence._to_dict(self)
+            i = len(self.dicts)
+            self.dicts.append(attrs)
+            self.indexes[id(sequence)] = i
+
+        return i
+
+
+def _decode_definitions(dicts):
+    definitions = []
+    for attrs in dicts:
+        definitions.append(BlockSequence.from_dict(attrs, definitions))
+
+    return definitions
+
+
+def _move_items(items, src, count, dst):
+    # Move count items of a list starting at src, so that the first of them
+    # ends up at dst, in place
+    if (count < 1) or (src < 0) or (dst < 0) or (max(src, dst) + count > len(items)):
+        raise ValueError(f"Cannot move {count} items from position {src} to {dst} of {len(items)}")
+
+    moving = items[src:src + count]
+    del items[src:src + count]
+    items[dst:dst] = moving
+
+
+def _c_value(block):
+    # C initializer for the value of a block or reference
+    if isinstance(block, SequenceRef):
+        def initializer(s):
+            return "{" + ", ".join([f".{b.varname}={_c_value(b)}" for b in s.blocklist]) + "}"
+
+        if block.value is None:
+            # Instances using the values of the referenced sequence are identical
+            values = [initializer(block.sequence)] * (1 if block.count is None else block.count)
+        else:
+            values = [initializer(s) for s in block.instances()]
+
+        return values[0] if block.count is None else "{" + ", ".join(values) + "}"
+
+    dtype = block.typeinfo.datatype
+
+    suffix = ""
+    if (dtype >= DataType.UINT_1B) and (dtype <= DataType.UINT_8B):
+        suffix = "u"
+    elif dtype == DataType.FLOAT:
+        suffix = "f"
+
+    if dtype == DataType.BYTES:
+        return "{" + ", ".join(f"0x{b:02x}u" for b in block.value) + "}"
+    elif block.count is not None:
+        return "{" + ", ".join([f"{v}{suffix}" for v in block.value]) + "}"
+
+    return f"{block.value}{suffix}"
+
+
+class Observable(object):
+    """
+    Mixin for objects that report changes to their list of items to observers.
+    Classes using it must define an _observers slot holding a list.
+    """
+    __slots__ = ()
+
+    def add_observer(self, callback):
+        """
+        Register a function to be called after each change, as
+        callback(event, index), where event is one of the Change values and
+        index is the position of the affected item (None if not applicable)
+
+        :param callback: function to call after each change
+        """
+        self._observers.append(callback)
+
+    def remove_observer(self, callback):
+        """
+        Unregister a function previously passed to add_observer
+
+        :param callback: function to unregister
+        """
+        self._observers.remove(callback)
+
+    def _notify(self, event, index=None):
+        for callback in list(self._observers):
+            callback(event, index)
+
+
+class _ListView(collections.abc.Sequence):
+    """
+    Read-only view of the block list of a sequence or the sequence list of a
+    schema, following its owner when it replaces the list, e.g. to take a
+    private copy of a shared list
+    """
+    __slots__ = ("_owner", "_attr")
+
+    def __init__(self, owner, attr):
+        self._owner = owner
+        self._attr = attr
+
+    def __len__(self):
+        return len(getattr(self._owner, self._attr))
+
+    def __getitem__(self, i):
+        return getattr(self._owner, self._attr)[i]
+
+    def __iter__(self):
+        return iter(getattr(self._owner, self._attr))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, _ListView)):
+            return list(self) == list(other)
+
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(getattr(self._owner, self._attr))
+
+
+class BlockSequence(Observable):
+    """
+    Represents a sequence of data fields, containing multiple Block objects.
+
+    Insertions, removals and reordering of blocks are reported to observers.
+    Changes made to a block in place are reported once recorded in an
+    EditHistory, or by calling block_changed.
+
+    The blocklist is a read-only view; blocks that are going to be modified
+    must be obtained with get_block_by_name or get_block, since copies of a
+    sequence share their blocks until one side modifies them (see copy).
+    Modifying a block that may be shared raises ValueError.
+    """
+    __slots__ = ("_owner", "_generation", "_shared", "_blocklist", "_index", "_layout", "_codecs",
+                 "_observers", "name", "varname", "_color")
+
     def __init__(self, name, blocklist=[], color=DEFAULT_BLOCK_COLOR):
+        self._owner = None
+        self._observers = []
+        self._generation = next(_generations)
+        self._shared = False
+        self._blocklist = []
+        self._index = {}
+        self._layout = None
+        self._codecs = {}
+
         # Check blocklist for dupe var names
         names = {}
         for b in blocklist:
@@ -203,6 +1030,8 @@ class BlockSequence(object):
                 raise ValueError(f"blocks '{b.name}' and '{existing_name}' result in "
                                  f"the same C variable name, please use names that are more different")
 
+            names[b.varname] = b.name
+
         self.blocklist = blocklist
 
         self.name = None
@@ -211,108 +1040,417 @@ class BlockSequence(object):
         self.color = color
 
     def emit_data(self, big_endian):
-        ret = b""
-
-        for b in self.blocklist:
-            ret += b.emit_data(big_endian)
+        return self.compile(big_endian).pack(self.values(big_endian))
+
+    def compile(self, big_endian=False):
+        """
+        Get a reusable codec for the layout of this sequence. The codec is
+        cached until the layout of this sequence changes.
+
+        :param bool big_endian: if True, multi-byte fields are packed big-endian
+
+        :return: codec for this sequence
+        :rtype: Codec
+        """
+        layout = self.layout()
+        codec = self._codecs.get(big_endian)
+        if codec is None:
+            codec = Codec(layout.fmtstring, layout.field_names, big_endian)
+            self._codecs[big_endian] = codec
+
+        return codec
+
+    def layout(self):
+        """
+        Get the cached layout of this sequence, rebuilding it if a block was
+        added, removed, reordered, renamed, or changed type or size, or if the
+        layout of a referenced sequence changed
+
+        :return: layout of this sequence
+        :rtype: Layout
+        """
+        if (self._layout is not None) and not self._layout.is_current():
+            self._invalidate_layout()
+
+        if self._layout is None:
+            layout = Layout()
+            for b in self._blocklist:
+                array = None
+                if isinstance(b, SequenceRef):
+                    layout.dependencies.append((b.sequence, b.sequence.layout()))
+                elif b.count is not None:
+                    array = (b.typeinfo.datatype, b.count)
+
+                layout.add_field(b.varname, b.size_bytes(), b.codec_fmtstring(), b.packs_value, b.swap_parts(),
+                                 array)
+
+            self._layout = layout
+
+        return self._layout
+
+    def offset_of(self, name):
+        """
+        Get the byte offset of a block within this sequence
+
+        :param str name: block name
+
+        :return: byte offset
+        :rtype: int
+        """
+        return self.layout().offset_of(string_to_varname(name))
+
+    def values(self, big_endian=False):
+        """
+        Get the value of each field in the layout of this sequence, as packed
+        by its codec. The values of blocks with a count are packed as bytes.
+
+        :param bool big_endian: byte order in which to pack blocks with a count
+
+        :return: list of values
+        :rtype: list
+        """
+        ret = [b._value for b in self._blocklist]
+        for i in self.layout().packed:
+            ret[i] = self._blocklist[i].pack_value(big_endian)
 
         return ret
 
-    def load_data(self, data, big_endian=False):
-        remaining = data
-        for b in self.blocklist:
-            if not remaining:
-                raise ValueError("Not enough data provided for this sequence")
+    def load_data(self, data, big_endian=False, offset=0):
+        """
+        Load the values of all blocks in this sequence from a buffer, without
+        copying the buffer
+
+        :param data: bytes-like object to read from
+        :param bool big_endian: if True, data is read as big-endian
+        :param int offset: byte offset in data at which this sequence starts
+
+        :return: number of bytes consumed
+        :rtype: int
+        """
+        codec = self.compile(big_endian)
+        size = codec.size_bytes()
+        if (len(data) - offset) < size:
+            raise ValueError("Not enough data provided for this sequence")
 
-            remaining = b.load_data(remaining, big_endian)
+        values = codec.unpack_from(memoryview(data), offset)
+        for i, value in enumerate(values):
+            self._writable_block(i)._value = value
 
-        return remaining
+        for i in self.layout().packed:
+            block = self._blocklist[i]
+            block.value = block.unpack_value(values[i], big_endian)
+
+        return size
 
     def copy(self):
-        new_blocklist = [b.copy() for b in self.blocklist]
-        return BlockSequence(self.name, new_blocklist)
+        """
+        Copy this sequence in constant time. The copy shares the block list
+        and the blocks themselves with this sequence; whichever side is
+        modified first takes a private copy of the list, and each block is
+        only copied when it is first obtained for modification.
+
+        :return: copy of this sequence
+        :rtype: BlockSequence
+        """
+        new = BlockSequence.__new__(BlockSequence)
+        new._owner = None
+        new._observers = []
+        new._generation = next(_generations)
+        new._shared = True
+        new._blocklist = self._blocklist
+        new._index = self._index
+        new._layout = self._layout
+        new._codecs = dict(self._codecs)
+        new.name = self.name
+        new.varname = self.varname
+        new._color = self._color
+
+        # Blocks tagged with the old generation are now shared with the copy
+        self._generation = next(_generations)
+        self._shared = True
+
+        return new
+
+    def _detach(self):
+        # Take a private copy of a block list shared with another sequence
+        if self._shared:
+            self._blocklist = list(self._blocklist)
+            if self._index is not None:
+                self._index = dict(self._index)
+
+            self._shared = False
+
+    def _writable_block(self, i):
+        # Get a block that can be modified without affecting other sequences,
+        # copying it first if it may be shared
+        block = self._blocklist[i]
+        if (block._owner is not self) or (block._generation != self._generation):
+            self._detach()
+            block = block.copy()
+            block._owner = self
+            block._generation = self._generation
+            self._blocklist[i] = block
+
+        return block
 
     def to_dict(self):
-        return {"name": self.name, "color": self.color, "blocks": [b.to_dict() for b in self.blocklist]}
+        definitions = _Definitions()
+        ret = self._to_dict(definitions)
+        if definitions.dicts:
+            ret["definitions"] = definitions.dicts
+
+        return ret
+
+    def _to_dict(self, definitions):
+        blocks = [b.to_dict(definitions) if isinstance(b, SequenceRef) else b.to_dict() for b in self.blocklist]
+        return {"name": self.name, "color": self.color, "blocks": blocks}
 
     @classmethod
-    def from_dict(cls, attrs):
+    def from_dict(cls, attrs, definitions=None):
+        if definitions is None:
+            definitions = _decode_definitions(attrs.get("definitions", []))
+
         name = attrs["name"]
-        color = tuple(attrs["color"])
-        blocks = [Block.from_dict(d) for d in attrs["blocks"]]
+        color = attrs["color"]
+        blocks = [SequenceRef.from_dict(d, definitions) if "ref" in d else Block.from_dict(d)
+                  for d in attrs["blocks"]]
         return BlockSequence(name, blocks, color)
 
     def set_name(self, name):
         self.name = name
         self.varname = string_to_varname(name)
 
+        if self._owner is not None:
+            self._owner._invalidate_index()
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        self._color = intern_color(color)
+
+    @property
+    def blocklist(self):
+        """
+        Read-only view of the blocks of this sequence. Blocks may be shared
+        with copies of this sequence, and must be obtained with
+        get_block_by_name or get_block to be modified.
+        """
+        return _ListView(self, "_blocklist")
+
+    @blocklist.setter
+    def blocklist(self, blocklist):
+        for b in blocklist:
+            self._check_reference(b)
+
+        for b in self._blocklist:
+            if b._owner is self:
+                b._owner = None
+
+        self._blocklist = list(blocklist)
+        self._shared = False
+        for b in self._blocklist:
+            b._owner = self
+            b._generation = self._generation
+
+        self._invalidate_index()
+        self._notify(Change.RESET)
+
+    def _invalidate_index(self):
+        self._index = None
+        self._invalidate_layout()
+
+    def _invalidate_layout(self):
+        self._layout = None
+        self._codecs = {}
+
+        if self._owner is not None:
+            self._owner._invalidate_layout()
+
+    def _notify(self, event, index=None):
+        super(BlockSequence, self)._notify(event, index)
+
+        # Anything but a reordering may change the name or size of this
+        # sequence, which the owning schema reports as a change of one item
+        if (self._owner is not None) and (event != Change.REORDERED):
+            self._owner._sequence_changed(self)
+
+    def block_changed(self, index):
+        """
+        Report to observers that the block at the given position was changed in place
+
+        :param int index: position of the block that was changed
+        """
+        self._notify(Change.CHANGED, index)
+
+    def _varname_index(self):
+        # Maps block varnames to list positions, rebuilt lazily after renames,
+        # removals and reordering. The first block wins if varnames collide.
+        if self._index is None:
+            index = {}
+            for i, b in enumerate(self._blocklist):
+                index.setdefault(b.varname, i)
+
+            self._index = index
+
+        return self._index
+
     def _index_by_name(self, name):
-        varname = string_to_varname(name)
-        for i in range(len(self.blocklist)):
-            if self.blocklist[i].varname == varname:
-                return i
+        i = self._varname_index().get(string_to_varname(name))
+        if i is None:
+            raise ValueError(f"No such name '{name}'")
 
-        raise ValueError(f"No such name '{name}'")
+        return i
 
     def __contains__(self, name):
-        try:
-            _ = self._index_by_name(name)
-        except ValueError:
-            return False
-
-        return True
+        return string_to_varname(name) in self._varname_index()
 
     def get_block_by_name(self, name):
-        return self.blocklist[self._index_by_name(name)]
+        return self._writable_block(self._index_by_name(name))
+
+    def get_block(self, index):
+        """
+        Get the block at a position, to be modified (see get_block_by_name)
+
+        :param int index: position of the block
+
+        :return: block at the given position
+        :rtype: Block
+        """
+        return self._writable_block(index)
 
     def remove_block_by_name(self, name):
-        del self.blocklist[self._index_by_name(name)]
+        self._pop_block(self._index_by_name(name))
+
+    def _pop_block(self, i):
+        self._detach()
+        block = self._blocklist.pop(i)
+        self._invalidate_index()
+        self._notify(Change.REMOVED, i)
+        return block
+
+    def _insert_block(self, i, block):
+        # Blocks re-inserted by EditHistory keep their generation, so they
+        # are still copied before modification if they may be shared
+        self._detach()
+        self._blocklist.insert(i, block)
+        if block._owner is not self:
+            block._owner = self
+            block._generation = self._generation
+
+        self._invalidate_index()
+        self._notify(Change.INSERTED, i)
+
+    def _set_order(self, blocks):
+        # Replace the block list with a reordering of the same blocks
+        self._blocklist = list(blocks)
+        self._shared = False
+        self._invalidate_index()
+        self._notify(Change.REORDERED)
 
     def reorder_by_names(self, names):
         new_blocklist = []
         for n in names:
             # Read block by name from the old list, and
             # append to the new list in the correct position
-            new_blocklist.append(self.get_block_by_name(n))
+            new_blocklist.append(self._blocklist[self._index_by_name(n)])
+
+        self._set_order(new_blocklist)
 
-        self.blocklist = new_blocklist
+    def move_blocks(self, src, count, dst):
+        """
+        Move a run of consecutive blocks to another position
+
+        :param int src: position of the first block to move
+        :param int count: number of blocks to move
+        :param int dst: position of the first moved block after the move
+
+        :raises ValueError: if the blocks or the new position are out of range
+        """
+        self._detach()
+        _move_items(self._blocklist, src, count, dst)
+        self._invalidate_index()
+        self._notify(Change.REORDERED)
+
+    def reorder(self, blocks):
+        """
+        Reorder the blocks of this sequence
+
+        :param list blocks: the blocks of this sequence, in their new order
+
+        :raises ValueError: if blocks is not a reordering of the blocks of this sequence
+        """
+        if sorted(map(id, blocks)) != sorted(map(id, self._blocklist)):
+            raise ValueError(f"Blocks are not a reordering of the blocks of sequence '{self.name}'")
+
+        self._set_order(blocks)
 
     def size_bytes(self):
-        return sum([b.size_bytes() for b in self.blocklist])
+        return self.layout().size_bytes
 
-    def add_block(self, block):
-        for b in self.blocklist:
-            if block.varname == b.varname:
-                raise ValueError("This sequence already has a block with the same "
-                                 "C variable name, please use a different name")
+    def _references(self, sequence):
+        # True if this sequence embeds the given sequence, directly or through other references
+        for b in self._blocklist:
+            if isinstance(b, SequenceRef) and ((b.sequence is sequence) or b.sequence._references(sequence)):
+                return True
 
-        self.blocklist.append(block)
+        return False
 
-    def generate_c_defaults(self):
-        lines = []
+    def _check_reference(self, block):
+        if isinstance(block, SequenceRef) and ((block.sequence is self) or block.sequence._references(self)):
+            raise ValueError(f"Sequence '{self.name}' cannot contain a reference to "
+                             f"'{block.sequence.name}', since it would then contain itself")
 
-        for block in self.blocklist:
-            valstr = str(block.value)
+    def referenced_sequences(self):
+        """
+        Get all sequences embedded in this sequence by reference, directly or
+        through other references. Each sequence is listed once, after any
+        sequences it references itself.
+
+        :return: list of BlockSequence objects
+        :rtype: list
+        """
+        found = collections.OrderedDict()
+        for b in self._blocklist:
+            if isinstance(b, SequenceRef) and (id(b.sequence) not in found):
+                for s in b.sequence.referenced_sequences():
+                    found.setdefault(id(s), s)
 
-            dtype = block.typeinfo.datatype
+                found.setdefault(id(b.sequence), b.sequence)
 
-            if (dtype >= DataType.UINT_1B) and (dtype <= DataType.UINT_8B):
-                valstr += "u"
-            elif dtype == DataType.FLOAT:
-                valstr += "f"
-            elif dtype == DataType.BYTES:
-                valstr = "{" + ", ".join(f"0x{b:02x}u" for b in block.value) + "}"
+        return list(found.values())
 
-            lines.append(f"    .{block.varname}={valstr}")
+    def add_block(self, block):
+        self._check_reference(block)
+
+        if block.varname in self._varname_index():
+            raise ValueError("This sequence already has a block with the same "
+                             "C variable name, please use a different name")
 
-        return ",\n".join(lines)
+        self._detach()
+        self._varname_index()[block.varname] = len(self._blocklist)
+        self._blocklist.append(block)
+        block._owner = self
+        block._generation = self._generation
+        self._invalidate_layout()
+        self._notify(Change.INSERTED, len(self._blocklist) - 1)
+
+    def generate_c_defaults(self):
+        return ",\n".join([f"    .{block.varname}={_c_value(block)}" for block in self.blocklist])
 
     def generate_c_string(self):
         lines = []
 
         for block in self.blocklist:
+            if isinstance(block, SequenceRef):
+                name = block.varname if block.count is None else f"{block.varname}[{block.count}]"
+                lines.append(f"    {block.sequence.varname}_t {name};")
+                continue
+
             block_kwargs = {
-                "name": block.varname,
+                "name": block.varname if block.count is None else f"{block.varname}[{block.count}]",
             }
 
             if block.parameter is not None:
@@ -323,65 +1461,369 @@ class BlockSequence(object):
         return "\n".join(lines)
 
     def generate_pystruct_fmtstring(self):
-        ret = ""
-        for block in self.blocklist:
-            text = block.typeinfo.pystruct_name
+        return "".join([b.pystruct_fmtstring() for b in self.blocklist])
 
-            if block.parameter is not None:
-                text = text.format(parameter=block.parameter)
-
-            ret += text
 
-        return ret
+def _swapped_bytes(result, schema, *args, **kwargs):
+    return result * schema.size_bytes()
 
 
-class Schema(CustomValue):
+class Schema(Observable, CustomValue):
     """
-    Represents a schema for a binary file, containing multiple BlockSequence objects
+    Represents a schema for a binary file, containing multiple BlockSequence objects.
+
+    Insertions, removals and reordering of sequences are reported to
+    observers, as are changes to any sequence in the schema.
     """
+    __slots__ = ("_sequencelist", "_index", "_layout", "_codecs", "_observers", "name", "varname",
+                 "big_endian")
+
     def __init__(self, name, sequencelist=[], big_endian=True):
+        self._observers = []
+        self._sequencelist = []
+        self._index = {}
+        self._layout = None
+        self._codecs = {}
+
         # Check sequencelist for dupe var names
         names = {}
         for s in sequencelist:
             if s.varname in names:
                 existing_name = names[s.varname]
-                raise ValueError(f"sequences '{b.name}' and '{existing_name}' result in "
+                raise ValueError(f"sequences '{s.name}' and '{existing_name}' result in "
                                  f"the same C variable name, use names that are more different")
 
-        self.name = name
+            names[s.varname] = s.name
+
+        self.name = None
+        self.varname = None
+        self.set_name(name)
         self.sequencelist = sequencelist
         self.big_endian = big_endian
 
+    @timed("Schema.emit_data", result_len)
     def emit_data(self):
-        ret = b''
+        return self.compile().pack(self.values())
+
+    def compile(self):
+        """
+        Get a reusable codec for the layout of this schema. Fields are named
+        '<sequence varname>.<block varname>'. The codec is cached until the
+        layout of this schema changes.
+
+        :return: codec for this schema
+        :rtype: Codec
+        """
+        layout = self.layout()
+        codec = self._codecs.get(self.big_endian)
+        if codec is None:
+            codec = Codec(layout.fmtstring, layout.field_names, self.big_endian)
+            self._codecs[self.big_endian] = codec
+
+        return codec
+
+    def layout(self):
+        """
+        Get the cached layout of this schema, rebuilding it if the layout of
+        any sequence changed. Fields are named '<sequence varname>.<block varname>'.
+
+        :return: layout of this schema
+        :rtype: Layout
+        """
+        if (self._layout is not None) and not self._layout.is_current():
+            self._invalidate_layout()
+
+        if self._layout is None:
+            self._layout = self._build_layout()
+
+        return self._layout
+
+    @timed("Schema.layout")
+    def _build_layout(self):
+        layout = Layout()
+        for s in self._sequencelist:
+            sequence_layout = s.layout()
+            layout.add_layout(s.varname, sequence_layout)
+
+            # Only sequences with references can go out of date without
+            # invalidating this layout themselves
+            if sequence_layout.dependencies:
+                layout.dependencies.append((s, sequence_layout))
+
+        return layout
+
+    def offset_of(self, name):
+        """
+        Get the absolute byte offset of a sequence or block within this schema
+
+        :param str name: '<sequence varname>' or '<sequence varname>.<block varname>'
+
+        :return: byte offset
+        :rtype: int
+        """
+        return self.layout().offset_of(name)
+
+    def emit_many(self, rows):
+        """
+        Emit many instances of this schema back-to-back
+
+        :param rows: iterable of records. Each record is either a sequence of
+            values in layout order, or a dict keyed by '<sequence varname>.<block varname>'.
+            Blocks with a count take a list of values.
+
+        :return: packed records
+        :rtype: bytearray
+        """
+        layout = self.layout()
+        if layout.arrays:
+            rows = [layout.pack_arrays(r, self.big_endian) for r in rows]
+
+        return self.compile().pack_many(rows)
+
+    def to_numpy_dtype(self, raw_bytes=False):
+        """
+        Build a packed numpy structured dtype matching the layout of this schema.
+        Fields are named '<sequence varname>.<block varname>'. Requires numpy.
+
+        :param bool raw_bytes: if True, BYTES blocks map to 'V{n}' rather than 'S{n}'
+
+        :return: numpy structured dtype
+        :rtype: numpy.dtype
+        """
+        numpy = import_numpy()
+
+        fields = []
+        for s in self.sequencelist:
+            for b in s.blocklist:
+                fields.append((f"{s.varname}.{b.varname}", b.numpy_typestring(self.big_endian, raw_bytes)))
+
+        return numpy.dtype(fields)
+
+    def decode_array(self, buffer, count=-1, offset=0, raw_bytes=False):
+        """
+        Decode back-to-back instances of this schema into a numpy structured
+        array in one vectorized pass. The returned array is a read-only view
+        of the buffer. Requires numpy.
+
+        :param buffer: bytes-like object
+        :param int count: number of records to decode. Defaults to all records.
+        :param int offset: byte offset of the first record
+        :param bool raw_bytes: if True, BYTES blocks map to 'V{n}' rather than 'S{n}'
+
+        :return: structured array with one element per record
+        :rtype: numpy.ndarray
+        """
+        dtype = self.to_numpy_dtype(raw_bytes)
+        return import_numpy().frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+
+    def encode_array(self, array, raw_bytes=False):
+        """
+        Encode a numpy structured array as back-to-back instances of this
+        schema. Fields are matched by name and converted to the byte order of
+        this schema where needed. Requires numpy.
+
+        :param numpy.ndarray array: structured array to encode
+        :param bool raw_bytes: if True, BYTES blocks map to 'V{n}' rather than 'S{n}'
+
+        :raises ValueError: if the array is missing a field of this schema
+
+        :return: packed records
+        :rtype: bytes
+        """
+        dtype = self.to_numpy_dtype(raw_bytes)
+        if array.dtype == dtype:
+            return array.tobytes()
+
+        # Assigning field by field matches fields by name; casting with astype
+        # would match them by position
+        names = array.dtype.names or ()
+        missing = [n for n in dtype.names if n not in names]
+        if missing:
+            raise ValueError(f"Array has no field '{missing[0]}'")
+
+        out = import_numpy().empty(len(array), dtype)
+        for name in dtype.names:
+            out[name] = array[name]
+
+        return out.tobytes()
+
+    def values(self):
+        """
+        Get the value of each field in the layout of this schema, as packed
+        by its codec (see BlockSequence.values)
+
+        :return: list of values
+        :rtype: list
+        """
+        ret = []
         for s in self.sequencelist:
-            ret += s.emit_data(self.big_endian)
+            ret.extend(s.values(self.big_endian))
 
         return ret
 
-    def load_data(self, data):
-        remaining = data
-        for s in self.sequencelist:
-            if not remaining:
-                raise ValueError("Not enough data provided for this schema")
+    @timed("Schema.load_data", result_value)
+    def load_data(self, data, offset=0):
+        """
+        Load the values of all sequences in this schema from a buffer, without
+        copying the buffer. The buffer must contain exactly one instance of
+        this schema after the given offset.
+
+        :param data: bytes-like object to read from
+        :param int offset: byte offset in data at which the schema starts
 
-            remaining = s.load_data(remaining, big_endian)
+        :return: number of bytes consumed
+        :rtype: int
+        """
+        view = memoryview(data)
+        if (len(view) - offset) < self.size_bytes():
+            raise ValueError("Not enough data provided for this schema")
 
-        if remaining:
+        if (len(view) - offset) > self.size_bytes():
             raise ValueError("Too much data provided for this schema")
 
-    def copy(self):
-        new_seqs = [s.copy() for s in self.sequencelist]
-        return Schema(self.name, new_seqs, self.big_endian)
+        pos = offset
+        for s in self.sequencelist:
+            pos += s.load_data(view, self.big_endian, pos)
+
+        return pos - offset
+
+    def iter_records(self, path_or_buffer, offset=0, stride=None, limit=None, partial="error"):
+        """
+        Lazily decode back-to-back instances of this schema from a file or buffer.
+        Files are memory-mapped, so only the pages actually read are loaded.
+
+        :param path_or_buffer: path to a file, or a bytes-like object
+        :param int offset: byte offset of the first record
+        :param int stride: number of bytes from the start of one record to the
+            start of the next. Defaults to the size of this schema.
+        :param int limit: maximum number of records to decode. Defaults to all records.
+        :param str partial: what to do with a trailing partial record; 'error'
+            raises ValueError, 'ignore' silently drops it
+
+        :return: generator yielding one tuple of values per record, in the
+            order of Codec.field_names. Blocks with a count give a list of values.
+        """
+        if partial not in ["error", "ignore"]:
+            raise ValueError(f"Invalid partial record policy '{partial}'")
+
+        layout = self.layout()
+        codec = self.compile()
+
+        if codec.size_bytes() == 0:
+            raise ValueError("Cannot read records of a schema with a size of 0 bytes")
+
+        if stride is None:
+            stride = codec.size_bytes()
+        elif stride < codec.size_bytes():
+            raise ValueError(f"Stride must be at least the schema size ({codec.size_bytes()} bytes)")
+
+        if isinstance(path_or_buffer, (str, os.PathLike)):
+            with open(path_or_buffer, "rb") as fh:
+                if os.fstat(fh.fileno()).st_size == 0:
+                    data = b""
+                else:
+                    data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+                try:
+                    yield from self._iter_records(layout, codec, data, offset, stride, limit, partial)
+                finally:
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+        else:
+            yield from self._iter_records(layout, codec, memoryview(path_or_buffer), offset,
+                                          stride, limit, partial)
+
+    def _iter_records(self, layout, codec, data, offset, stride, limit, partial):
+        size = codec.size_bytes()
+        unpack_from = codec.unpack_from
+        datalen = len(data)
+        count = 0
+
+        while (limit is None) or (count < limit):
+            if offset >= datalen:
+                break
+
+            if (datalen - offset) < size:
+                if partial == "error":
+                    raise ValueError(f"Partial record of {datalen - offset} bytes at offset {offset}")
+
+                break
+
+            record = unpack_from(data, offset)
+            yield layout.unpack_arrays(record, codec.big_endian) if layout.arrays else record
+            offset += stride
+            count += 1
+
+    @timed("Schema.swap_endianness", _swapped_bytes)
+    def swap_endianness(self, buffer, offset=0, count=None):
+        """
+        Convert back-to-back instances of this schema in a buffer between
+        big-endian and little-endian, in place, by reversing the byte order of
+        every multi-byte value (see ByteSwapper). The byte order of this
+        schema itself is not changed.
+
+        :param buffer: writable bytes-like object, e.g. a bytearray, mmap or numpy array
+        :param int offset: byte offset of the first record
+        :param int count: number of records to convert. Defaults to all records\
+            after the offset, which must then be a whole number of records.
+
+        :return: number of records converted
+        :rtype: int
+        """
+        return self.layout().swapper().swap(buffer, offset, count)
 
+    def copy(self):
+        """
+        Copy this schema, and every sequence it embeds by reference. References
+        in the copy point to the copied sequences, so sequences that are both
+        in the schema and referenced are still the same object in the copy.
+
+        :return: copy of this schema
+        :rtype: Schema
+        """
+        copies = {}
+        for s in itertools.chain(self.referenced_sequences(), self.sequencelist):
+            copies[id(s)] = s.copy()
+
+        for new in copies.values():
+            repointed = False
+            for i, b in enumerate(new._blocklist):
+                if isinstance(b, SequenceRef) and (id(b.sequence) in copies):
+                    new._writable_block(i).sequence = copies[id(b.sequence)]
+                    repointed = True
+
+            if repointed:
+                new._invalidate_layout()
+
+        return Schema(self.name, [copies[id(s)] for s in self.sequencelist], self.big_endian)
+
+    @timed("Schema.to_dict")
     def to_dict(self):
-        return {"name": self.name, "big_endian": self.big_endian,
-                "sequences": [s.to_dict() for s in self.sequencelist]}
+        # Sequences of this schema that are also referenced are stored once,
+        # as definitions, so that they are still the same object when loaded
+        definitions = _Definitions()
+        referenced = {id(s) for s in self.referenced_sequences()}
+        sequences = []
+        for s in self.sequencelist:
+            if id(s) in referenced:
+                sequences.append({"definition": definitions.index(s)})
+            else:
+                sequences.append(s._to_dict(definitions))
+
+        ret = {"name": self.name, "big_endian": self.big_endian, "sequences": sequences}
+
+        if definitions.dicts:
+            ret["definitions"] = definitions.dicts
+
+        return ret
 
+    @timed("Schema.from_dict")
     def from_dict(self, attrs):
         name = attrs["name"]
         big_endian = attrs["big_endian"]
-        sequences = [BlockSequence.from_dict(d) for d in attrs["sequences"]]
+        definitions = _decode_definitions(attrs.get("definitions", []))
+        sequences = [definitions[d["definition"]] if "definition" in d else BlockSequence.from_dict(d, definitions)
+                     for d in attrs["sequences"]]
 
         self.set_name(name)
         self.big_endian = big_endian
@@ -393,27 +1835,93 @@ class Schema(CustomValue):
         self.name = name
         self.varname = string_to_varname(name)
 
+    @property
+    def sequencelist(self):
+        """
+        Read-only view of the sequences of this schema
+        """
+        return _ListView(self, "_sequencelist")
+
+    @sequencelist.setter
+    def sequencelist(self, sequencelist):
+        for s in self._sequencelist:
+            if s._owner is self:
+                s._owner = None
+
+        self._sequencelist = list(sequencelist)
+        for s in self._sequencelist:
+            s._owner = self
+
+        self._invalidate_index()
+        self._notify(Change.RESET)
+
+    def _invalidate_index(self):
+        self._index = None
+        self._invalidate_layout()
+
+    def _invalidate_layout(self):
+        self._layout = None
+        self._codecs = {}
+
+    def _sequence_changed(self, sequence):
+        if not self._observers:
+            return
+
+        # Sequences are found by identity, since a renamed sequence may not
+        # yet be at the position its varname was last indexed at
+        i = self._varname_index().get(sequence.varname)
+        if (i is None) or (self._sequencelist[i] is not sequence):
+            i = self._sequencelist.index(sequence)
+
+        self._notify(Change.CHANGED, i)
+
+    def _varname_index(self):
+        # Maps sequence varnames to list positions, rebuilt lazily after renames,
+        # removals and reordering. The first sequence wins if varnames collide.
+        if self._index is None:
+            index = {}
+            for i, s in enumerate(self._sequencelist):
+                index.setdefault(s.varname, i)
+
+            self._index = index
+
+        return self._index
+
     def _index_by_name(self, name):
-        varname = string_to_varname(name)
-        for i in range(len(self.sequencelist)):
-            if self.sequencelist[i].varname == varname:
-                return i
+        i = self._varname_index().get(string_to_varname(name))
+        if i is None:
+            raise ValueError(f"No such sequence name '{name}'")
 
-        raise ValueError(f"No such sequence name '{name}'")
+        return i
 
     def __contains__(self, name):
-        try:
-            _ = self._index_by_name(name)
-        except ValueError:
-            return False
-
-        return True
+        return string_to_varname(name) in self._varname_index()
 
     def get_sequence_by_name(self, name):
-        return self.sequencelist[self._index_by_name(name)]
+        return self._sequencelist[self._index_by_name(name)]
 
     def remove_sequence_by_name(self, name):
-        del self.sequencelist[self._index_by_name(name)]
+        sequence = self._pop_sequence(self._index_by_name(name))
+        if sequence._owner is self:
+            sequence._owner = None
+
+    def _pop_sequence(self, i):
+        sequence = self._sequencelist.pop(i)
+        self._invalidate_index()
+        self._notify(Change.REMOVED, i)
+        return sequence
+
+    def _insert_sequence(self, i, sequence):
+        self._sequencelist.insert(i, sequence)
+        sequence._owner = self
+        self._invalidate_index()
+        self._notify(Change.INSERTED, i)
+
+    def _set_order(self, sequences):
+        # Replace the sequence list with a reordering of the same sequences
+        self._sequencelist = list(sequences)
+        self._invalidate_index()
+        self._notify(Change.REORDERED)
 
     def reorder_by_names(self, names):
         new_seqlist = []
@@ -422,18 +1930,64 @@ class Schema(CustomValue):
             # append to the new list in the correct position
             new_seqlist.append(self.get_sequence_by_name(n))
 
-        self.sequencelist = new_seqlist
+        self._set_order(new_seqlist)
+
+    def move_sequences(self, src, count, dst):
+        """
+        Move a run of consecutive sequences to another position
+
+        :param int src: position of the first sequence to move
+        :param int count: number of sequences to move
+        :param int dst: position of the first moved sequence after the move
+
+        :raises ValueError: if the sequences or the new position are out of range
+        """
+        _move_items(self._sequencelist, src, count, dst)
+        self._invalidate_index()
+        self._notify(Change.REORDERED)
+
+    def reorder(self, sequences):
+        """
+        Reorder the sequences of this schema
+
+        :param list sequences: the sequences of this schema, in their new order
+
+        :raises ValueError: if sequences is not a reordering of the sequences of this schema
+        """
+        if sorted(map(id, sequences)) != sorted(map(id, self._sequencelist)):
+            raise ValueError(f"Sequences are not a reordering of the sequences of schema '{self.name}'")
+
+        self._set_order(sequences)
 
     def size_bytes(self):
-        return sum([s.size_bytes() for s in self.sequencelist])
+        return self.layout().size_bytes
 
     def add_sequence(self, sequence):
-        for s in self.sequencelist:
-            if sequence.varname == s.varname:
-                raise ValueError("This schema already has a sequence with the same "
-                                 "C variable name, please use a different name")
-
-        self.sequencelist.append(sequence)
+        index = self._varname_index()
+        if sequence.varname in index:
+            raise ValueError("This schema already has a sequence with the same "
+                             "C variable name, please use a different name")
+
+        index[sequence.varname] = len(self._sequencelist)
+        self._sequencelist.append(sequence)
+        sequence._owner = self
+        self._invalidate_layout()
+        self._notify(Change.INSERTED, len(self._sequencelist) - 1)
+
+    def referenced_sequences(self):
+        """
+        Get all sequences embedded by reference in the sequences of this
+        schema, as for BlockSequence.referenced_sequences
+
+        :return: list of BlockSequence objects
+        :rtype: list
+        """
+        found = collections.OrderedDict()
+        for sequence in self.sequencelist:
+            for s in sequence.referenced_sequences():
+                found.setdefault(id(s), s)
+
+        return list(found.values())
 
     def generate_c_string(self):
         return '\n'.join([s.generate_c_string() for s in self.sequencelist])
@@ -442,12 +1996,959 @@ class Schema(CustomValue):
         return ''.join([s.generate_pystruct_fmtstring() for s in self.sequencelist])
 
 
+class Edit(object):
+    """
+    Base class for a single reversible edit of a sequence or schema, recorded
+    by EditHistory
+    """
+    def apply(self):
+        raise NotImplementedError()
+
+    def revert(self):
+        raise NotImplementedError()
+
+    def merge(self, other):
+        """
+        Try to fold a following edit into this one, so that both are undone
+        and redone together. Used to compact history at checkpoints.
+
+        :param Edit other: edit made directly after this one
+
+        :return: True if other was merged into this edit
+        :rtype: bool
+        """
+        return False
+
+
+class AddBlockEdit(Edit):
+    def __init__(self, sequence, block):
+        self.sequence = sequence
+        self.block = block
+        self.index = None
+
+    def apply(self):
+        if self.index is None:
+            self.sequence.add_block(self.block)
+            self.index = len(self.sequence.blocklist) - 1
+        else:
+            self.sequence._insert_block(self.index, self.block)
+
+    def revert(self):
+        self.block = self.sequence._pop_block(self.index)
+
+
+class RemoveBlockEdit(Edit):
+    """
+    Removes a block from a sequence, given either its name or its position
+    """
+    def __init__(self, sequence, name=None, index=None):
+        self.sequence = sequence
+        self.index = sequence._index_by_name(name) if index is None else index
+        self.block = None
+
+    def apply(self):
+        self.block = self.sequence._pop_block(self.index)
+
+    def revert(self):
+        self.sequence._insert_block(self.index, self.block)
+
+
+class MoveBlocksEdit(Edit):
+    """
+    Moves a run of consecutive blocks of a sequence (see BlockSequence.move_blocks),
+    storing only the positions involved
+    """
+    def __init__(self, sequence, src, count, dst):
+        self.sequence = sequence
+        self.src = src
+        self.count = count
+        self.dst = dst
+
+    def apply(self):
+        self.sequence.move_blocks(self.src, self.count, self.dst)
+
+    def revert(self):
+        self.sequence.move_blocks(self.dst, self.count, self.src)
+
+
+class ReorderBlocksEdit(Edit):
+    """
+    Reorders the blocks of a sequence, given either the names of the blocks
+    or the blocks themselves in their new order. The orders before and after
+    are stored, so moves of consecutive blocks are better recorded as
+    MoveBlocksEdit.
+    """
+    def __init__(self, sequence, names=None, blocks=None):
+        self.sequence = sequence
+        self.names = names
+        self.blocks = blocks
+        self.before = None
+        self.after = None
+
+    def apply(self):
+        self.before = tuple(self.sequence.blocklist)
+        if self.after is not None:
+            self.sequence._set_order(self.after)
+            return
+
+        if self.blocks is not None:
+            self.sequence.reorder(self.blocks)
+        else:
+            self.sequence.reorder_by_names(self.names)
+
+        self.after = tuple(self.sequence.blocklist)
+
+    def revert(self):
+        self.after = tuple(self.sequence.blocklist)
+        self.sequence._set_order(self.before)
+
+    def merge(self, other):
+        if isinstance(other, ReorderBlocksEdit) and (other.sequence is self.sequence):
+            self.after = other.after
+            return True
+
+        return False
+
+
+class BlockEdit(Edit):
+    """
+    Changes any attributes of a single block (type, value, name, colour).
+    The states before and after are stored as detached copies of the block.
+    """
+    def __init__(self, sequence, index, before, after):
+        self.sequence = sequence
+        self.index = index
+        self.before = before
+        self.after = after
+
+    def apply(self):
+        self.sequence._writable_block(self.index)._assign(self.after)
+        self.sequence.block_changed(self.index)
+
+    def revert(self):
+        self.sequence._writable_block(self.index)._assign(self.before)
+        self.sequence.block_changed(self.index)
+
+    def merge(self, other):
+        if (isinstance(other, BlockEdit) and (other.sequence is self.sequence)
+                and (other.index == self.index)):
+            self.after = other.after
+            return True
+
+        return False
+
+
+class AddSequenceEdit(Edit):
+    def __init__(self, schema, sequence):
+        self.schema = schema
+        self.sequence = sequence
+        self.index = None
+
+    def apply(self):
+        if self.index is None:
+            self.schema.add_sequence(self.sequence)
+            self.index = len(self.schema.sequencelist) - 1
+        else:
+            self.schema._insert_sequence(self.index, self.sequence)
+
+    def revert(self):
+        self.sequence = self.schema._pop_sequence(self.index)
+
+
+class RemoveSequenceEdit(Edit):
+    def __init__(self, schema, name):
+        self.schema = schema
+        self.index = schema._index_by_name(name)
+        self.sequence = None
+
+    def apply(self):
+        self.sequence = self.schema._pop_sequence(self.index)
+
+    def revert(self):
+        self.schema._insert_sequence(self.index, self.sequence)
+
+
+class MoveSequencesEdit(Edit):
+    """
+    Moves a run of consecutive sequences of a schema (see Schema.move_sequences),
+    storing only the positions involved
+    """
+    def __init__(self, schema, src, count, dst):
+        self.schema = schema
+        self.src = src
+        self.count = count
+        self.dst = dst
+
+    def apply(self):
+        self.schema.move_sequences(self.src, self.count, self.dst)
+
+    def revert(self):
+        self.schema.move_sequences(self.dst, self.count, self.src)
+
+
+class ReorderSequencesEdit(Edit):
+    """
+    Reorders the sequences of a schema, given either the names of the
+    sequences or the sequences themselves in their new order. The orders
+    before and after are stored, so moves of consecutive sequences are better
+    recorded as MoveSequencesEdit.
+    """
+    def __init__(self, schema, names=None, sequences=None):
+        self.schema = schema
+        self.names = names
+        self.sequences = sequences
+        self.before = None
+        self.after = None
+
+    def apply(self):
+        self.before = tuple(self.schema.sequencelist)
+        if self.after is not None:
+            self.schema._set_order(self.after)
+            return
+
+        if self.sequences is not None:
+            self.schema.reorder(self.sequences)
+        else:
+            self.schema.reorder_by_names(self.names)
+
+        self.after = tuple(self.schema.sequencelist)
+
+    def revert(self):
+        self.after = tuple(self.schema.sequencelist)
+        self.schema._set_order(self.before)
+
+    def merge(self, other):
+        if isinstance(other, ReorderSequencesEdit) and (other.schema is self.schema):
+            self.after = other.after
+            return True
+
+        return False
+
+
+class SequenceEdit(Edit):
+    """
+    Changes the name and/or colour of a sequence. The states before and after
+    are stored as (name, color) tuples.
+    """
+    def __init__(self, sequence, before, after):
+        self.sequence = sequence
+        self.before = before
+        self.after = after
+
+    def _set(self, state):
+        name, color = state
+        self.sequence.set_name(name)
+        self.sequence.color = color
+        self.sequence._notify(Change.CHANGED)
+
+    def apply(self):
+        self._set(self.after)
+
+    def revert(self):
+        self._set(self.before)
+
+    def merge(self, other):
+        if isinstance(other, SequenceEdit) and (other.sequence is self.sequence):
+            self.after = other.after
+            return True
+
+        return False
+
+
+class EditHistory(object):
+    """
+    Log of reversible edits to sequences and schemas, supporting undo and
+    redo. Each edit stores only what it changed, rather than a snapshot of
+    the whole schema, and at most max_steps steps are kept.
+
+    Each edit is its own undo step until checkpoint() is called, which
+    compacts all steps since the previous checkpoint into a single step,
+    merging consecutive edits of the same block or sequence.
+
+    While a session is open (see begin_session), steps recorded before the
+    session began can not be undone, redone or compacted.
+    """
+    def __init__(self, max_steps=1000):
+        self.max_steps = max_steps
+        self.clear()
+
+    def clear(self):
+        self._undo = collections.deque(maxlen=self.max_steps)
+        self._redo = []
+        self._since_checkpoint = 0
+        self._session = None
+
+    def begin_session(self):
+        """
+        Start a session, e.g. while an editor dialog is open, limiting undo
+        and redo to the steps made during the session until end_session is called
+        """
+        # The session begins above the current top undo step, and above the
+        # redo steps that were available when it began
+        self._session = (self._undo[-1] if self._undo else None, self._redo, len(self._redo))
+
+    def end_session(self):
+        self._session = None
+
+    def _session_steps(self):
+        # Number of undo steps recorded during the current session
+        if self._session is None:
+            return len(self._undo)
+
+        first = self._session[0]
+        for i in range(len(self._undo)):
+            if self._undo[-1 - i] is first:
+                return i
+
+        # The step the session began above has dropped out of the history
+        return len(self._undo)
+
+    def can_undo(self):
+        return self._session_steps() > 0
+
+    def can_redo(self):
+        if self._session is None:
+            return len(self._redo) > 0
+
+        # Recording an edit replaces the redo list, discarding the redo steps
+        # from before the session
+        _, redo, num_redo = self._session
+        return len(self._redo) > (num_redo if self._redo is redo else 0)
+
+    def record(self, edit, applied=False):
+        """
+        Record an edit as a new undo step, applying it first unless it was
+        already applied by the caller. Clears the redo history.
+
+        :param Edit edit: edit to record
+        :param bool applied: True if the edit has already been applied
+        """
+        if not applied:
+            edit.apply()
+
+        self._undo.append([edit])
+        self._since_checkpoint = min(self._since_checkpoint + 1, len(self._undo))
+        self._redo = []
+
+    def undo(self):
+        """
+        Revert the most recent undo step
+
+        :return: False if there was nothing to undo
+        :rtype: bool
+        """
+        if not self.can_undo():
+            return False
+
+        step = self._undo.pop()
+        for edit in reversed(step):
+            edit.revert()
+
+        self._redo.append(step)
+        self._since_checkpoint = max(self._since_checkpoint - 1, 0)
+        return True
+
+    def redo(self):
+        """
+        Re-apply the most recently undone step
+
+        :return: False if there was nothing to redo
+        :rtype: bool
+        """
+        if not self.can_redo():
+            return False
+
+        step = self._redo.pop()
+        for edit in step:
+            edit.apply()
+
+        self._undo.append(step)
+        self._since_checkpoint = min(self._since_checkpoint + 1, len(self._undo))
+        return True
+
+    def checkpoint(self):
+        """
+        Compact all steps since the previous checkpoint into a single step
+        """
+        num_steps = min(self._since_checkpoint, self._session_steps())
+        if num_steps == 0:
+            return
+
+        edits = []
+        for _ in range(num_steps):
+            edits[0:0] = self._undo.pop()
+
+        compacted = [edits[0]]
+        for edit in edits[1:]:
+            if not compacted[-1].merge(edit):
+                compacted.append(edit)
+
+        self._undo.append(compacted)
+        self._since_checkpoint = 0
+
+    # Helpers that build, apply and record the common edits
+
+    def add_block(self, sequence, block):
+        self.record(AddBlockEdit(sequence, block))
+
+    def remove_block(self, sequence, name):
+        self.record(RemoveBlockEdit(sequence, name))
+
+    def remove_block_at(self, sequence, index):
+        self.record(RemoveBlockEdit(sequence, index=index))
+
+    def reorder_blocks(self, sequence, names):
+        self.record(ReorderBlocksEdit(sequence, names))
+
+    def set_block_order(self, sequence, blocks):
+        self.record(ReorderBlocksEdit(sequence, blocks=blocks))
+
+    def move_blocks(self, sequence, src, count, dst):
+        self.record(MoveBlocksEdit(sequence, src, count, dst))
+
+    def set_block_type(self, sequence, name, datatype):
+        index = sequence._index_by_name(name)
+        before = sequence.blocklist[index].copy()
+        after = before.copy()
+        after.set_type(datatype)
+        self.record(BlockEdit(sequence, index, before, after))
+
+    def set_block_value(self, sequence, name, value_string):
+        index = sequence._index_by_name(name)
+        before = sequence.blocklist[index].copy()
+        after = before.copy()
+        after.set_value_string(value_string)
+        self.record(BlockEdit(sequence, index, before, after))
+
+    def record_block_edit(self, sequence, index, before):
+        """
+        Record changes already made to a block in place
+
+        :param BlockSequence sequence: sequence containing the block
+        :param int index: position of the block in the sequence
+        :param Block before: copy of the block taken before it was changed
+        """
+        self.record(BlockEdit(sequence, index, before, sequence.blocklist[index].copy()), applied=True)
+        sequence.block_changed(index)
+
+    def add_sequence(self, schema, sequence):
+        self.record(AddSequenceEdit(schema, sequence))
+
+    def remove_sequence(self, schema, name):
+        self.record(RemoveSequenceEdit(schema, name))
+
+    def reorder_sequences(self, schema, names):
+        self.record(ReorderSequencesEdit(schema, names))
+
+    def set_sequence_order(self, schema, sequences):
+        self.record(ReorderSequencesEdit(schema, sequences=sequences))
+
+    def move_sequences(self, schema, src, count, dst):
+        self.record(MoveSequencesEdit(schema, src, count, dst))
+
+    def record_sequence_edit(self, sequence, before):
+        """
+        Record a change of name or colour already made to a sequence
+
+        :param BlockSequence sequence: sequence that was changed
+        :param tuple before: (name, color) of the sequence before it was changed
+        """
+        self.record(SequenceEdit(sequence, before, (sequence.name, sequence.color)), applied=True)
+        sequence._notify(Change.CHANGED)
+
+
+class Layout(object):
+    """
+    Sizes and byte offsets of every field in a sequence or schema, computed
+    once and cached until the layout changes
+    """
+    def __init__(self):
+        self.size_bytes = 0
+        self.fmtstring = ""
+        self.field_names = []
+        self.offsets = {}
+        self.sizes = {}
+        self.fmtstrings = {}
+
+        # Positions in field_names of fields whose values are packed by their
+        # block (see Block.pack_value)
+        self.packed = []
+
+        # (position in field_names, data type, count) of fields of blocks with
+        # a count, which codecs pack as bytes (see unpack_arrays)
+        self.arrays = []
+
+        # (sequence, layout) pairs for the layouts of other sequences this
+        # layout was built from, which must still be current for it to be
+        self.dependencies = []
+
+        # (offset, size, count, layout) parts holding multi-byte values, for
+        # ByteSwapper: count values of the given size if layout is None, or
+        # otherwise count back-to-back records of another layout of the given
+        # size. Repeated records are expanded only when a swapper is created.
+        self.swap_parts = []
+        self._swapper = None
+
+    def is_current(self):
+        for sequence, layout in self.dependencies:
+            if sequence.layout() is not layout:
+                return False
+
+        return True
+
+    def add_field(self, name, size, fmtstring, packed=False, swap_parts=(), array=None):
+        if packed:
+            self.packed.append(len(self.field_names))
+
+        if array is not None:
+            datatype, count = array
+            self.arrays.append((len(self.field_names), datatype, count))
+
+        for offset, part_size, count, layout in swap_parts:
+            self.swap_parts.append((self.size_bytes + offset, part_size, count, layout))
+
+        self.field_names.append(name)
+        self.offsets[name] = self.size_bytes
+        self.sizes[name] = size
+        self.fmtstrings[name] = fmtstring
+        self.fmtstring += fmtstring
+        self.size_bytes += size
+
+    def add_layout(self, name, layout):
+        self.offsets[name] = self.size_bytes
+        self.sizes[name] = layout.size_bytes
+        self.packed.extend([len(self.field_names) + i for i in layout.packed])
+        self.arrays.extend([(len(self.field_names) + i, datatype, count) for i, datatype, count in layout.arrays])
+        for offset, part_size, count, part_layout in layout.swap_parts:
+            self.swap_parts.append((self.size_bytes + offset, part_size, count, part_layout))
+
+        for field_name in layout.field_names:
+            qualified_name = f"{name}.{field_name}"
+            self.field_names.append(qualified_name)
+            self.offsets[qualified_name] = self.size_bytes + layout.offsets[field_name]
+            self.sizes[qualified_name] = layout.sizes[field_name]
+            self.fmtstrings[qualified_name] = layout.fmtstrings[field_name]
+
+        self.fmtstring += layout.fmtstring
+        self.size_bytes += layout.size_bytes
+
+    def unpack_arrays(self, record, big_endian=False):
+        """
+        Convert the values of blocks with a count in a record unpacked by a
+        codec of this layout from packed bytes to lists
+
+        :param tuple record: one value per field, in layout order
+        :param bool big_endian: byte order of the record
+
+        :return: record with a list of values for each block with a count
+        :rtype: tuple
+        """
+        if not self.arrays:
+            return record
+
+        record = list(record)
+        for i, datatype, _ in self.arrays:
+            record[i] = array_from_bytes(datatype, record[i], big_endian).tolist()
+
+        return tuple(record)
+
+    def pack_arrays(self, record, big_endian=False):
+        """
+        Convert the values of blocks with a count in a record from lists to
+        packed bytes, as expected by a codec of this layout. Values that are
+        already bytes are left unchanged.
+
+        :param record: sequence of values in layout order, or a dict keyed by field name
+        :param bool big_endian: byte order of the record
+
+        :raises ValueError: if a list does not have one valid value per element
+
+        :return: record with packed values for each block with a count
+        :rtype: list or dict
+        """
+        if not self.arrays:
+            return record
+
+        is_dict = isinstance(record, dict)
+        record = dict(record) if is_dict else list(record)
+        for i, datatype, count in self.arrays:
+            name = self.field_names[i]
+            key = name if is_dict else i
+            if (not is_dict) or (name in record):
+                record[key] = pack_array(name, datatype, count, record[key], big_endian)
+
+        return record
+
+    def swapper(self):
+        """
+        Get a ByteSwapper for records of this layout, created on first use
+
+        :return: byte swapper
+        :rtype: ByteSwapper
+        """
+        if self._swapper is None:
+            self._swapper = ByteSwapper(self.size_bytes, self.swap_parts)
+
+        return self._swapper
+
+    def offset_of(self, name):
+        if name not in self.offsets:
+            raise ValueError(f"No such field '{name}'")
+
+        return self.offsets[name]
+
+    def size_of(self, name):
+        if name not in self.sizes:
+            raise ValueError(f"No such field '{name}'")
+
+        return self.sizes[name]
+
+
+def _record_getter(field_names):
+    # Function getting the values of a dict record in layout order, as a
+    # tuple. itemgetter returns a bare value for a single name, and needs at
+    # least one.
+    if len(field_names) == 1:
+        name = field_names[0]
+        return lambda record: (record[name],)
+    elif not field_names:
+        return lambda record: ()
+
+    return operator.itemgetter(*field_names)
+
+
+class Codec(object):
+    """
+    Packs and unpacks complete records of a fixed layout using a single
+    precompiled struct.Struct, so the format string is only parsed once
+    """
+    def __init__(self, fmtstring, field_names, big_endian=True):
+        end = ">" if big_endian else "<"
+
+        self.struct = struct.Struct(end + fmtstring)
+        self.field_names = field_names
+        self.big_endian = big_endian
+        self._record_values = _record_getter(field_names)
+
+    def size_bytes(self):
+        return self.struct.size
+
+    def pack(self, values):
+        """
+        Pack one record
+
+        :param values: one value per field, in layout order
+        :return: packed record
+        :rtype: bytes
+        """
+        return self.struct.pack(*values)
+
+    def pack_into(self, buffer, offset, values):
+        """
+        Pack one record into a writable buffer
+
+        :param buffer: writable bytes-like object
+        :param int offset: byte offset in buffer at which to write the record
+        :param values: one value per field, in layout order
+        """
+        self.struct.pack_into(buffer, offset, *values)
+
+    def pack_dict(self, record):
+        """
+        Pack one record given as a dict
+
+        :param dict record: value of each field, keyed by field name
+        :return: packed record
+        :rtype: bytes
+        """
+        return self.struct.pack(*self._record_values(record))
+
+    def pack_many(self, rows):
+        """
+        Pack many records back-to-back into a single preallocated buffer
+
+        :param rows: iterable of records. Each record is either a sequence of
+            values in layout order, or a dict keyed by field name
+
+        :return: packed records
+        :rtype: bytearray
+        """
+        if not hasattr(rows, "__len__"):
+            rows = list(rows)
+
+        size = self.struct.size
+        ret = bytearray(len(rows) * size)
+        pack_into = self.struct.pack_into
+        record_values = self._record_values
+
+        offset = 0
+        for row in rows:
+            if isinstance(row, dict):
+                row = record_values(row)
+
+            pack_into(ret, offset, *row)
+            offset += size
+
+        return ret
+
+    def unpack(self, buffer):
+        """
+        Unpack one record
+
+        :param buffer: bytes-like object, must be exactly one record long
+        :return: one value per field, in layout order
+        :rtype: tuple
+        """
+        return self.struct.unpack(buffer)
+
+    def unpack_from(self, buffer, offset=0):
+        """
+        Unpack one record from a buffer, without copying the buffer
+
+        :param buffer: bytes-like object
+        :param int offset: byte offset in buffer at which the record starts
+
+        :return: one value per field, in layout order
+        :rtype: tuple
+        """
+        return self.struct.unpack_from(buffer, offset)
+
+    def unpack_dict(self, buffer, offset=0):
+        """
+        Unpack one record from a buffer as a dict
+
+        :param buffer: bytes-like object
+        :param int offset: byte offset in buffer at which the record starts
+
+        :return: value of each field, keyed by field name
+        :rtype: dict
+        """
+        return dict(zip(self.field_names, self.struct.unpack_from(buffer, offset)))
+
+    def __str__(self):
+        return f"{self.__class__.__name__}({self.struct.format}, {self.struct.size})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ByteSwapper(object):
+    """
+    Reverses the byte order of every multi-byte value in back-to-back records
+    of a fixed layout, in place, converting them between big-endian and
+    little-endian. BYTES values and single bytes are left unchanged.
+
+    With numpy, each chunk of records has its bytes permuted by one
+    vectorized take, using a permutation of the bytes of one record
+    computed on first use; the permutation of records embedded by reference
+    is tiled from the permutation of the referenced layout. Records made
+    entirely of values of one size are byte-swapped as a single array, with
+    numpy or the array module. Without numpy, other records are converted one
+    at a time by a precompiled struct that reads every multi-byte value as an
+    unsigned integer, so floating point bit patterns are preserved exactly,
+    and embedded records by the swapper of their own layout.
+    """
+    # Number of bytes converted at a time, bounding the size of temporary copies
+    CHUNK_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, size_bytes, swap_parts):
+        self.size_bytes = size_bytes
+        self._permutation = None
+        self._structs = None
+
+        # (offset, value size, number of values) runs of multi-byte values,
+        # merged where adjacent runs have values of the same size
+        self.runs = []
+
+        # (offset, swapper, number of records) for records of other layouts
+        self.nested = []
+
+        covered = 0
+        itemsizes = set()
+        for offset, part_size, count, layout in swap_parts:
+            if layout is None:
+                self._add_run(offset, part_size, count)
+                itemsizes.add(part_size)
+                covered += part_size * count
+                continue
+
+            swapper = layout.swapper()
+            if swapper.is_empty():
+                continue
+
+            self.nested.append((offset, swapper, count))
+            itemsizes.add(swapper.itemsize)
+            covered += part_size * count
+
+        # Size of the values making up every byte of a record, if all the same
+        self.itemsize = None
+        if (len(itemsizes) == 1) and (None not in itemsizes) and (covered == size_bytes):
+            self.itemsize = itemsizes.pop()
+
+    def _add_run(self, offset, itemsize, count):
+        if self.runs:
+            last_offset, last_itemsize, last_count = self.runs[-1]
+            if (last_itemsize == itemsize) and ((last_offset + (last_itemsize * last_count)) == offset):
+                self.runs[-1] = (last_offset, itemsize, last_count + count)
+                return
+
+        self.runs.append((offset, itemsize, count))
+
+    def is_empty(self):
+        # True if records of this layout have no multi-byte values
+        return not (self.runs or self.nested)
+
+    def permutation(self):
+        """
+        Get the byte permutation applied to each record. Requires numpy.
+
+        :return: index of the byte moved to each position of a record
+        :rtype: numpy.ndarray
+        """
+        if self._permutation is None:
+            numpy = import_numpy()
+            permutation = numpy.arange(self.size_bytes)
+            for offset, itemsize, count in self.runs:
+                values = permutation[offset:offset + (itemsize * count)].reshape(count, itemsize)
+                values[:] = values[:, ::-1].copy()
+
+            for offset, swapper, count in self.nested:
+                size = swapper.size_bytes * count
+                starts = numpy.arange(offset, offset + size, swapper.size_bytes)
+                permutation[offset:offset + size] = numpy.add.outer(starts, swapper.permutation()).ravel()
+
+            self._permutation = permutation
+
+        return self._permutation
+
+    def _record_structs(self):
+        # Big-endian and little-endian structs covering the runs of one record
+        if self._structs is None:
+            fmtstring = ""
+            pos = 0
+            for offset, itemsize, count in self.runs:
+                if offset > pos:
+                    fmtstring += f"{offset - pos}s"
+
+                fmtstring += f"{count}{_UNSIGNED_TYPECODES[itemsize]}"
+                pos = offset + (itemsize * count)
+
+            self._structs = (struct.Struct(">" + fmtstring), struct.Struct("<" + fmtstring))
+
+        return self._structs
+
+    def swap(self, buffer, offset=0, count=None):
+        """
+        Reverse the byte order of every multi-byte value in records in a buffer, in place
+
+        :param buffer: writable bytes-like object, e.g. a bytearray, mmap or numpy array
+        :param int offset: byte offset of the first record
+        :param int count: number of records to convert. Defaults to all records\
+            after the offset, which must then be a whole number of records.
+
+        :return: number of records converted
+        :rtype: int
+        """
+        with memoryview(buffer) as base, base.cast("B") as view:
+            if view.readonly:
+                raise ValueError("Cannot swap byte order in a read-only buffer")
+
+            available = len(view) - offset
+            size = self.size_bytes
+
+            if count is None:
+                if (size == 0) or (available % size):
+                    raise ValueError(f"{available} bytes is not a whole number of {size}-byte records")
+
+                count = available // size
+            elif (count * size) > available:
+                raise ValueError(f"Not enough data for {count} records")
+
+            if (count == 0) or self.is_empty():
+                return count
+
+            # Views are released on leaving, so the buffer can be resized or
+            # closed afterwards, e.g. an mmap
+            with view[offset:offset + (count * size)] as records:
+                self._swap_view(records, count)
+
+        return count
+
+    def _swap_view(self, records, count):
+        try:
+            numpy = import_numpy()
+        except ImportError:
+            numpy = None
+
+        if (self.itemsize is not None) and (numpy is not None):
+            numpy.frombuffer(records, dtype=f"u{self.itemsize}").byteswap(inplace=True)
+        elif self.itemsize is not None:
+            self._swap_arrays(records)
+        elif numpy is not None:
+            self._swap_numpy(numpy, records, count)
+        else:
+            self._swap_records(records, count)
+
+    def _swap_arrays(self, records):
+        chunk_size = max(1, self.CHUNK_SIZE // self.size_bytes) * self.size_bytes
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            values = array.array(_UNSIGNED_TYPECODES[self.itemsize])
+            values.frombytes(chunk)
+            values.byteswap()
+            chunk[:] = memoryview(values).cast("B")
+
+    def _swap_numpy(self, numpy, records, count):
+        permutation = self.permutation()
+        rows = numpy.frombuffer(records, dtype=numpy.uint8).reshape(count, self.size_bytes)
+        chunk_rows = max(1, self.CHUNK_SIZE // self.size_bytes)
+        swapped = numpy.empty((min(chunk_rows, count), self.size_bytes), dtype=numpy.uint8)
+
+        for start in range(0, count, chunk_rows):
+            chunk = rows[start:start + chunk_rows]
+            out = swapped[:len(chunk)]
+            numpy.take(chunk, permutation, axis=1, out=out, mode="clip")
+            chunk[:] = out
+
+    def _swap_records(self, records, count):
+        big, little = self._record_structs()
+        unpack_from = big.unpack_from
+        pack_into = little.pack_into
+
+        for pos in range(0, count * self.size_bytes, self.size_bytes):
+            if self.runs:
+                pack_into(records, pos, *unpack_from(records, pos))
+
+            for offset, swapper, num_records in self.nested:
+                start = pos + offset
+                nested = records[start:start + (swapper.size_bytes * num_records)]
+                if swapper.itemsize is not None:
+                    swapper._swap_arrays(nested)
+                else:
+                    swapper._swap_records(nested, num_records)
+
+
 class CodeWriter(object):
     def __init__(self, big_endian=True):
         self.big_endian = big_endian
 
+    @timed("CodeWriter.generate_c_string", result_len)
     def generate_c_string(self, obj):
-        ret = "typedef struct\n{\n"
+        ret = ""
+
+        # Sequences embedded by reference are declared once each, before
+        # the structs that use them
+        structnames = {}
+        for s in obj.referenced_sequences():
+            if (s.varname in structnames) or (s.varname == string_to_varname(obj.name)):
+                raise ValueError(f"different referenced sequences named '{s.name}' result in "
+                                 f"the same C struct name")
+
+            structnames[s.varname] = s
+            ret += "typedef struct\n{\n" + s.generate_c_string()
+            ret += "\n} __attribute__((packed)) " + s.varname + "_t;\n\n"
+
+        ret += "typedef struct\n{\n"
         ret += obj.generate_c_string()
 
         structname = string_to_varname(obj.name) + "_t"
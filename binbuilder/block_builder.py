@@ -1,13 +1,15 @@
 from PyQt5.QtCore import Qt
 from PyQt5 import QtWidgets, QtCore, QtGui
 
-from binbuilder.dragdrop_table_widget import DragDropTableWidget
-from binbuilder.utils import truncate_string, ICON_PATH
+from binbuilder.utils import truncate_string, errorDialog, ICON_PATH
 from binbuilder.block import DataType, DATATYPES
 
 
 type_name_map = {DATATYPES[code].name: code for code in DATATYPES}
 
+# Maximum count selectable for array blocks
+MAX_COUNT = 1000000
+
 
 def clean_bin_str(s):
     return ''.join([i.strip() for i in s.split()])
@@ -28,6 +30,9 @@ class BlockBuilderDialog(QtWidgets.QDialog):
         self.hex_validator = QtGui.QRegExpValidator(QtCore.QRegExp("([0-9A-Fa-f]{2}[ \t]*)+"))
         self.decimal_validator = QtGui.QRegExpValidator(QtCore.QRegExp("[0-9]+"))
         self.float_validator = QtGui.QRegExpValidator(QtCore.QRegExp("[0-9]+(\\.?[0-9]+)?"))
+        self.decimal_list_validator = QtGui.QRegExpValidator(QtCore.QRegExp("[0-9]+([ ,]+[0-9]+)*"))
+        self.float_list_validator = QtGui.QRegExpValidator(
+            QtCore.QRegExp("[0-9]+(\\.?[0-9]+)?([ ,]+[0-9]+(\\.?[0-9]+)?)*"))
 
         self.type_is_bytes = block.typeinfo.datatype == DataType.BYTES
 
@@ -41,6 +46,18 @@ class BlockBuilderDialog(QtWidgets.QDialog):
 
         self.sizeLabel = QtWidgets.QLabel(self)
 
+        self.countLayout = QtWidgets.QHBoxLayout()
+        self.countInput = QtWidgets.QSpinBox()
+        self.countInput.setRange(0, MAX_COUNT)
+        self.countInput.setSpecialValueText("Single value")
+        self.countInput.setValue(0 if block.count is None else block.count)
+        self.countInput.setEnabled(not self.type_is_bytes)
+        self.countInput.valueChanged.connect(self.count_changed)
+        self.countLabel = QtWidgets.QLabel()
+        self.countLabel.setText("Count: ")
+        self.countLayout.addWidget(self.countLabel)
+        self.countLayout.addWidget(self.countInput)
+
         self.valueLayout = QtWidgets.QHBoxLayout()
         self.valueInput = QtWidgets.QLineEdit()
         self.valueInput.textChanged.connect(self.value_input_changed)
@@ -65,6 +82,7 @@ class BlockBuilderDialog(QtWidgets.QDialog):
 
         self.mainLayout.addLayout(self.nameLayout)
         self.mainLayout.addLayout(self.typeLayout)
+        self.mainLayout.addLayout(self.countLayout)
         self.mainLayout.addLayout(self.valueLayout)
         self.mainLayout.addWidget(self.sizeLabel)
 
@@ -74,9 +92,24 @@ class BlockBuilderDialog(QtWidgets.QDialog):
         self.update()
 
     def closeEvent(self, event):
-        self.block.set_name(self.nameInput.text())
-        self.block.set_type(type_name_map[self.typeCombo.currentText()])
-        self.block.set_value_string(self.valueInput.text())
+        # Try the inputs on a copy first, so that invalid inputs leave the
+        # block unchanged and the dialog open
+        try:
+            self.applyInputs(self.block.copy())
+        except ValueError as e:
+            errorDialog(self, message=str(e))
+            event.ignore()
+            return
+
+        self.applyInputs(self.block)
+
+    def applyInputs(self, block):
+        block.set_name(self.nameInput.text())
+        block.set_type(type_name_map[self.typeCombo.currentText()])
+        if not self.type_is_bytes:
+            block.count = self.countInput.value() or None
+
+        block.set_value_string(self.valueInput.text())
 
     def value_input_changed(self, value):
         if self.type_is_bytes:
@@ -88,18 +121,19 @@ class BlockBuilderDialog(QtWidgets.QDialog):
         if datatype == DataType.BYTES:
             size = bin_str_len(self.valueInput.text())
         else:
-            size = DATATYPES[datatype].size_bytes
+            size = DATATYPES[datatype].size_bytes * max(1, self.countInput.value())
 
         self.sizeLabel.setText(f"Size: {size}")
 
     def set_value_validator_for_type(self, typename):
         datatype = type_name_map[typename]
+        is_array = self.countInput.value() > 0
         if DataType.BYTES == datatype:
             self.valueInput.setValidator(self.hex_validator)
         elif datatype in [DataType.FLOAT, DataType.DOUBLE]:
-            self.valueInput.setValidator(self.float_validator)
+            self.valueInput.setValidator(self.float_list_validator if is_array else self.float_validator)
         else:
-            self.valueInput.setValidator(self.decimal_validator)
+            self.valueInput.setValidator(self.decimal_list_validator if is_array else self.decimal_validator)
 
     def datatype_changed(self, typename):
         new_type = type_name_map[typename]
@@ -107,9 +141,15 @@ class BlockBuilderDialog(QtWidgets.QDialog):
         self.set_value_validator_for_type(typename)
         self.set_size_label(typename)
         self.type_is_bytes = new_type == DataType.BYTES
+        self.countInput.setEnabled(not self.type_is_bytes)
 
         if self.old_type != new_type:
             self.valueInput.setText('')
 
         self.old_type = new_type
 
+    def count_changed(self, count):
+        typename = self.typeCombo.currentText()
+        self.set_value_validator_for_type(typename)
+        self.set_size_label(typename)
+
@@ -0,0 +1,193 @@
+"""
+Headless command-line interface for working with saved binbuilder schema
+files. This module must not import PyQt5 or qdarktheme, so that it starts
+quickly and runs on machines without a display.
+
+Usage: python -m binbuilder.cli <command> [options]
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sys
+
+from binbuilder.block import CodeWriter
+from binbuilder.batch import convert_table, DEFAULT_CHUNK_SIZE
+from binbuilder.save_file import load_schema
+from binbuilder import __version__ as package_version
+
+
+def json_value(value):
+    if isinstance(value, bytes):
+        return value.hex()
+
+    return value
+
+
+def write_output(data, filename):
+    if filename is None:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    else:
+        with open(filename, "wb") as fh:
+            fh.write(data)
+
+
+def cmd_emit(args):
+    schema = load_schema(args.schema)
+    data = schema.emit_data()
+    write_output(data * args.count, args.output)
+    return 0
+
+
+def cmd_decode(args):
+    schema = load_schema(args.schema)
+    field_names = schema.compile().field_names
+    partial = "ignore" if args.ignore_partial else "error"
+
+    for record in schema.iter_records(args.data, offset=args.offset, stride=args.stride,
+                                      limit=args.limit, partial=partial):
+        print(json.dumps({n: json_value(v) for n, v in zip(field_names, record)}))
+
+    return 0
+
+
+def cmd_gen_c(args):
+    schema = load_schema(args.schema)
+    writer = CodeWriter(schema.big_endian)
+
+    if args.sequence is None:
+        sequences = schema.sequencelist
+    else:
+        sequences = [schema.get_sequence_by_name(args.sequence)]
+
+    print("\n\n".join([writer.generate_c_string(s) for s in sequences]))
+    return 0
+
+
+def cmd_gen_struct(args):
+    schema = load_schema(args.schema)
+    writer = CodeWriter(schema.big_endian)
+
+    if args.sequence is None:
+        print(writer.generate_pystruct_fmtstring(schema))
+    else:
+        print(writer.generate_pystruct_fmtstring(schema.get_sequence_by_name(args.sequence)))
+
+    return 0
+
+
+def cmd_validate(args):
+    schema = load_schema(args.schema)
+    size = schema.size_bytes()
+    num_fields = len(schema.compile().field_names)
+    print(f"{args.schema}: {len(schema.sequencelist)} sequences, {num_fields} fields, {size} bytes")
+
+    if args.data is not None:
+        datasize = os.path.getsize(args.data)
+        if (size == 0) or (datasize % size):
+            print(f"{args.data}: {datasize} bytes is not a whole number of records", file=sys.stderr)
+            return 1
+
+        print(f"{args.data}: {datasize // size} records")
+
+    return 0
+
+
+def cmd_convert(args):
+    schema = load_schema(args.schema)
+    num_rows = convert_table(schema, args.table, args.output, per_row=args.per_row,
+                             input_format=args.format, chunk_size=args.chunk_size,
+                             max_workers=args.jobs)
+
+    print(f"Converted {num_rows} rows", file=sys.stderr)
+    return 0
+
+
+def cmd_swap_endian(args):
+    schema = load_schema(args.schema)
+    filename = args.data
+    if args.output:
+        shutil.copyfile(args.data, args.output)
+        filename = args.output
+
+    num_records = 0
+    with open(filename, "r+b") as fh:
+        if os.fstat(fh.fileno()).st_size > 0:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_WRITE) as data:
+                num_records = schema.swap_endianness(data)
+
+    print(f"Converted {num_records} records", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="binbuilder-cli",
+                                     description="Work with binbuilder schema files without the GUI")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {package_version}")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    emit = subparsers.add_parser("emit", help="Write the default values of a schema as binary data")
+    emit.add_argument("schema", help="Saved schema file (.bschema, or binary .bschemab)")
+    emit.add_argument("-o", "--output", default=None, help="Output file. Defaults to stdout.")
+    emit.add_argument("-n", "--count", type=int, default=1, help="Number of records to write")
+    emit.set_defaults(func=cmd_emit)
+
+    decode = subparsers.add_parser("decode", help="Decode records from binary data as JSON lines")
+    decode.add_argument("schema", help="Saved schema file (.bschema, or binary .bschemab)")
+    decode.add_argument("data", help="Binary data file")
+    decode.add_argument("--offset", type=int, default=0, help="Byte offset of the first record")
+    decode.add_argument("--stride", type=int, default=None, help="Bytes from the start of one record to the next")
+    decode.add_argument("--limit", type=int, default=None, help="Maximum number of records to decode")
+    decode.add_argument("--ignore-partial", action="store_true", help="Ignore a trailing partial record")
+    decode.set_defaults(func=cmd_decode)
+
+    gen_c = subparsers.add_parser("gen-c", help="Generate C code for the sequences in a schema")
+    gen_c.add_argument("schema", help="Saved schema file (.bschema, or binary .bschemab)")
+    gen_c.add_argument("-s", "--sequence", default=None, help="Only generate code for this sequence")
+    gen_c.set_defaults(func=cmd_gen_c)
+
+    gen_struct = subparsers.add_parser("gen-struct", help="Generate a python struct format string")
+    gen_struct.add_argument("schema", help="Saved schema file (.bschema, or binary .bschemab)")
+    gen_struct.add_argument("-s", "--sequence", default=None, help="Only generate a format string for this sequence")
+    gen_struct.set_defaults(func=cmd_gen_struct)
+
+    validate = subparsers.add_parser("validate", help="Check that a schema file (and optionally a data file) is valid")
+    validate.add_argument("schema", help="Saved schema file (.bschema, or binary .bschemab)")
+    validate.add_argument("data", nargs="?", default=None, help="Binary data file to check against the schema")
+    validate.set_defaults(func=cmd_validate)
+
+    convert = subparsers.add_parser("convert", help="Convert a CSV or JSONL table of field values to binary data")
+    convert.add_argument("schema", help="Saved schema file (.bschema, or binary .bschemab)")
+    convert.add_argument("table", help="CSV or JSONL file with one record per row")
+    convert.add_argument("-o", "--output", required=True, help="Output file, or output directory with --per-row")
+    convert.add_argument("--per-row", action="store_true", help="Write one file per row")
+    convert.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                         help="Input format. Defaults to detecting from the file extension.")
+    convert.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per worker task")
+    convert.add_argument("-j", "--jobs", type=int, default=None,
+                         help="Number of worker processes. Defaults to the number of CPUs.")
+    convert.set_defaults(func=cmd_convert)
+
+    swap_endian = subparsers.add_parser("swap-endian", help="Convert binary data between big-endian and little-endian")
+    swap_endian.add_argument("schema", help="Saved schema file (.bschema, or binary .bschemab)")
+    swap_endian.add_argument("data", help="Binary data file of back-to-back records")
+    swap_endian.add_argument("-o", "--output", help="Output file. Defaults to converting the data file in place.")
+    swap_endian.set_defaults(func=cmd_swap_endian)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
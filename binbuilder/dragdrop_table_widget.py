@@ -1,9 +1,13 @@
 from PyQt5 import QtCore
 from PyQt5.QtGui import QDropEvent
-from PyQt5.QtWidgets import QTableWidget, QAbstractItemView, QTableWidgetItem, QWidget, QHBoxLayout, QApplication
+from PyQt5.QtWidgets import QTableView, QAbstractItemView
 
 
-class DragDropTableWidget(QTableWidget):
+class DragDropTableView(QTableView):
+    """
+    Table view whose rows can be reordered by drag and drop. Dropped rows are
+    moved in the model with moveRows, rather than copied and re-inserted.
+    """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -13,41 +17,41 @@ class DragDropTableWidget(QTableWidget):
         self.setDragDropOverwriteMode(False)
         self.setDropIndicatorShown(True)
 
-        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setSelectionMode(QAbstractItemView.ContiguousSelection)
         self.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.setDragDropMode(QAbstractItemView.InternalMove)
 
     def dropEvent(self, event: QDropEvent):
-        if not event.isAccepted() and event.source() == self:
-            drop_row = self.drop_on(event)
+        if event.source() is not self:
+            event.ignore()
+            return
 
-            rows = sorted(set(item.row() for item in self.selectedItems()))
-            rows_to_move = [[QTableWidgetItem(self.item(row_index, column_index)) for column_index in range(self.columnCount())]
-                            for row_index in rows]
+        rows = sorted(set(index.row() for index in self.selectionModel().selectedRows()))
+        if not rows:
+            event.ignore()
+            return
 
-            for row_index in reversed(rows):
-                self.removeRow(row_index)
-                if len(rows) > 1:
-                    if row_index < drop_row:
-                        drop_row -= 1
+        drop_row = self.drop_on(event)
+        root = QtCore.QModelIndex()
 
-            for row_index, data in enumerate(rows_to_move):
-                row_index += drop_row
-                self.insertRow(row_index)
-                for column_index, column_data in enumerate(data):
-                    self.setItem(row_index, column_index, column_data)
+        if self.model().moveRows(root, rows[0], len(rows), root, drop_row):
+            first = drop_row if drop_row < rows[0] else drop_row - len(rows)
+            self.selectRows(first, first + len(rows) - 1)
 
-            event.accept()
-            for row_index in range(len(rows_to_move)):
-                for i in range(self.columnCount()):
-                	self.item(drop_row + row_index, i).setSelected(True)
+        # The model has already moved the rows, so the drag source must not
+        # remove them as it would for a regular move
+        event.setDropAction(QtCore.Qt.IgnoreAction)
+        event.accept()
 
-        super().dropEvent(event)
+    def selectRows(self, first, last):
+        model = self.model()
+        selection = QtCore.QItemSelection(model.index(first, 0), model.index(last, model.columnCount() - 1))
+        self.selectionModel().select(selection, QtCore.QItemSelectionModel.ClearAndSelect)
 
     def drop_on(self, event):
         index = self.indexAt(event.pos())
         if not index.isValid():
-            return self.rowCount() - 1
+            return self.model().rowCount()
 
         return index.row() + 1 if self.is_below(event.pos(), index) else index.row()
 
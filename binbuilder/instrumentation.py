@@ -0,0 +1,193 @@
+"""
+Opt-in counters and timing spans for schema operations.
+
+Instrumentation is disabled by default, and enabled either by setting the
+BINBUILDER_STATS environment variable to a non-zero value before starting,
+or by calling enable(). When enabled through the environment variable, a
+report is also written to stderr when the process exits.
+
+Functions are instrumented with the timed decorator. While instrumentation
+is disabled, a timed function costs one extra function call and flag check.
+"""
+import atexit
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+
+# Environment variable that enables instrumentation when set to a non-zero value
+ENV_VAR = "BINBUILDER_STATS"
+
+# Maximum number of recent durations kept per span, for percentiles
+MAX_SAMPLES = 10000
+
+_enabled = False
+_lock = threading.Lock()
+_spans = {}
+
+
+class _Span(object):
+    __slots__ = ("count", "total_seconds", "nbytes", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.nbytes = 0
+        self.samples = collections.deque(maxlen=MAX_SAMPLES)
+
+
+def enable():
+    """
+    Start recording counters and timing spans
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    Stop recording counters and timing spans. Recorded stats are kept.
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Discard all recorded stats
+    """
+    with _lock:
+        _spans.clear()
+
+
+def record(name, seconds=None, nbytes=0):
+    """
+    Record one occurrence of a span or counter. Does nothing while
+    instrumentation is disabled.
+
+    :param str name: name of span or counter
+    :param float seconds: duration, or None for a counter with no duration
+    :param int nbytes: number of bytes processed
+    """
+    if not _enabled:
+        return
+
+    with _lock:
+        span = _spans.get(name)
+        if span is None:
+            span = _Span()
+            _spans[name] = span
+
+        span.count += 1
+        span.nbytes += nbytes
+        if seconds is not None:
+            span.total_seconds += seconds
+            span.samples.append(seconds)
+
+
+def timed(name, nbytes=None):
+    """
+    Decorator recording a timing span for each call of a function
+
+    :param str name: name of span
+    :param nbytes: optional function called as nbytes(result, *args, **kwargs)\
+        with the return value and arguments of each call, returning the\
+        number of bytes processed by the call
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+
+            record(name, seconds, 0 if nbytes is None else nbytes(result, *args, **kwargs))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def result_len(result, *args, **kwargs):
+    """
+    nbytes function for timed, for functions returning the data they produced
+    """
+    return len(result)
+
+
+def result_value(result, *args, **kwargs):
+    """
+    nbytes function for timed, for functions returning the number of bytes
+    they consumed
+    """
+    return result
+
+
+def _percentile(ordered, fraction):
+    # Nearest-rank percentile of a sorted list
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def stats():
+    """
+    Get the recorded stats. Percentiles are computed from the most recent
+    MAX_SAMPLES durations of each span.
+
+    :return: dict keyed by span name, of dicts with 'count', 'total_seconds',\
+        'p50_seconds', 'p99_seconds' and 'bytes'. Percentiles are None for\
+        counters with no durations.
+    :rtype: dict
+    """
+    ret = {}
+
+    with _lock:
+        for name, span in _spans.items():
+            ordered = sorted(span.samples)
+            ret[name] = {
+                "count": span.count,
+                "total_seconds": span.total_seconds,
+                "p50_seconds": _percentile(ordered, 0.5) if ordered else None,
+                "p99_seconds": _percentile(ordered, 0.99) if ordered else None,
+                "bytes": span.nbytes,
+            }
+
+    return ret
+
+
+def report():
+    """
+    Format the recorded stats as a table
+
+    :return: formatted stats, one line per span
+    :rtype: str
+    """
+    def ms(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.3f}"
+
+    lines = [f"{'span':<40} {'count':>8} {'total ms':>12} {'p50 ms':>10} {'p99 ms':>10} {'bytes':>12}"]
+    for name, s in sorted(stats().items()):
+        lines.append(f"{name:<40} {s['count']:>8} {ms(s['total_seconds']):>12} "
+                     f"{ms(s['p50_seconds']):>10} {ms(s['p99_seconds']):>10} {s['bytes']:>12}")
+
+    return "\n".join(lines)
+
+
+def _report_at_exit():
+    if _spans:
+        sys.stderr.write(report() + "\n")
+
+
+if os.environ.get(ENV_VAR, "0") not in ["", "0"]:
+    enable()
+    atexit.register(_report_at_exit)
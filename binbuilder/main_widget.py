@@ -1,38 +1,40 @@
 import os
 
-from binbuilder.saved_sequence_browser import SavedSequenceBrowserDialog
-from binbuilder.dragdrop_table_widget import DragDropTableWidget
-from binbuilder.block import Block, BlockSequence, DataType, Schema
-from binbuilder.sequence_builder import SequenceBuilderDialog
-from binbuilder.utils import truncate_string, errorDialog, yesNoDialog
-from binbuilder.save_file import SavedSchema
-
-from versionedobj import Serializer
+from binbuilder.dragdrop_table_widget import DragDropTableView
+from binbuilder.table_models import SchemaTableModel
+from binbuilder.block import Block, BlockSequence, DataType, Schema, EditHistory
+from binbuilder.utils import errorDialog, yesNoDialog
+from binbuilder.save_file import save_schema, load_schema
+from binbuilder.binary_format import BINARY_EXTENSION
+from binbuilder.background_task import runInBackground
 
 
 from PyQt5 import QtWidgets, QtCore, QtGui
 
 
-blocks1 = [
-    Block(DataType.UINT_4B, "First Counter", 44),
-    Block(DataType.UINT_4B, "Second Counter", 55),
-    Block(DataType.DOUBLE, "THIRD,,::;;COUNTER", 55.5),
-    Block(DataType.FLOAT, "fourth,  COUNTER", 55.5),
-    Block(DataType.BYTES, "Auth. Token", b'ffff', 4),
-    Block(DataType.BYTES, "AUTHKEY", b'ffffgggghhhhjjjj', 12)
+# File dialog filters for JSON and binary schema files
+SCHEMA_FILE_FILTERS = [
+    "BinBuilder Schema files (*.bschema)",
+    f"BinBuilder binary Schema files (*{BINARY_EXTENSION})",
 ]
 
-blocks2 = [
-    Block(DataType.UINT_4B, "First Counter", 44),
-    Block(DataType.UINT_4B, "Second Counter", 55),
-    Block(DataType.DOUBLE, "THIRD,,::;;COUNTER", 55.5),
-    Block(DataType.FLOAT, "fourth,  COUNTER", 55.5),
-    Block(DataType.BYTES, "Auth. Token", b'ffff', 4),
-    Block(DataType.BYTES, "AUTHKEY", b'ffffgggghhhhjjjj', 12)
-]
 
-seq1 = BlockSequence("Seq 1", blocks1)
-seq2 = BlockSequence("Seq 2", blocks2)
+def demo_blocks():
+    return [
+        Block(DataType.UINT_4B, "First Counter", 44),
+        Block(DataType.UINT_4B, "Second Counter", 55),
+        Block(DataType.DOUBLE, "THIRD,,::;;COUNTER", 55.5),
+        Block(DataType.FLOAT, "fourth,  COUNTER", 55.5),
+        Block(DataType.BYTES, "Auth. Token", b'ffff', 4),
+        Block(DataType.BYTES, "AUTHKEY", b'ffffgggghhhhjjjj', 12)
+    ]
+
+
+def demo_schema():
+    # Schema shown at startup, built when the main widget is created
+    seq1 = BlockSequence("Seq 1", demo_blocks())
+    seq2 = BlockSequence("Seq 2", demo_blocks())
+    return Schema("Test schema", [seq1, seq2])
 
 
 class MainWidget(QtWidgets.QDialog):
@@ -40,7 +42,8 @@ class MainWidget(QtWidgets.QDialog):
         super(MainWidget, self).__init__()
         self.main = mainWindow
         self.primary_screen = primaryScreen
-        self.current_schema = Schema("Test schema", [seq1, seq2])
+        self.current_schema = demo_schema()
+        self.history = EditHistory()
 
         self.sizeLabel = QtWidgets.QLabel()
 
@@ -64,14 +67,14 @@ class MainWidget(QtWidgets.QDialog):
         self.endiannessCheckbox.toggled.connect(self.onEndiannessChange)
         self.buttonLayout.addWidget(self.endiannessCheckbox)
 
-        # Build schema builder table widget
-        self.table = DragDropTableWidget()
-        self.table.setColumnCount(2)
+        # Build schema builder table view
+        self.model = SchemaTableModel(self.current_schema, self.history, self)
+        self.table = DragDropTableView()
+        self.table.setModel(self.model)
         self.table.setWordWrap(False)
-        self.table.setHorizontalHeaderLabels(['Name', 'Size'])
         self.table.verticalHeader().setVisible(False)
         self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
-        self.table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.table.doubleClicked.connect(self.onDoubleClick)
 
         self.mainLayout = QtWidgets.QVBoxLayout(self)
@@ -92,55 +95,66 @@ class MainWidget(QtWidgets.QDialog):
         self.current_schema.big_endian = self.endiannessCheckbox.isChecked()
 
     def saveSchema(self):
-        self.reorder_schema_by_table()
         options = QtWidgets.QFileDialog.Options()
         options |= QtWidgets.QFileDialog.DontUseNativeDialog
-        filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Select save file", "",
-                                                            "BinBuilder Schema files (*.bschema)", options=options)
+        filename, selected = QtWidgets.QFileDialog.getSaveFileName(self, "Select save file", "",
+                                                                   ";;".join(SCHEMA_FILE_FILTERS), options=options)
         if not filename:
             return
 
-        if not filename.endswith(".bschema"):
-            filename = os.path.splitext(filename)[0] + ".bschema"
+        if not filename.endswith((".bschema", BINARY_EXTENSION)):
+            extension = BINARY_EXTENSION if (selected == SCHEMA_FILE_FILTERS[1]) else ".bschema"
+            filename = os.path.splitext(filename)[0] + extension
 
-        saved_schema = SavedSchema()
-        saved_schema.schema_data = self.current_schema
-        serializer = Serializer()
-        serializer.to_file(saved_schema, filename)
+        # Save a copy, which can't be changed by further edits while it is being written
+        runInBackground(self, "Saving schema...", save_schema, self.current_schema.copy(), filename)
 
     def loadSchema(self):
         options = QtWidgets.QFileDialog.Options()
         options |= QtWidgets.QFileDialog.DontUseNativeDialog
         filename, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Select save file", "",
-                                                            "BinBuilder Schema files (*.bschema)", options=options)
+                                                            f"BinBuilder Schema files (*.bschema *{BINARY_EXTENSION})",
+                                                            options=options)
         if not filename:
             return
 
-        loaded_schema = SavedSchema()
-        loaded_schema.schema_data = self.current_schema
-        loaded_schema.schema_data.sequencelist = []
+        runInBackground(self, "Loading schema...", load_schema, filename, finished=self.setSchema)
 
-        serializer = Serializer()
-        serializer.from_file(loaded_schema, filename)
-        self.current_schema = loaded_schema.schema_data
+    def setSchema(self, schema):
+        self.current_schema = schema
+        self.history.clear()
+        self.model.observe(self.current_schema)
         self.update()
 
+    def undo(self):
+        self.history.checkpoint()
+        if self.history.undo():
+            self.update()
+
+    def redo(self):
+        if self.history.redo():
+            self.update()
+
     def newButtonClicked(self):
         new = BlockSequence(f"New sequence {len(self.current_schema.sequencelist)}")
         success = False
 
+        from binbuilder.sequence_builder import SequenceBuilderDialog
+
         while not success:
             dialog = SequenceBuilderDialog(self, new)
             dialog.setWindowModality(QtCore.Qt.ApplicationModal)
             dialog.exec_()
 
             try:
-                self.current_schema.add_sequence(new)
+                self.model.appendItem(new)
             except ValueError as e:
                 errorDialog(self, message=str(e))
             else:
                 success = True
 
+        # Adding the sequence and all edits made to it are undone together
+        self.history.checkpoint()
         self.update()
 
     def editButtonClicked(self):
@@ -152,8 +166,8 @@ class MainWidget(QtWidgets.QDialog):
         self.editSequenceByRow(rows[0].row())
 
     def removeSequenceByRow(self, row):
-        seq_name = self.table.item(row, 0).text()
-        self.current_schema.remove_sequence_by_name(seq_name)
+        self.model.removeItemAt(row)
+        self.history.checkpoint()
         self.update()
 
     def removeButtonClicked(self):
@@ -164,52 +178,38 @@ class MainWidget(QtWidgets.QDialog):
 
         self.removeSequenceByRow(rows[0].row())
 
-    def reorder_schema_by_table(self):
-        names = []
-        for i in range(self.table.rowCount()):
-            names.append(self.table.item(i, 0).text())
-
-        self.current_schema.reorder_by_names(names)
-
-    def addRow(self, sequence):
-        nextFreeRow = self.table.rowCount()
-        self.table.insertRow(nextFreeRow)
-
-        item1 = QtWidgets.QTableWidgetItem(truncate_string(sequence.name))
-        item2 = QtWidgets.QTableWidgetItem(str(sequence.size_bytes()))
-
-        item2.setTextAlignment(QtCore.Qt.AlignVCenter)
-        item2.setTextAlignment(QtCore.Qt.AlignHCenter)
-
-        item1.setBackground(QtGui.QColor(*sequence.color))
-        item2.setBackground(QtGui.QColor(*sequence.color))
-
-        self.table.setItem(nextFreeRow, 0, item1)
-        self.table.setItem(nextFreeRow, 1, item2)
-
-    def populateTable(self):
-        self.table.setRowCount(0)
-        for seq in self.current_schema.sequencelist:
-            self.addRow(seq)
-
     def update(self):
-        self.populateTable()
         self.sizeLabel.setText(f"Total size: {self.current_schema.size_bytes()} bytes")
-        self.reorder_schema_by_table()
         self.endiannessCheckbox.setChecked(self.current_schema.big_endian)
         super(MainWidget, self).update()
 
     def editSequenceByRow(self, row):
-        seq_name = self.table.item(row, 0).text()
-        seq = self.current_schema.get_sequence_by_name(seq_name)
+        from binbuilder.sequence_builder import SequenceBuilderDialog
+
+        seq = self.model.itemAt(row)
         dialog = SequenceBuilderDialog(self, seq)
         dialog.setWindowModality(QtCore.Qt.ApplicationModal)
         dialog.exec_()
 
+        # All edits made in the sequence editor are undone together
+        self.history.checkpoint()
+        self.update()
+
     def savedSequences(self):
+        from binbuilder.saved_sequence_browser import SavedSequenceBrowserDialog
+
         dialog = SavedSequenceBrowserDialog(self)
         dialog.setWindowModality(QtCore.Qt.ApplicationModal)
         dialog.exec_()
+
+        if dialog.selected is not None:
+            try:
+                self.model.appendItem(dialog.selected)
+            except ValueError as e:
+                errorDialog(self, message=str(e))
+            else:
+                self.history.checkpoint()
+
         self.update()
 
     def onDoubleClick(self, signal):
@@ -221,15 +221,14 @@ class MainWidget(QtWidgets.QDialog):
 
     def setRowColor(self, row):
         color = QtWidgets.QColorDialog.getColor()
+        if not color.isValid():
+            return
 
-        # Set new color in table
-        for i in range(self.table.columnCount()):
-            item = self.table.item(row, i)
-            item.setBackground(color)
-
-        block_name = self.table.item(row, 0).text()
-        block = self.current_schema.get_sequence_by_name(block_name)
-        block.color = (color.red(), color.green(), color.blue())
+        seq = self.model.itemAt(row)
+        before = (seq.name, seq.color)
+        seq.color = (color.red(), color.green(), color.blue())
+        self.history.record_sequence_edit(seq, before)
+        self.history.checkpoint()
         self.table.clearSelection()
 
     def contextMenuEvent(self, pos):
@@ -1,6 +1,207 @@
-from versionedobj import VersionedObject
+import contextlib
+import os
+import tempfile
+
+from versionedobj import VersionedObject, Serializer
+
+from binbuilder.block import Schema
+from binbuilder import binary_format
+from binbuilder.instrumentation import timed, result_len
+
+# Number of bytes read or written at a time by write_file and read_file,
+# between checks for cancellation and progress reports
+CHUNK_SIZE = 256 * 1024
+
+# Process umask, read once since it can only be read by changing it
+_umask = os.umask(0)
+os.umask(_umask)
 
 
 class SavedSchema(VersionedObject):
     version = "1.0"
     schema_data = None
+
+
+class Cancelled(Exception):
+    """
+    Raised by write_file and read_file when cancelled before completion
+    """
+    pass
+
+
+def _check_cancelled(cancel_event):
+    if (cancel_event is not None) and cancel_event.is_set():
+        raise Cancelled()
+
+
+def _data_len(result, data, *args, **kwargs):
+    return len(data)
+
+
+@timed("save_file.write_file", _data_len)
+def write_file(data, filename, progress=None, cancel_event=None):
+    """
+    Write data to a file. The data is written to a temporary file in the same
+    directory, which replaces the named file only once completely written, so
+    a failed or cancelled write never leaves a partially written file behind.
+
+    :param bytes data: data to write
+    :param str filename: name of file to write
+    :param progress: optional function called as progress(done, total) with\
+        the number of bytes written so far
+    :param threading.Event cancel_event: optional event, set to cancel writing
+
+    :raises Cancelled: if cancel_event was set before writing completed
+    """
+    data = memoryview(data)
+    _check_cancelled(cancel_event)
+
+    with replacing_file(filename) as fh:
+        for i in range(0, len(data), CHUNK_SIZE):
+            _check_cancelled(cancel_event)
+            fh.write(data[i:i + CHUNK_SIZE])
+            if progress is not None:
+                progress(min(i + CHUNK_SIZE, len(data)), len(data))
+
+
+@contextlib.contextmanager
+def replacing_file(filename):
+    """
+    Context manager opening a temporary file in the same directory as the
+    named file, for writing in binary mode. The temporary file replaces the
+    named file when the context exits normally, and is removed if it exits
+    with an exception, so the named file is never left partially written.
+
+    :param str filename: name of file to write
+
+    :return: context manager yielding the open temporary file
+    """
+    if os.path.exists(filename):
+        mode = os.stat(filename).st_mode & 0o7777
+    else:
+        mode = 0o666 & ~_umask
+
+    fd, tmp_filename = tempfile.mkstemp(prefix=".", suffix=".tmp",
+                                        dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            yield fh
+
+            fh.flush()
+            os.fsync(fh.fileno())
+
+        os.chmod(tmp_filename, mode)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
+
+        raise
+
+
+@timed("save_file.read_file", result_len)
+def read_file(filename, progress=None, cancel_event=None):
+    """
+    Read the contents of a file
+
+    :param str filename: name of file to read
+    :param progress: optional function called as progress(done, total) with\
+        the number of bytes read so far
+    :param threading.Event cancel_event: optional event, set to cancel reading
+
+    :raises Cancelled: if cancel_event was set before reading completed
+
+    :return: file contents
+    :rtype: bytes
+    """
+    total = os.path.getsize(filename)
+    chunks = []
+    done = 0
+
+    with open(filename, "rb") as fh:
+        while True:
+            _check_cancelled(cancel_event)
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            chunks.append(chunk)
+            done += len(chunk)
+            if progress is not None:
+                progress(done, total)
+
+    data = b"".join(chunks)
+    _check_cancelled(cancel_event)
+    return data
+
+
+def save_object(obj, filename, progress=None, cancel_event=None):
+    """
+    Save a VersionedObject instance to a JSON file, as for write_file
+
+    :param VersionedObject obj: object to save
+    :param str filename: name of file to write
+    :param progress: optional function called as progress(done, total)
+    :param threading.Event cancel_event: optional event, set to cancel saving
+    """
+    data = Serializer().to_json(obj).encode("utf-8")
+    write_file(data, filename, progress, cancel_event)
+
+
+def load_object(obj, filename, progress=None, cancel_event=None):
+    """
+    Populate a VersionedObject instance with data loaded from a JSON file,
+    as for read_file
+
+    :param VersionedObject obj: object to populate
+    :param str filename: name of file to load
+    :param progress: optional function called as progress(done, total)
+    :param threading.Event cancel_event: optional event, set to cancel loading
+    """
+    jsonstr = read_file(filename, progress, cancel_event).decode("utf-8")
+    Serializer().from_json(obj, jsonstr)
+
+
+@timed("save_file.save_schema")
+def save_schema(schema, filename, progress=None, cancel_event=None):
+    """
+    Save a schema to a file. Files with the binary_format.BINARY_EXTENSION
+    extension are written in the binary format, and all others as JSON.
+
+    :param Schema schema: schema to save
+    :param str filename: name of file to write
+    :param progress: optional function called as progress(done, total)
+    :param threading.Event cancel_event: optional event, set to cancel saving
+    """
+    if binary_format.is_binary_file(filename):
+        data = binary_format.encode_schema(schema, SavedSchema.version)
+        write_file(data, filename, progress, cancel_event)
+    else:
+        saved_schema = SavedSchema()
+        saved_schema.schema_data = schema
+        save_object(saved_schema, filename, progress, cancel_event)
+
+
+@timed("save_file.load_schema")
+def load_schema(filename, progress=None, cancel_event=None):
+    """
+    Load a schema from a file, in the format selected by its extension as
+    for save_schema
+
+    :param str filename: name of file to load
+    :param progress: optional function called as progress(done, total)
+    :param threading.Event cancel_event: optional event, set to cancel loading
+
+    :return: loaded schema
+    :rtype: Schema
+    """
+    if binary_format.is_binary_file(filename):
+        data = read_file(filename, progress, cancel_event)
+        return binary_format.decode_schema(data, SavedSchema.version)
+
+    loaded_schema = SavedSchema()
+    loaded_schema.schema_data = Schema("", [])
+    load_object(loaded_schema, filename, progress, cancel_event)
+    return loaded_schema.schema_data
@@ -1,12 +1,18 @@
 import os
 
-from versionedobj import VersionedObject, CustomValue, Serializer
+from versionedobj import VersionedObject, CustomValue
 from binbuilder.block import BlockSequence
-from binbuilder.utils import truncate_string
+from binbuilder.save_file import load_object, read_file
+from binbuilder.sequence_library import SequenceLibrary
+from binbuilder.table_models import LibraryTableModel
+from binbuilder import binary_format
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 
+LIBRARY_PATH = os.path.join(os.path.expanduser('~'), ".binbuilder_sequence_library")
+
+# Saved sequences file used before the library, imported into new libraries
 SAVE_FILE_PATH = os.path.join(os.path.expanduser('~'), ".binbuilder_saved_sequences")
 
 
@@ -32,74 +38,93 @@ class SavedSequenceList(VersionedObject):
     sequences = SequenceList()
 
 
-saved_sequence_list = SavedSequenceList()
-serializer = Serializer()
+def _load_sequence_list(filename):
+    if binary_format.is_binary_file(filename):
+        return binary_format.decode_sequences(read_file(filename), SavedSequenceList.version)
 
+    loaded = SavedSequenceList()
+    loaded.sequences = SequenceList()
+    load_object(loaded, filename)
+    return loaded.sequences.sequences
 
-def save_sequences(self):
-    serializer.to_file(saved_sequence_list, SAVE_FILE_PATH)
 
+_library = None
 
-def load_sequences(self):
-    if os.path.isfile(SAVE_FILE_PATH):
-        serializer.from_file(saved_sequence_list, SAVE_FILE_PATH)
 
+def get_library():
+    """
+    Get the saved sequence library, opening it on first use. A new library is
+    populated with any sequences from the old saved sequences file.
 
-def add_saved_sequence(seq):
-    for s in saved_sequence_list.sequences.sequences:
-        if s.name == seq.name:
-            return False
+    :return: saved sequence library
+    :rtype: SequenceLibrary
+    """
+    global _library
+
+    if _library is None:
+        is_new = not os.path.isfile(LIBRARY_PATH)
+        _library = SequenceLibrary(LIBRARY_PATH)
+
+        if is_new and os.path.isfile(SAVE_FILE_PATH):
+            _library.add_many(_load_sequence_list(SAVE_FILE_PATH))
 
-    saved_sequence_list.sequences.sequences.append(seq)
-    return True
+    return _library
+
+
+def add_saved_sequence(seq):
+    return get_library().add(seq)
 
 
 class SavedSequenceBrowserDialog(QtWidgets.QDialog):
+    """
+    Lists the sequences in the saved sequence library. Double-clicking a
+    sequence selects it and closes the dialog; only the selected sequence is
+    decoded from the library.
+    """
     def __init__(self, *args, **kwargs):
         super(SavedSequenceBrowserDialog, self).__init__(*args, **kwargs)
 
+        self.library = get_library()
+        self.selected = None
 
-        self.table = QtWidgets.QTableWidget()
+        self.model = LibraryTableModel(self.library, self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
         self.table.setDragEnabled(False)
         self.table.setAcceptDrops(False)
         self.table.viewport().setAcceptDrops(False)
         self.table.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
 
-        self.table.setColumnCount(2)
         self.table.setWordWrap(False)
-        self.table.setHorizontalHeaderLabels(['Sequence name', 'Sequence size'])
         self.table.verticalHeader().setVisible(False)
         self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
-        self.table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.doubleClicked.connect(self.onDoubleClick)
 
         self.mainLayout = QtWidgets.QVBoxLayout(self)
         self.mainLayout.addWidget(self.table)
 
         self.update()
 
-    def addRow(self, sequence):
-        nextFreeRow = self.table.rowCount()
-        self.table.insertRow(nextFreeRow)
-
-        item1 = QtWidgets.QTableWidgetItem(truncate_string(sequence.name))
-        item2 = QtWidgets.QTableWidgetItem(str(sequence.size_bytes()))
+    def onDoubleClick(self, signal):
+        self.selected = self.library.get(self.model.itemAt(signal.row()).name)
+        self.accept()
 
-        item2.setTextAlignment(QtCore.Qt.AlignVCenter)
-        item2.setTextAlignment(QtCore.Qt.AlignHCenter)
+    def removeItemByRow(self, row):
+        self.model.removeItemAt(row)
 
-        item1.setBackground(QtGui.QColor(*sequence.color))
-        item2.setBackground(QtGui.QColor(*sequence.color))
+    def contextMenuEvent(self, pos):
+        indexes = self.table.selectionModel().selection().indexes()
+        if not indexes:
+            return
 
-        self.table.setItem(nextFreeRow, 0, item1)
-        self.table.setItem(nextFreeRow, 1, item2)
+        row = indexes[0].row()
 
-    def populateTable(self):
-        self.table.setRowCount(0)
-        for seq in saved_sequence_list.sequences.sequences:
-            self.addRow(seq)
+        menu = QtWidgets.QMenu(self)
 
-    def update(self):
-        self.populateTable()
-        super(SavedSequenceBrowserDialog, self).update()
+        deleteAction = QtWidgets.QAction('Delete saved sequence', self)
+        deleteAction.triggered.connect(lambda: self.removeItemByRow(row))
+        menu.addAction(deleteAction)
 
+        menu.popup(QtGui.QCursor.pos())
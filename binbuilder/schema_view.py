@@ -0,0 +1,129 @@
+import mmap
+import struct
+
+from binbuilder.block import array_from_bytes, pack_array
+
+
+class SchemaView(object):
+    """
+    Memory-maps a binary file containing back-to-back instances of a schema,
+    and reads or writes single fields of one record in place. Only the bytes
+    of the accessed field are touched, regardless of the size of the file.
+
+    The field offsets are taken from the schema when the view is created;
+    changes made to the schema afterwards are not reflected in the view.
+    """
+    def __init__(self, schema, path, record_index=0, readonly=False):
+        layout = schema.layout()
+        end = ">" if schema.big_endian else "<"
+
+        self.record_size = layout.size_bytes
+        self.readonly = readonly
+        self.big_endian = schema.big_endian
+        self.fields = {}
+        for name in layout.field_names:
+            self.fields[name] = (layout.offsets[name], struct.Struct(end + layout.fmtstrings[name]), None)
+
+        # Fields of blocks with a count are read and written as lists
+        for i, datatype, count in layout.arrays:
+            name = layout.field_names[i]
+            offset, fieldstruct, _ = self.fields[name]
+            self.fields[name] = (offset, fieldstruct, (datatype, count))
+
+        self._fh = open(path, "rb" if readonly else "r+b")
+        try:
+            access = mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE
+            self._mmap = mmap.mmap(self._fh.fileno(), 0, access=access)
+        except Exception:
+            self._fh.close()
+            raise
+
+        self.num_records = len(self._mmap) // self.record_size if self.record_size else 0
+        self._base = 0
+
+        try:
+            self.record_index = record_index
+        except ValueError:
+            self.close()
+            raise
+
+    @property
+    def record_index(self):
+        return self._record_index
+
+    @record_index.setter
+    def record_index(self, record_index):
+        if (record_index < 0) or (record_index >= self.num_records):
+            raise ValueError(f"Record index {record_index} out of range, file contains "
+                             f"{self.num_records} records")
+
+        self._record_index = record_index
+        self._base = record_index * self.record_size
+
+    def _field(self, name):
+        if name not in self.fields:
+            raise ValueError(f"No such field '{name}'")
+
+        return self.fields[name]
+
+    def get(self, name):
+        """
+        Read a single field of the current record
+
+        :param str name: field name, '<sequence varname>.<block varname>'
+
+        :return: field value, or list of values for a block with a count
+        """
+        offset, fieldstruct, array = self._field(name)
+        value = fieldstruct.unpack_from(self._mmap, self._base + offset)[0]
+        if array is not None:
+            value = array_from_bytes(array[0], value, self.big_endian).tolist()
+
+        return value
+
+    def set(self, name, value):
+        """
+        Write a single field of the current record in place
+
+        :param str name: field name, '<sequence varname>.<block varname>'
+        :param value: new field value, or list of values for a block with a count
+        """
+        if self.readonly:
+            raise ValueError("Cannot write to a read-only view")
+
+        offset, fieldstruct, array = self._field(name)
+        if array is not None:
+            datatype, count = array
+            value = pack_array(name, datatype, count, value, self.big_endian)
+
+        try:
+            data = fieldstruct.pack(value)
+        except struct.error as e:
+            raise ValueError(f"Invalid value for field '{name}': {e}")
+
+        pos = self._base + offset
+        self._mmap[pos:pos + fieldstruct.size] = data
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __setitem__(self, name, value):
+        self.set(name, value)
+
+    def flush(self):
+        if not self.readonly:
+            self._mmap.flush()
+
+    def close(self):
+        if self._mmap.closed:
+            return
+
+        self.flush()
+        self._mmap.close()
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
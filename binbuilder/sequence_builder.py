@@ -1,11 +1,10 @@
 from PyQt5.QtCore import Qt
 from PyQt5 import QtWidgets, QtCore, QtGui
 
-from binbuilder.saved_sequence_browser import add_saved_sequence
-from binbuilder.dragdrop_table_widget import DragDropTableWidget
-from binbuilder.block_builder import BlockBuilderDialog
-from binbuilder.utils import truncate_string, ScrollableTextDisplay, errorDialog, ICON_PATH
-from binbuilder.block import Block, CodeWriter
+from binbuilder.dragdrop_table_widget import DragDropTableView
+from binbuilder.table_models import SequenceTableModel
+from binbuilder.utils import ScrollableTextDisplay, errorDialog, ICON_PATH
+from binbuilder.block import Block, SequenceRef, CodeWriter
 
 
 class SequenceBuilderDialog(QtWidgets.QDialog):
@@ -14,6 +13,7 @@ class SequenceBuilderDialog(QtWidgets.QDialog):
 
         self.parent = parent
         self.sequence = sequence
+        self.history = parent.history
         self.mainLayout = QtWidgets.QVBoxLayout(self)
         self.buttonLayout = QtWidgets.QHBoxLayout()
         self.tableLayout = QtWidgets.QHBoxLayout()
@@ -54,13 +54,14 @@ class SequenceBuilderDialog(QtWidgets.QDialog):
 
 
         # Build table
-        self.table = DragDropTableWidget()
-        self.table.setColumnCount(4)
+        self.model = SequenceTableModel(self.sequence, self.history, self)
+        self.finished.connect(self.onFinished)
+        self.table = DragDropTableView()
+        self.table.setModel(self.model)
         self.table.setWordWrap(False)
-        self.table.setHorizontalHeaderLabels(['Name', 'Type', 'Size', 'Value'])
         self.table.verticalHeader().setVisible(False)
         self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
-        self.table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.table.doubleClicked.connect(self.onDoubleClick)
         self.tableLayout.addWidget(self.table)
 
@@ -72,11 +73,18 @@ class SequenceBuilderDialog(QtWidgets.QDialog):
         self.setWindowTitle(f"Data item sequence '{self.sequence.name}'")
         self.setWindowIcon(QtGui.QIcon(ICON_PATH))
 
+        self.undoShortcut = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+z"), self)
+        self.undoShortcut.activated.connect(self.undo)
+        self.redoShortcut = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+y"), self)
+        self.redoShortcut.activated.connect(self.redo)
+
+        # Undo and redo in this dialog only apply to edits made in it
+        self.history.begin_session()
+
         self.update()
 
     def removeItemByRow(self, row):
-        block_name = self.table.item(row, 0).text()
-        self.sequence.remove_block_by_name(block_name)
+        self.model.removeItemAt(row)
         self.update()
 
     def removeButtonClicked(self):
@@ -85,7 +93,7 @@ class SequenceBuilderDialog(QtWidgets.QDialog):
             errorDialog(self, message="No data item is selected")
             return
 
-        seld.removeItemByRow(rows[0].row())
+        self.removeItemByRow(rows[0].row())
 
     def editButtonClicked(self):
         rows = self.table.selectionModel().selectedRows()
@@ -96,24 +104,36 @@ class SequenceBuilderDialog(QtWidgets.QDialog):
         self.editItemByRow(rows[0].row())
 
     def closeEvent(self, event):
-        self.sequence.set_name(self.nameInput.text())
+        self.setSequenceName()
+
+    def onFinished(self, result):
+        self.model.observe(None)
+        self.history.end_session()
 
-    def reorder_sequence_by_table(self):
-        names = []
-        for i in range(self.table.rowCount()):
-            names.append(self.table.item(i, 0).text())
+    def setSequenceName(self):
+        name = self.nameInput.text()
+        if name != self.sequence.name:
+            before = (self.sequence.name, self.sequence.color)
+            self.sequence.set_name(name)
+            self.history.record_sequence_edit(self.sequence, before)
 
-        self.sequence.reorder_by_names(names)
+    def undo(self):
+        if self.history.undo():
+            self.nameInput.setText(self.sequence.name)
+            self.update()
+
+    def redo(self):
+        if self.history.redo():
+            self.nameInput.setText(self.sequence.name)
+            self.update()
 
     def cCodeButtonClicked(self):
-        self.reorder_sequence_by_table()
         writer = CodeWriter()
         dialog = ScrollableTextDisplay(f"C code for '{self.sequence.name}'",
                                        writer.generate_c_string(self.sequence))
         dialog.exec_()
 
     def structFmtButtonClicked(self):
-        self.reorder_sequence_by_table()
         writer = CodeWriter()
         dialog = ScrollableTextDisplay(f"python struct format string for '{self.sequence.name}'",
                                        writer.generate_pystruct_fmtstring(self.sequence))
@@ -144,45 +164,18 @@ class SequenceBuilderDialog(QtWidgets.QDialog):
 
     def setRowColor(self, row):
         color = QtWidgets.QColorDialog.getColor()
+        if not color.isValid():
+            return
 
-        # Set new color in table
-        for i in range(self.table.columnCount()):
-            item = self.table.item(row, i)
-            item.setBackground(color)
-
-        block_name = self.table.item(row, 0).text()
-        block = self.sequence.get_block_by_name(block_name)
+        block = self.sequence.get_block(row)
+        before = block.copy()
         block.color = (color.red(), color.green(), color.blue())
+        self.history.record_block_edit(self.sequence, row, before)
         self.table.clearSelection()
 
-    def addRow(self, block):
-        nextFreeRow = self.table.rowCount()
-        self.table.insertRow(nextFreeRow)
-
-        item1 = QtWidgets.QTableWidgetItem(truncate_string(block.name))
-        item2 = QtWidgets.QTableWidgetItem(block.typeinfo.name)
-        item3 = QtWidgets.QTableWidgetItem(f"{block.size_bytes():,}")
-        item4 = QtWidgets.QTableWidgetItem(truncate_string(block.value_string()))
-
-        item3.setTextAlignment(Qt.AlignHCenter)
-        item3.setTextAlignment(Qt.AlignVCenter)
-
-        item1.setBackground(QtGui.QColor(*block.color))
-        item2.setBackground(QtGui.QColor(*block.color))
-        item3.setBackground(QtGui.QColor(*block.color))
-        item4.setBackground(QtGui.QColor(*block.color))
-
-        self.table.setItem(nextFreeRow, 0, item1)
-        self.table.setItem(nextFreeRow, 1, item2)
-        self.table.setItem(nextFreeRow, 2, item3)
-        self.table.setItem(nextFreeRow, 3, item4)
-
-    def populateTable(self):
-        self.table.setRowCount(0)
-        for block in self.sequence.blocklist:
-            self.addRow(block)
-
     def newButtonClicked(self):
+        from binbuilder.block_builder import BlockBuilderDialog
+
         new = Block(name=f"Block {len(self.sequence.blocklist)}")
         success = False
 
@@ -192,7 +185,7 @@ class SequenceBuilderDialog(QtWidgets.QDialog):
             dialog.exec_()
 
             try:
-                self.sequence.add_block(new)
+                self.model.appendItem(new)
             except ValueError as e:
                 errorDialog(self, message=str(e))
             else:
@@ -201,25 +194,35 @@ class SequenceBuilderDialog(QtWidgets.QDialog):
         self.update()
 
     def saveButtonClicked(self):
-        self.sequence.set_name(self.nameInput.text())
-        self.reorder_sequence_by_table()
+        from binbuilder.saved_sequence_browser import add_saved_sequence
+
+        self.setSequenceName()
         saved_sequence = self.sequence.copy()
         success = add_saved_sequence(saved_sequence)
         if not success:
             errorDialog(self, message="You already have a saved sequence with this name")
 
     def update(self):
-        self.populateTable()
         self.sizeLabel.setText(f"Total size: {self.sequence.size_bytes()} bytes")
-        self.reorder_sequence_by_table()
         super(SequenceBuilderDialog, self).update()
 
     def editItemByRow(self, row):
-        block_name = self.table.item(row, 0).text()
-        block = self.sequence.get_block_by_name(block_name)
+        from binbuilder.block_builder import BlockBuilderDialog
+
+        if isinstance(self.model.itemAt(row), SequenceRef):
+            errorDialog(self, message="References to other sequences are changed by editing "
+                                      "the referenced sequence")
+            return
+
+        block = self.sequence.get_block(row)
+        before = block.copy()
         dialog = BlockBuilderDialog(self, block)
         dialog.setWindowModality(QtCore.Qt.ApplicationModal)
         dialog.exec_()
+
+        if block.to_dict() != before.to_dict():
+            self.history.record_block_edit(self.sequence, row, before)
+
         self.update()
 
     def onDoubleClick(self, signal):
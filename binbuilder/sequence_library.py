@@ -0,0 +1,135 @@
+import collections
+import sqlite3
+
+from binbuilder import binary_format
+from binbuilder.instrumentation import timed
+
+# Version of the library database layout, stored as the SQLite user_version
+LIBRARY_VERSION = 1
+
+# Version string stored with each encoded sequence, as for SavedSequenceList.version
+SEQUENCE_VERSION = "1.0"
+
+# Metadata for one sequence in a library, available without decoding its blocks
+LibraryEntry = collections.namedtuple("LibraryEntry", ["name", "size_bytes", "color", "num_blocks"])
+
+
+class SequenceLibrary(object):
+    """
+    Persistent library of saved sequences, stored in an SQLite database.
+
+    Sequences are indexed by name, and their size, colour and number of
+    blocks are stored alongside, so the library can be listed without
+    decoding any blocks. The blocks of a sequence are stored in the binary
+    save format, and only decoded when the sequence is requested with get.
+    Adding or removing a sequence updates a single row.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0:
+            with self.db:
+                self.db.execute("CREATE TABLE IF NOT EXISTS sequences ("
+                                "name TEXT PRIMARY KEY, size_bytes INTEGER, red INTEGER, "
+                                "green INTEGER, blue INTEGER, num_blocks INTEGER, data BLOB)")
+                self.db.execute(f"PRAGMA user_version = {LIBRARY_VERSION}")
+        elif version != LIBRARY_VERSION:
+            self.db.close()
+            raise ValueError(f"Unsupported sequence library version {version}")
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM sequences").fetchone()[0]
+
+    def __contains__(self, name):
+        row = self.db.execute("SELECT 1 FROM sequences WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    def _row(self, sequence):
+        data = binary_format.encode_sequences([sequence], SEQUENCE_VERSION)
+        return (sequence.name, sequence.size_bytes(), *sequence.color, len(sequence.blocklist), data)
+
+    @timed("SequenceLibrary.add")
+    def add(self, sequence):
+        """
+        Add a sequence to the library, unless it already has a sequence with
+        the same name
+
+        :param BlockSequence sequence: sequence to add
+
+        :return: False if the library already has a sequence with the same name
+        :rtype: bool
+        """
+        with self.db:
+            cursor = self.db.execute("INSERT OR IGNORE INTO sequences VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     self._row(sequence))
+
+        return cursor.rowcount == 1
+
+    @timed("SequenceLibrary.add_many")
+    def add_many(self, sequences):
+        """
+        Add multiple sequences to the library in a single transaction,
+        skipping any whose names are already in the library
+
+        :param list sequences: list of BlockSequence objects to add
+
+        :return: number of sequences added
+        :rtype: int
+        """
+        with self.db:
+            cursor = self.db.executemany("INSERT OR IGNORE INTO sequences VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                         [self._row(s) for s in sequences])
+
+        return cursor.rowcount
+
+    @timed("SequenceLibrary.remove")
+    def remove(self, name):
+        """
+        Remove a sequence from the library
+
+        :param str name: name of sequence to remove
+
+        :raises ValueError: if the library has no sequence with the given name
+        """
+        with self.db:
+            cursor = self.db.execute("DELETE FROM sequences WHERE name = ?", (name,))
+
+        if cursor.rowcount == 0:
+            raise ValueError(f"No such sequence name '{name}'")
+
+    @timed("SequenceLibrary.entries")
+    def entries(self):
+        """
+        List the sequences in the library, in the order they were added,
+        without decoding their blocks
+
+        :return: list of LibraryEntry objects
+        :rtype: list
+        """
+        rows = self.db.execute("SELECT name, size_bytes, red, green, blue, num_blocks "
+                               "FROM sequences ORDER BY rowid")
+
+        return [LibraryEntry(name, size, (r, g, b), num_blocks) for name, size, r, g, b, num_blocks in rows]
+
+    @timed("SequenceLibrary.get")
+    def get(self, name):
+        """
+        Decode a sequence from the library
+
+        :param str name: name of sequence to get
+
+        :raises ValueError: if the library has no sequence with the given name
+
+        :return: decoded sequence
+        :rtype: BlockSequence
+        """
+        row = self.db.execute("SELECT data FROM sequences WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ValueError(f"No such sequence name '{name}'")
+
+        return binary_format.decode_sequences(row[0], SEQUENCE_VERSION)[0]
@@ -0,0 +1,286 @@
+from PyQt5 import QtCore, QtGui
+
+from binbuilder.block import Change, SequenceRef
+from binbuilder.instrumentation import timed
+from binbuilder.utils import truncate_string
+
+
+class ListTableModel(QtCore.QAbstractTableModel):
+    """
+    Table model showing one row per item of a list (the sequences of a schema,
+    or the blocks of a sequence). Cells are rendered on demand from the
+    underlying objects, so no per-cell items are created or kept.
+
+    The model observes the object owning the list, and updates views only for
+    the rows touched by each change, however the change was made.
+    """
+    headers = []
+
+    def __init__(self, history, parent=None):
+        super(ListTableModel, self).__init__(parent)
+        self.history = history
+        self.observed = None
+        self._colors = {}
+        self._moving = False
+
+    @timed("ListTableModel.observe")
+    def observe(self, obj):
+        """
+        Show the items of a different object, or nothing if None
+
+        :param obj: Schema or BlockSequence to show, or None
+        """
+        self.beginResetModel()
+        if self.observed is not None:
+            self.observed.remove_observer(self.onChange)
+
+        self.observed = obj
+        if obj is not None:
+            obj.add_observer(self.onChange)
+
+        self.endResetModel()
+
+    @timed("ListTableModel.onChange")
+    def onChange(self, event, index):
+        # Changes are reported after they are made, so each begin/end pair
+        # below is emitted together, only to tell views which rows changed
+        root = QtCore.QModelIndex()
+
+        if event == Change.INSERTED:
+            self.beginInsertRows(root, index, index)
+            self.endInsertRows()
+        elif event == Change.REMOVED:
+            self.beginRemoveRows(root, index, index)
+            self.endRemoveRows()
+        elif event == Change.CHANGED:
+            if index is not None:
+                self.rowChanged(index)
+        elif (event == Change.REORDERED) and self._moving:
+            # Already reported by moveRows
+            pass
+        else:
+            self.refresh()
+
+    def items(self):
+        if self.observed is None:
+            return []
+
+        return self.itemsOf(self.observed)
+
+    def itemsOf(self, obj):
+        raise NotImplementedError()
+
+    def columnText(self, item, column):
+        raise NotImplementedError()
+
+    def moveItems(self, src, count, dst):
+        raise NotImplementedError()
+
+    def appendItem(self, item):
+        raise NotImplementedError()
+
+    def removeItem(self, item):
+        raise NotImplementedError()
+
+    def itemAt(self, row):
+        return self.items()[row]
+
+    def qcolor(self, color):
+        # Colour tuples are interned, so few distinct QColors are ever needed
+        qcolor = self._colors.get(color)
+        if qcolor is None:
+            qcolor = QtGui.QColor(*color)
+            self._colors[color] = qcolor
+
+        return qcolor
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.items())
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if (role == QtCore.Qt.DisplayRole) and (orientation == QtCore.Qt.Horizontal):
+            return self.headers[section]
+
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        item = self.items()[index.row()]
+
+        if role == QtCore.Qt.DisplayRole:
+            return self.columnText(item, index.column())
+        elif role == QtCore.Qt.ToolTipRole:
+            return item.name
+        elif role == QtCore.Qt.BackgroundRole:
+            return self.qcolor(item.color)
+
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.ItemIsDropEnabled
+
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled
+
+    def supportedDropActions(self):
+        return QtCore.Qt.MoveAction
+
+    def moveRows(self, sourceParent, sourceRow, count, destinationParent, destinationChild):
+        if (count <= 0) or sourceParent.isValid() or destinationParent.isValid():
+            return False
+
+        if not self.beginMoveRows(sourceParent, sourceRow, sourceRow + count - 1,
+                                  destinationParent, destinationChild):
+            return False
+
+        # Position of the first moved row once the rows are removed
+        if destinationChild > sourceRow:
+            destinationChild -= count
+
+        self._moving = True
+        try:
+            self.moveItems(sourceRow, count, destinationChild)
+        finally:
+            self._moving = False
+
+        self.endMoveRows()
+        return True
+
+    def removeItemAt(self, row):
+        self.removeItem(self.itemAt(row))
+
+    def rowChanged(self, row):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    @timed("ListTableModel.refresh")
+    def refresh(self):
+        self.beginResetModel()
+        self.endResetModel()
+
+
+class SchemaTableModel(ListTableModel):
+    """
+    Table model with one row per sequence in a schema
+    """
+    headers = ['Name', 'Size']
+
+    def __init__(self, schema, history, parent=None):
+        super(SchemaTableModel, self).__init__(history, parent)
+        self.observe(schema)
+
+    def itemsOf(self, schema):
+        return schema.sequencelist
+
+    def columnText(self, sequence, column):
+        if column == 0:
+            return truncate_string(sequence.name)
+
+        return str(sequence.size_bytes())
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if (role == QtCore.Qt.TextAlignmentRole) and (index.column() == 1):
+            return QtCore.Qt.AlignCenter
+
+        return super(SchemaTableModel, self).data(index, role)
+
+    def moveItems(self, src, count, dst):
+        self.history.move_sequences(self.observed, src, count, dst)
+
+    def appendItem(self, sequence):
+        self.history.add_sequence(self.observed, sequence)
+
+    def removeItem(self, sequence):
+        self.history.remove_sequence(self.observed, sequence.name)
+
+
+class SequenceTableModel(ListTableModel):
+    """
+    Table model with one row per block in a sequence
+    """
+    headers = ['Name', 'Type', 'Size', 'Value']
+
+    def __init__(self, sequence, history, parent=None):
+        super(SequenceTableModel, self).__init__(history, parent)
+        self.observe(sequence)
+
+    def itemsOf(self, sequence):
+        return sequence.blocklist
+
+    def columnText(self, block, column):
+        if column == 0:
+            return truncate_string(block.name)
+        elif column == 1:
+            if isinstance(block, SequenceRef):
+                return "sequence" if block.count is None else f"sequence [{block.count:,}]"
+            elif block.count is not None:
+                return f"{block.typeinfo.name} [{block.count:,}]"
+
+            return block.typeinfo.name
+        elif column == 2:
+            return f"{block.size_bytes():,}"
+
+        return truncate_string(block.value_string())
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if (role == QtCore.Qt.TextAlignmentRole) and (index.column() == 2):
+            return QtCore.Qt.AlignCenter
+
+        return super(SequenceTableModel, self).data(index, role)
+
+    def moveItems(self, src, count, dst):
+        self.history.move_blocks(self.observed, src, count, dst)
+
+    def appendItem(self, block):
+        self.history.add_block(self.observed, block)
+
+    def removeItemAt(self, row):
+        # Blocks are removed by position, since names may have a varname
+        # prefix or resolve to another block with the same varname
+        self.history.remove_block_at(self.observed, row)
+
+
+class LibraryTableModel(ListTableModel):
+    """
+    Table model with one row per sequence in a saved sequence library, built
+    from the library metadata without decoding any sequences
+    """
+    headers = ['Sequence name', 'Sequence size']
+
+    def __init__(self, library, parent=None):
+        super(LibraryTableModel, self).__init__(None, parent)
+        self.library = library
+        self.entries = library.entries()
+
+    def items(self):
+        return self.entries
+
+    def columnText(self, entry, column):
+        if column == 0:
+            return truncate_string(entry.name)
+
+        return str(entry.size_bytes)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if (role == QtCore.Qt.TextAlignmentRole) and (index.column() == 1):
+            return QtCore.Qt.AlignCenter
+
+        return super(LibraryTableModel, self).data(index, role)
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+    def removeItem(self, entry):
+        row = self.entries.index(entry)
+        self.library.remove(entry.name)
+
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self.entries[row]
+        self.endRemoveRows()
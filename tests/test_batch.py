@@ -0,0 +1,27 @@
+import pytest
+
+from binbuilder.batch import convert_table
+from binbuilder.block import Block, BlockSequence, Schema, DataType
+
+
+def make_schema():
+    return Schema("s", [BlockSequence("a", [Block(DataType.UINT_1B, "f", 1), Block(DataType.UINT_1B, "g", 2)]),
+                        BlockSequence("b", [Block(DataType.UINT_1B, "g", 3)])])
+
+
+def test_columns_by_full_and_unique_short_name(tmp_path):
+    (tmp_path / "t.csv").write_text("f,a.g,b.g\n7,8,\n")
+    assert convert_table(make_schema(), str(tmp_path / "t.csv"), str(tmp_path / "out.bin"), max_workers=1) == 1
+    assert (tmp_path / "out.bin").read_bytes() == b"\x07\x08\x03"
+
+
+@pytest.mark.parametrize("header", ["f,bogus", "A.f", "g"])
+def test_unmatched_columns_are_rejected(tmp_path, header):
+    (tmp_path / "t.csv").write_text(header + "\n" + ",".join(["1"] * len(header.split(","))) + "\n")
+    (tmp_path / "out.bin").write_bytes(b"old")
+
+    with pytest.raises(ValueError) as e:
+        convert_table(make_schema(), str(tmp_path / "t.csv"), str(tmp_path / "out.bin"), max_workers=1)
+
+    assert header.split(",")[-1] in str(e.value)
+    assert (tmp_path / "out.bin").read_bytes() == b"old"
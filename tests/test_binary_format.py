@@ -0,0 +1,65 @@
+import struct
+
+import pytest
+
+from binbuilder import binary_format
+from binbuilder.block import Block, BlockSequence, Schema, SequenceRef, DataType
+from binbuilder.save_file import SavedSchema
+
+
+VERSION = SavedSchema.version
+
+
+def make_schema():
+    point = BlockSequence("point", [Block(DataType.INT_2B, "x", 1), Block(DataType.BYTES, "raw", b"ab", 2)])
+    frame = BlockSequence("frame", [Block(DataType.UINT_4B, "ids", 3, count=3), SequenceRef(point, "points", count=2),
+                                    Block(DataType.DOUBLE, "scale", 1.5)])
+    return Schema("s", [point, frame])
+
+
+def schema_header_offset(data):
+    # Offset of the schema header section, after the version, strings and colours
+    reader = binary_format._Reader(data, binary_format._HEADER.size)
+    for _ in range(3):
+        reader.section()
+
+    return reader.offset + binary_format._SECTION_LENGTH.size
+
+
+def test_round_trip():
+    schema = make_schema()
+    decoded = binary_format.decode_schema(binary_format.encode_schema(schema, VERSION), VERSION)
+
+    assert decoded.name == schema.name
+    assert decoded.emit_data() == schema.emit_data()
+
+
+def test_truncated_file_raises_value_error():
+    data = binary_format.encode_schema(make_schema(), VERSION)
+
+    for length in range(len(data)):
+        with pytest.raises(ValueError):
+            binary_format.decode_schema(data[:length], VERSION)
+
+
+def test_bad_schema_name_index_raises_value_error():
+    data = bytearray(binary_format.encode_schema(make_schema(), VERSION))
+    struct.pack_into("<I", data, schema_header_offset(data), 0xffff)
+
+    with pytest.raises(ValueError):
+        binary_format.decode_schema(bytes(data), VERSION)
+
+
+def test_array_flag_on_bytes_block_raises_value_error():
+    schema = Schema("s", [BlockSequence("a", [Block(DataType.BYTES, "raw", b"abcd", 4)])])
+    data = bytearray(binary_format.encode_schema(schema, VERSION))
+
+    # The data type is the first field of the only block record
+    reader = binary_format._Reader(data, binary_format._HEADER.size)
+    for _ in range(5):
+        reader.section()
+
+    data[reader.offset + binary_format._SECTION_LENGTH.size] |= binary_format.ARRAY_FLAG
+
+    with pytest.raises(ValueError):
+        binary_format.decode_schema(bytes(data), VERSION)
@@ -0,0 +1,47 @@
+import array
+import json
+
+from binbuilder import cli
+from binbuilder.block import Block, BlockSequence, Schema, SequenceRef, DataType
+from binbuilder.save_file import save_schema
+
+
+def make_schema():
+    point = BlockSequence("point", [Block(DataType.INT_2B, "x", -1), Block(DataType.UINT_1B, "y", 2)])
+    return Schema("s", [point, BlockSequence("frame", [
+        Block(DataType.UINT_2B, "table", [1, 2, 3], count=3),
+        Block(DataType.BYTES, "raw", b"\x00\xff", 2),
+        SequenceRef(point, "points", count=2),
+        Block(DataType.FLOAT, "scale", 1.5),
+    ])])
+
+
+def test_decode_gives_lists_for_arrays(tmp_path, capsys):
+    schema = make_schema()
+    save_schema(schema, str(tmp_path / "s.bschemab"))
+    (tmp_path / "data.bin").write_bytes(schema.emit_data())
+
+    assert cli.main(["decode", str(tmp_path / "s.bschemab"), str(tmp_path / "data.bin")]) == 0
+    record = json.loads(capsys.readouterr().out)
+
+    assert record["frame.table"] == [1, 2, 3]
+    assert record["frame.raw"] == "00ff"
+
+
+def test_decode_output_converts_back_to_same_data(tmp_path, capsys):
+    schema = make_schema()
+    schema_file = str(tmp_path / "s.bschemab")
+    save_schema(schema, schema_file)
+
+    records = [schema.values()]
+    schema.sequencelist[1].get_block_by_name("table").value = array.array("H", [7, 8, 65535])
+    records.append(schema.values())
+    data = schema.compile().pack_many(records)
+    (tmp_path / "data.bin").write_bytes(data)
+
+    assert cli.main(["decode", schema_file, str(tmp_path / "data.bin")]) == 0
+    (tmp_path / "table.jsonl").write_text(capsys.readouterr().out)
+
+    assert cli.main(["convert", schema_file, str(tmp_path / "table.jsonl"), "-o", str(tmp_path / "out.bin"),
+                     "-j", "1"]) == 0
+    assert (tmp_path / "out.bin").read_bytes() == data
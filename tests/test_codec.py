@@ -0,0 +1,31 @@
+import collections
+
+from binbuilder.block import Block, BlockSequence, Schema, DataType, Codec
+
+
+def make_schema():
+    return Schema("s", [BlockSequence("a", [Block(DataType.UINT_2B, "b", 7), Block(DataType.DOUBLE, "c", 1.5)])])
+
+
+def test_dict_records_match_value_records():
+    codec = make_schema().compile()
+    values = [3, 2.5]
+    record = dict(zip(codec.field_names, values))
+
+    assert codec.pack_dict(record) == codec.pack(values)
+    assert codec.unpack_dict(codec.pack(values)) == record
+
+
+def test_pack_many_accepts_dict_subclasses():
+    codec = make_schema().compile()
+    record = collections.OrderedDict([("a.c", 2.5), ("a.b", 3)])
+
+    assert codec.pack_many([record, [3, 2.5]]) == codec.pack([3, 2.5]) * 2
+
+
+def test_single_and_no_field_codecs():
+    codec = Codec("I", ["a.b"], big_endian=False)
+    assert codec.pack_dict({"a.b": 1}) == b"\x01\x00\x00\x00"
+    assert codec.pack_many([{"a.b": 1}]) == bytearray(b"\x01\x00\x00\x00")
+
+    assert Codec("", []).pack_dict({}) == b""
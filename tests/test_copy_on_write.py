@@ -0,0 +1,40 @@
+import pytest
+
+from binbuilder.block import Block, BlockSequence, Schema, DataType
+
+
+def make_sequence():
+    return BlockSequence("s", [Block(DataType.UINT_2B, "table", [1, 2, 3], count=3), Block(name="n")])
+
+
+def test_array_values_cannot_be_changed_in_place():
+    sequence = make_sequence()
+    copy = sequence.copy()
+
+    with pytest.raises(TypeError):
+        sequence.blocklist[0].value[0] = 77
+
+    sequence.get_block_by_name("table").value = [77, 2, 3]
+    assert sequence.blocklist[0].value == (77, 2, 3)
+    assert copy.blocklist[0].value == (1, 2, 3)
+
+
+def test_block_copies_do_not_share_arrays():
+    block = Block(DataType.UINT_2B, "table", [1, 2, 3], count=3)
+    values = block._value
+    copy = block.copy()
+
+    assert copy.value == block.value
+    assert copy._value is not values
+
+
+def test_sequence_list_is_read_only():
+    schema = Schema("x", [make_sequence()])
+
+    assert not hasattr(schema.sequencelist, "append")
+    with pytest.raises(TypeError):
+        schema.sequencelist[0] = make_sequence()
+
+    sequences = schema.sequencelist
+    schema.reorder_by_names(["s"])
+    assert list(sequences) == list(schema.sequencelist)
@@ -0,0 +1,52 @@
+import pytest
+
+from binbuilder.block import Block, BlockSequence, Schema, EditHistory
+
+
+def names(items):
+    return [i.name for i in items]
+
+
+def test_move_blocks_undo_redo():
+    sequence = BlockSequence("s", [Block(name=n) for n in "abcde"])
+    history = EditHistory()
+
+    history.move_blocks(sequence, 1, 2, 3)
+    assert names(sequence.blocklist) == list("adebc")
+    history.move_blocks(sequence, 4, 1, 0)
+    assert names(sequence.blocklist) == list("cadeb")
+
+    history.undo()
+    history.undo()
+    assert names(sequence.blocklist) == list("abcde")
+
+    history.redo()
+    assert names(sequence.blocklist) == list("adebc")
+
+
+def test_move_out_of_range_is_rejected():
+    sequence = BlockSequence("s", [Block(name=n) for n in "abc"])
+
+    with pytest.raises(ValueError):
+        sequence.move_blocks(2, 2, 0)
+
+    with pytest.raises(ValueError):
+        sequence.move_blocks(0, 1, 3)
+
+
+def test_reorder_sequences_undo_after_later_edits():
+    schema = Schema("x", [BlockSequence(n) for n in ["a", "b", "c"]])
+    history = EditHistory()
+
+    history.reorder_sequences(schema, ["c", "a", "b"])
+    history.add_sequence(schema, BlockSequence("d"))
+    history.move_sequences(schema, 3, 1, 0)
+    assert names(schema.sequencelist) == ["d", "c", "a", "b"]
+
+    history.undo()
+    history.undo()
+    history.undo()
+    assert names(schema.sequencelist) == ["a", "b", "c"]
+
+    history.redo()
+    assert names(schema.sequencelist) == ["c", "a", "b"]
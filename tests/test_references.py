@@ -0,0 +1,29 @@
+from binbuilder import binary_format
+from binbuilder.block import Block, BlockSequence, Schema, SequenceRef, DataType
+from binbuilder.save_file import SavedSchema
+
+
+def make_schema():
+    point = BlockSequence("point", [Block(DataType.INT_2B, "x", 1), Block(DataType.INT_2B, "y", 2)])
+    frame = BlockSequence("frame", [Block(DataType.UINT_4B, "id", 7), SequenceRef(point, "points", count=3)])
+    return Schema("s", [point, frame])
+
+
+def test_copy_links_references_to_copied_sequences():
+    schema = make_schema()
+    copy = schema.copy()
+    point, frame = copy.sequencelist
+
+    assert point is not schema.sequencelist[0]
+    assert frame.blocklist[1].sequence is point
+
+    point.get_block_by_name("x").value = 5
+    assert copy.size_bytes() == schema.size_bytes()
+    assert schema.sequencelist[1].emit_data(False) != frame.emit_data(False)
+
+
+def test_copy_keeps_references_linked_after_encode_and_decode():
+    data = binary_format.encode_schema(make_schema().copy(), SavedSchema.version)
+    point, frame = binary_format.decode_schema(data, SavedSchema.version).sequencelist
+
+    assert frame.blocklist[1].sequence is point
@@ -0,0 +1,29 @@
+import pytest
+
+from binbuilder.block import Block, BlockSequence, Schema, DataType
+
+
+def make_schema():
+    return Schema("s", [BlockSequence("a", [Block(DataType.UINT_1B, "n", 1),
+                                            Block(DataType.INT_4B, "t", [1, 2], count=2)])])
+
+
+def test_emit_many_and_iter_records_use_lists_for_arrays():
+    schema = make_schema()
+    data = schema.emit_many([[5, [-1, 7]], {"a.n": 6, "a.t": (3, 4)}])
+
+    assert bytes(data[:9]) == b"\x05\xff\xff\xff\xff\x00\x00\x00\x07"
+    assert list(schema.iter_records(data)) == [(5, [-1, 7]), (6, [3, 4])]
+
+
+def test_emit_many_rejects_wrong_number_of_array_values():
+    with pytest.raises(ValueError):
+        make_schema().emit_many([[5, [1, 2, 3]]])
+
+
+def test_iter_records_rejects_zero_size_and_zero_stride():
+    with pytest.raises(ValueError):
+        list(Schema("empty", [BlockSequence("a", [])]).iter_records(b"\x00" * 4))
+
+    with pytest.raises(ValueError):
+        list(make_schema().iter_records(b"\x00" * 18, stride=0))
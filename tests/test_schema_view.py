@@ -0,0 +1,55 @@
+import pytest
+
+from binbuilder.block import Block, BlockSequence, Schema, DataType
+from binbuilder.schema_view import SchemaView
+
+
+def make_file(tmp_path):
+    schema = Schema("s", [BlockSequence("a", [Block(DataType.UINT_2B, "b", 7), Block(DataType.UINT_4B, "c", 9)])])
+    path = tmp_path / "records.bin"
+    path.write_bytes(schema.emit_data() * 2)
+    return schema, path
+
+
+def test_set_writes_field_in_place(tmp_path):
+    schema, path = make_file(tmp_path)
+
+    with SchemaView(schema, path, record_index=1) as view:
+        view["a.c"] = 12
+
+    with SchemaView(schema, path, readonly=True) as view:
+        assert view["a.c"] == 9
+        view.record_index = 1
+        assert view["a.c"] == 12
+
+
+def test_rejected_value_leaves_file_unchanged(tmp_path):
+    schema, path = make_file(tmp_path)
+    before = path.read_bytes()
+
+    with SchemaView(schema, path) as view:
+        with pytest.raises(ValueError):
+            view["a.c"] = -1
+
+        with pytest.raises(ValueError):
+            view["a.b"] = "x"
+
+        assert view["a.c"] == 9
+
+    assert path.read_bytes() == before
+
+
+def test_array_fields_are_lists(tmp_path):
+    schema = Schema("s", [BlockSequence("a", [Block(DataType.INT_2B, "t", [1, -2], count=2)])], big_endian=False)
+    path = tmp_path / "records.bin"
+    path.write_bytes(schema.emit_data())
+
+    with SchemaView(schema, path) as view:
+        assert view["a.t"] == [1, -2]
+        view["a.t"] = [3, 4]
+        assert view["a.t"] == [3, 4]
+
+        with pytest.raises(ValueError):
+            view["a.t"] = [1, 2, 3]
+
+    assert path.read_bytes() == b"\x03\x00\x04\x00"
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from binbuilder.block import Block, BlockSequence, EditHistory
+from binbuilder.table_models import SequenceTableModel
+
+
+def make_sequence():
+    sequence = BlockSequence("s", [Block(name="count", varname_prefix="p_"), Block(name="a"), Block(name="b")])
+    sequence.get_block_by_name("b").set_name("a")
+    return sequence
+
+
+def test_remove_item_by_row():
+    sequence = make_sequence()
+    history = EditHistory()
+    model = SequenceTableModel(sequence, history)
+    blocks = list(sequence.blocklist)
+
+    model.removeItemAt(0)
+    model.removeItemAt(1)
+    assert list(sequence.blocklist) == [blocks[1]]
+
+    history.undo()
+    history.undo()
+    assert list(sequence.blocklist) == blocks
+
+
+def test_get_block_by_row():
+    sequence = make_sequence()
+    copy = sequence.copy()
+
+    sequence.get_block(2).value = 5
+    assert [b.value for b in sequence.blocklist] == [0, 0, 5]
+    assert [b.value for b in copy.blocklist] == [0, 0, 0]